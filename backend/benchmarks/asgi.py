@@ -0,0 +1,89 @@
+"""
+Minimal in-process ASGI drivers: run an app's lifespan (startup/shutdown events) and
+open WebSocket connections to it without a server, on the caller's event loop.
+HTTP requests go through httpx.ASGITransport.
+"""
+import asyncio
+
+class Lifespan:
+    """async with Lifespan(app): runs the app's startup handlers on enter and shutdown on exit."""
+
+    def __init__(self, app):
+        self.app = app
+        self._inbound: asyncio.Queue = None
+        self._outbound: asyncio.Queue = None
+        self._task = None
+
+    async def _expect(self, message_type: str):
+        message = await self._outbound.get()
+        if message["type"] != message_type:
+            raise RuntimeError(f"Lifespan: expected {message_type}, got {message}")
+
+    async def __aenter__(self):
+        self._inbound = asyncio.Queue()
+        self._outbound = asyncio.Queue()
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._task = asyncio.create_task(self.app(scope, self._inbound.get, self._outbound.put))
+        await self._inbound.put({"type": "lifespan.startup"})
+        await self._expect("lifespan.startup.complete")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._inbound.put({"type": "lifespan.shutdown"})
+        await self._expect("lifespan.shutdown.complete")
+        await self._task
+        return False
+
+class WebSocketClosed(Exception):
+    pass
+
+class AsgiWebSocket:
+    """A WebSocket client connected directly to an ASGI app."""
+
+    def __init__(self, app, path: str = "/ws"):
+        self.app = app
+        self.path = path
+        self._inbound: asyncio.Queue = asyncio.Queue()
+        self._outbound: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+    async def connect(self) -> "AsgiWebSocket":
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+            "subprotocols": [],
+            "state": {}
+        }
+        await self._inbound.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._inbound.get, self._outbound.put))
+        message = await self._outbound.get()
+        if message["type"] != "websocket.accept":
+            raise WebSocketClosed(f"Connection rejected: {message}")
+        return self
+
+    async def send(self, text: str):
+        await self._inbound.put({"type": "websocket.receive", "text": text})
+
+    async def recv(self) -> str:
+        message = await self._outbound.get()
+        if message["type"] == "websocket.close":
+            raise WebSocketClosed(f"Closed with code {message.get('code')}")
+        if message.get("text") is not None:
+            return message["text"]
+        return message["bytes"].decode()
+
+    async def close(self):
+        await self._inbound.put({"type": "websocket.disconnect", "code": 1000})
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5.0)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
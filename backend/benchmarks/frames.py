@@ -0,0 +1,33 @@
+"""Load recorded radar frames for replay in benchmarks."""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+
+from utils import get_data_dir
+from fall_detection.replay import load_recording as load_frames
+
+OCCUPANCY_RECORDING = os.path.join(get_data_dir(), "OccupancyTraining.json")
+FALL_SEQUENCES_DIR = os.path.join(BACKEND_DIR, "fall_detection", "data_collection", "data", "sequences")
+FALL_RECORDINGS = [
+    os.path.join(FALL_SEQUENCES_DIR, "fall_sequences.json"),
+    os.path.join(FALL_SEQUENCES_DIR, "no_fall_sequences.json")
+]
+
+FRAME_FIELDS = ("x_pos", "y_pos", "z_pos", "snr", "noise")
+
+def to_payload(frame: dict) -> dict:
+    """Keep only the fields the ingest endpoints accept."""
+    return {field: frame.get(field, []) for field in FRAME_FIELDS}
+
+def load_occupancy_frames(path: str = OCCUPANCY_RECORDING) -> list[dict]:
+    return [to_payload(frame) for frame in load_frames(path)]
+
+def load_fall_frames(paths: list[str] = None) -> list[dict]:
+    frames = []
+    for path in paths or FALL_RECORDINGS:
+        if os.path.exists(path):
+            frames.extend(to_payload(frame) for frame in load_frames(path))
+    return frames
@@ -0,0 +1,215 @@
+"""
+Local harness for lambda_fall_detection: invoke lambda_handler against a stand-in
+WebSocket server (or a real one with --url) and report per-frame forwarding latency.
+
+    python -m benchmarks.lambda_harness --invocations 500
+    python -m benchmarks.lambda_harness --latency-ms 20 --rate 20 --batch 1 10 --output lambda.json
+    python -m benchmarks.lambda_harness --url ws://127.0.0.1:8000/ws --modes warm batched
+
+Modes:
+    cold     a new connection per invocation (the behaviour before connection reuse)
+    warm     the cached connection is reused across invocations
+    batched  warm, with --batch frames per event sent as one {"frames": [...]} message
+
+The stand-in server answers like fall_detection.main's /ws. --latency-ms adds a one-way
+delay to every new connection's handshake and to every reply, approximating the network
+path from Lambda to the server; --drop-every closes each connection after N messages
+so reconnection after a stale connection is exercised. Latency is the time to complete
+an invocation divided by its frames; frames delivered are counted on the server, and
+frames that never arrived count as failures.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.environment import git_commit
+from benchmarks.frames import load_fall_frames
+from benchmarks.load_test import free_port, percentiles_ms
+import lambda_fall_detection
+
+MODES = ("cold", "warm", "batched")
+
+
+class StandInServer:
+    """WebSocket server in a background thread that acknowledges frames like the fall app."""
+
+    def __init__(self, latency_s: float = 0.0, drop_every: int = 0):
+        self.latency_s = latency_s
+        self.drop_every = drop_every
+        self.port = free_port()
+        self.frames = 0
+        self.connections = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._replies = set()
+        self._thread = threading.Thread(target=self._run, name="stand-in-ws", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    async def _handle(self, websocket):
+        self.connections += 1
+        messages = 0
+        try:
+            async for text in websocket:
+                data = json.loads(text)
+                frames = data.get("frames", [data])
+                self.frames += len(frames)
+                replies = [{"point_data": frame} for frame in frames]
+                reply = json.dumps({"frames": replies} if "frames" in data else replies[0])
+                messages += 1
+                if self.drop_every and messages >= self.drop_every:
+                    await self._reply(websocket, reply)
+                    await websocket.close()
+                    return
+                # Delayed replies overlap, like replies travelling over a slow link
+                task = asyncio.ensure_future(self._reply(websocket, reply))
+                self._replies.add(task)
+                task.add_done_callback(self._replies.discard)
+        except websockets.ConnectionClosed:
+            pass  # cold invocations close without reading the reply
+
+    async def _reply(self, websocket, reply: str):
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        try:
+            await websocket.send(reply)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _handshake_delay(self, connection, request):
+        if self.latency_s:
+            await asyncio.sleep(2 * self.latency_s)  # TCP + upgrade round trips
+        return None
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+
+        async def serve():
+            self._stopped = asyncio.Event()
+            async with websockets.serve(self._handle, "127.0.0.1", self.port,
+                                        process_request=self._handshake_delay):
+                self._ready.set()
+                await self._stopped.wait()
+                for task in list(self._replies):
+                    task.cancel()
+
+        self._loop.run_until_complete(serve())
+        self._loop.close()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join()
+
+
+def make_events(frames: list, batch: int, invocations: int) -> list:
+    """invocations events of batch frames each (a plain frame event when batch is 1)."""
+    events = []
+    for i in range(invocations):
+        chunk = [dict(frames[(i * batch + j) % len(frames)], sensor_id="lambda-0") for j in range(batch)]
+        events.append(chunk[0] if batch == 1 else {"sensor_id": "lambda-0", "frames": chunk})
+    return events
+
+
+def run_mode(mode: str, events: list, server: StandInServer = None, rate: float = 0.0) -> dict:
+    lambda_fall_detection.close_connection()
+    delivered = server.frames if server else 0
+    connections = server.connections if server else 0
+    per_frame, failures, frames = [], 0, 0
+    start = time.perf_counter()
+    for i, event in enumerate(events):
+        if rate:
+            # Invocations arrive at a fixed rate (frames are produced in real time)
+            time.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        if mode == "cold":
+            lambda_fall_detection.close_connection()
+        count = len(event.get("frames", [event]))
+        t0 = time.perf_counter()
+        response = lambda_fall_detection.lambda_handler(event, None)
+        elapsed = time.perf_counter() - t0
+        if response["statusCode"] != 200:
+            failures += 1
+        per_frame.extend([elapsed / count] * count)
+        frames += count
+    total = time.perf_counter() - start
+    lambda_fall_detection.close_connection()
+    result = {
+        "invocations": len(events),
+        "frames": frames,
+        "failures": failures,
+        "frames_per_s": frames / total,
+        "per_frame_ms": percentiles_ms(per_frame)
+    }
+    if server:
+        # Let the last messages arrive
+        deadline = time.monotonic() + 5.0
+        while server.frames - delivered < frames and time.monotonic() < deadline:
+            time.sleep(0.05)
+        result["delivered"] = server.frames - delivered
+        result["connections"] = server.connections - connections
+        result["failures"] += max(0, frames - result["delivered"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure lambda_fall_detection forwarding latency locally")
+    parser.add_argument("--url", help="WebSocket URL of a running server (default: stand-in server)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--invocations", type=int, default=300)
+    parser.add_argument("--batch", type=int, nargs="+", default=[10], help="frames per batched event")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="invocations per second (default: back to back)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stand-in one-way network delay")
+    parser.add_argument("--drop-every", type=int, default=0, help="stand-in closes connections after N messages")
+    parser.add_argument("--no-wait-reply", dest="wait_reply", action="store_false",
+                        help="send without waiting for each message's reply (frames can be lost)")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    server = None
+    if args.url:
+        lambda_fall_detection.WEBSOCKET_URL = args.url
+    else:
+        server = StandInServer(args.latency_ms / 1000.0, args.drop_every).start()
+        lambda_fall_detection.WEBSOCKET_URL = server.url
+    lambda_fall_detection.WAIT_FOR_REPLY = args.wait_reply
+
+    frames = [frame for frame in load_fall_frames() if frame["x_pos"]] or [{"x_pos": [1.0, 2.0], "y_pos": [0.1, 0.2], "z_pos": [0.5, 0.6],
+                                     "snr": [10.0, 11.0], "noise": [1.0, 1.0]}]
+    results = {}
+    for mode in args.modes:
+        for batch in (args.batch if mode == "batched" else [1]):
+            name = f"{mode}-{batch}" if mode == "batched" else mode
+            results[name] = run_mode(mode, make_events(frames, batch, args.invocations), server, args.rate)
+            r = results[name]
+            print(f"{name:12s} frames/s {r['frames_per_s']:9.1f}  per-frame p50 {r['per_frame_ms']['p50']:7.3f}ms "
+                  f"p99 {r['per_frame_ms']['p99']:7.3f}ms  failures {r['failures']}"
+                  + (f"  delivered {r['delivered']}/{r['frames']}  connections {r['connections']}" if server else ""))
+    if server:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"git": git_commit(), "args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
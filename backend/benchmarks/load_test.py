@@ -0,0 +1,394 @@
+"""
+End-to-end load test: replay recorded frames against /inference, /fall or /ws from a
+number of simulated sensors at a fixed rate, and report throughput, latency
+percentiles, CPU and RSS of the serving process.
+
+    python -m benchmarks.load_test --target inference --sensors 8 --rate 10 --duration 30 --output load.json
+    python -m benchmarks.load_test --target ws --mode uvicorn --compare load.json
+
+Targets:
+    inference  POST /inference on the occupancy app (main:app)
+    fall       POST /fall on the fall-detection app (fall_detection.main:app)
+    ws         frame/reply round trips over /ws on the fall-detection app
+    ws_inference  frames streamed over /ws on the occupancy app at the sensor rate without
+               waiting for replies (matched by seq); frames the server skipped count as "dropped"
+    frame      POST /frame on the unified server (server:app, configured by SERVER_CONFIG)
+
+In "asgi" mode the app runs in this process (client and server share one event loop
+and one CPU budget); in "uvicorn" mode it runs in a local uvicorn subprocess and CPU/RSS
+are those of the server alone. Latency is measured from the time a frame was scheduled
+to be sent, so a server that falls behind the sensor rate shows up as queueing delay
+instead of silently lowering the offered load.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.asgi import AsgiWebSocket, Lifespan
+from benchmarks.environment import git_commit
+from benchmarks.frames import load_fall_frames, load_frames, load_occupancy_frames, to_payload
+from benchmarks.resources import ResourceSampler
+
+# app name -> (import path, readiness path)
+APPS = {
+    "occupancy": ("main", "/ready"),
+    "fall": ("fall_detection.main", "/"),
+    "server": ("server", "/ready")
+}
+
+# target -> (app name, protocol, path)
+TARGETS = {
+    "inference": ("occupancy", "http", "/inference"),
+    "fall": ("fall", "http", "/fall"),
+    "ws": ("fall", "ws", "/ws"),
+    "ws_inference": ("occupancy", "ws", "/ws"),
+    "frame": ("server", "http", "/frame")
+}
+
+JSON_HEADERS = {"content-type": "application/json"}
+
+class LatencyStats:
+    def __init__(self):
+        self.latencies = []  # from scheduled send time to reply
+        self.service = []    # from actual send time to reply
+        self.statuses = {}
+
+    def record(self, latency: float, service: float, status):
+        self.latencies.append(latency)
+        self.service.append(service)
+        key = str(status)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    @property
+    def errors(self) -> int:
+        return sum(count for status, count in self.statuses.items() if not status.startswith("2"))
+
+def percentiles_ms(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ms = np.asarray(values) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99),
+            "mean": float(ms.mean()), "max": float(ms.max())}
+
+def load_target_frames(target: str, path: str = None) -> list[dict]:
+    if path:
+        return [to_payload(frame) for frame in load_frames(path)]
+    if TARGETS[target][0] == "occupancy":
+        return load_occupancy_frames()
+    return load_fall_frames()
+
+def encode_payloads(target: str, frames: list[dict], sensor: int, model_name: str) -> list[str]:
+    """Serialize every frame once up front so client-side JSON encoding is not measured."""
+    extra = {}
+    if TARGETS[target][0] in ("occupancy", "server"):
+        extra = {"model_name": model_name, "sensor_id": f"bench-{sensor}"}
+    return [json.dumps({**extra, **frame}) for frame in frames]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_ready(client: httpx.AsyncClient, path: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            response = await client.get(path)
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"App not ready after {timeout}s")
+        await asyncio.sleep(0.05)
+
+class PipelinedSender:
+    """Sends frames over one occupancy /ws connection without waiting for earlier replies."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.seq = 0
+        self.waiting = {}  # seq -> future of the reply status
+        self.closed = False
+
+    async def send(self, body: str):
+        if self.closed:
+            raise ConnectionError("connection closed")
+        self.seq += 1
+        reply = asyncio.get_running_loop().create_future()
+        self.waiting[self.seq] = reply
+        await self.ws.send('{"seq": %d, %s' % (self.seq, body[1:]))
+        return await reply
+
+    async def read(self):
+        try:
+            while True:
+                message = json.loads(await self.ws.recv())
+                reply = self.waiting.pop(message.get("seq"), None)  # broadcasts carry no seq
+                if reply is not None:
+                    reply.set_result(200 if message.get("event") == "inference" else message.get("event", "error"))
+        except Exception:
+            pass
+        finally:
+            self.closed = True
+            for reply in self.waiting.values():
+                reply.set_exception(ConnectionError("connection closed"))
+
+async def timed_send(send, body: str, scheduled: float, measured: bool, stats: LatencyStats):
+    sent = time.perf_counter()
+    try:
+        status = await send(body)
+    except Exception as e:
+        status = type(e).__name__
+    done = time.perf_counter()
+    if measured:
+        stats.record(done - scheduled, done - sent, status)
+
+async def run_sensor(index: int, sensors: int, payloads: list[str], send, rate: float,
+                     start_at: float, end_at: float, measure_from: float, stats: LatencyStats,
+                     pipelined: bool = False):
+    """
+    Send this sensor's frames at `rate` Hz (as fast as possible if 0) until end_at.
+    Pipelined, a frame is sent on schedule even while earlier replies are outstanding.
+    """
+    interval = 1.0 / rate if rate > 0 else 0.0
+    outstanding = []
+    # Spread the sensors over one frame interval and start each at a different frame
+    scheduled = start_at + interval * index / sensors
+    frame = index * len(payloads) // sensors
+    while True:
+        now = time.perf_counter()
+        if interval:
+            if scheduled >= end_at:
+                break
+            if scheduled > now:
+                await asyncio.sleep(scheduled - now)
+        else:
+            if now >= end_at:
+                break
+            scheduled = now
+        request = timed_send(send, payloads[frame % len(payloads)], scheduled, scheduled >= measure_from, stats)
+        if pipelined and interval:
+            outstanding.append(asyncio.create_task(request))
+        else:
+            await request
+        frame += 1
+        scheduled += interval
+    await asyncio.gather(*outstanding)
+
+async def listen(ws, counter: list):
+    """Count broadcast messages received by a passive /ws client."""
+    try:
+        while True:
+            await ws.recv()
+            counter[0] += 1
+    except Exception:
+        pass
+
+async def run_load(args, client: httpx.AsyncClient, open_ws, pid: int) -> dict:
+    app_name, protocol, path = TARGETS[args.target]
+    frames = load_target_frames(args.target, args.frames)
+    if not frames:
+        raise SystemExit(f"No frames to replay for target '{args.target}'")
+
+    # Passive clients that only receive broadcasts
+    broadcasts = [0]
+    listeners = [await open_ws("/ws") for _ in range(args.listeners)]
+    listen_tasks = [asyncio.create_task(listen(ws, broadcasts)) for ws in listeners]
+
+    senders = []
+    sockets = []
+    readers = []
+    pipelined = args.target == "ws_inference"
+    for sensor in range(args.sensors):
+        if protocol == "http":
+            async def send(body, client=client):
+                response = await client.post(path, content=body, headers=JSON_HEADERS)
+                return response.status_code
+        elif pipelined:
+            ws = await open_ws(path)
+            sockets.append(ws)
+            sender = PipelinedSender(ws)
+            readers.append(asyncio.create_task(sender.read()))
+            send = sender.send
+        else:
+            ws = await open_ws(path)
+            sockets.append(ws)
+
+            async def send(body, ws=ws):
+                await ws.send(body)
+                await ws.recv()
+                return 200
+        senders.append(send)
+
+    stats = LatencyStats()
+    sampler = ResourceSampler(pid)
+    start_at = time.perf_counter() + 0.05
+    measure_from = start_at + args.warmup
+    end_at = measure_from + args.duration
+    print(f"Replaying {len(frames)} frames to {args.target} ({args.mode}) from {args.sensors} sensors "
+          f"at {args.rate or 'max'} Hz for {args.duration}s (+{args.warmup}s warm-up)")
+
+    # Inference runs on the event loop, so start measuring from a thread rather than a
+    # coroutine that could be resumed late
+    timer = threading.Timer(max(0.0, measure_from - time.perf_counter()), sampler.start)
+    timer.start()
+    sensor_tasks = [
+        asyncio.create_task(run_sensor(
+            i, args.sensors, encode_payloads(args.target, frames, i, args.model_name), send,
+            args.rate, start_at, end_at, measure_from, stats, pipelined))
+        for i, send in enumerate(senders)
+    ]
+    await asyncio.gather(*sensor_tasks)
+    timer.join()
+    resources = sampler.stop()
+    elapsed = sampler.stopped_at - measure_from
+
+    for ws in sockets + listeners:
+        await ws.close()
+    for task in listen_tasks + readers:
+        task.cancel()
+
+    requests = len(stats.latencies)
+    return {
+        "benchmark": "load",
+        **git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "target": args.target,
+            "app": app_name,
+            "mode": args.mode,
+            "sensors": args.sensors,
+            "rate_hz": args.rate,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "listeners": args.listeners,
+            "model_name": args.model_name if app_name == "occupancy" else None,
+            "frames": len(frames)
+        },
+        "requests": requests,
+        "errors": stats.errors,
+        "status_codes": stats.statuses,
+        "elapsed_s": elapsed,
+        "offered_rps": args.sensors * args.rate if args.rate else None,
+        "throughput_rps": requests / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": percentiles_ms(stats.latencies),
+        "service_ms": percentiles_ms(stats.service),
+        "broadcasts_received": broadcasts[0],
+        **resources
+    }
+
+async def run_asgi(args) -> dict:
+    app_name = TARGETS[args.target][0]
+    module, ready_path = APPS[app_name]
+    app = importlib.import_module(module).app
+    # Unhandled app errors become 500s, as they would behind a server
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with Lifespan(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver",
+                                     timeout=args.timeout) as client:
+            await wait_ready(client, ready_path, args.timeout)
+
+            async def open_ws(path):
+                return await AsgiWebSocket(app, path).connect()
+
+            return await run_load(args, client, open_ws, os.getpid())
+
+async def run_uvicorn(args) -> dict:
+    import websockets
+
+    app_name = TARGETS[args.target][0]
+    module, ready_path = APPS[app_name]
+    port = args.port or free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=args.cwd
+    )
+    try:
+        limits = httpx.Limits(max_connections=max(args.sensors, 10))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout,
+                                     limits=limits) as client:
+            await wait_ready(client, ready_path, args.timeout)
+
+            async def open_ws(path):
+                return await websockets.connect(f"ws://127.0.0.1:{port}{path}")
+
+            return await run_load(args, client, open_ws, server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def compare(baseline: dict, current: dict):
+    """Print the change of the headline numbers against a previous result file."""
+    def delta(old, new):
+        if old is None or new is None:
+            return "n/a"
+        change = (new - old) / old * 100.0 if old else 0.0
+        return f"{old:.2f} -> {new:.2f} ({change:+.1f}%)"
+
+    print(f"Compared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    if baseline.get("config") != current.get("config"):
+        print("  warning: configurations differ")
+    print(f"  throughput rps  {delta(baseline['throughput_rps'], current['throughput_rps'])}")
+    for key in ("p50", "p95", "p99"):
+        print(f"  latency {key} ms  {delta(baseline['latency_ms'][key], current['latency_ms'][key])}")
+    print(f"  cpu %           {delta(baseline['cpu_percent'], current['cpu_percent'])}")
+    print(f"  peak rss MB     {delta(baseline['rss_mb']['peak'], current['rss_mb']['peak'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded frames against the backend and measure it")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="inference")
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--sensors", type=int, default=4, help="simulated sensors sending concurrently")
+    parser.add_argument("--rate", type=float, default=10.0, help="frames per second per sensor (0: as fast as possible)")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of load before measuring")
+    parser.add_argument("--listeners", type=int, default=0, help="passive /ws clients receiving broadcasts")
+    parser.add_argument("--model-name", default="default_model", help="occupancy model used by /inference and /frame")
+    parser.add_argument("--frames", help="recording to replay instead of the default data for the target")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, help="uvicorn port (default: a free port)")
+    parser.add_argument("--cwd", default=BACKEND_DIR, help="uvicorn working directory (where models.db lives)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    runner = run_asgi if args.mode == "asgi" else run_uvicorn
+    results = asyncio.run(runner(args))
+
+    latency = results["latency_ms"]
+    print(f"{results['requests']} requests, {results['errors']} errors | "
+          f"{results['throughput_rps']:.1f} req/s | "
+          f"p50 {latency['p50'] or 0:.2f}ms p95 {latency['p95'] or 0:.2f}ms p99 {latency['p99'] or 0:.2f}ms | "
+          f"cpu {results['cpu_percent']:.0f}% | peak rss {results['rss_mb']['peak']:.0f}MB")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Memory footprint of a multi-worker deployment: start the app with N workers under
+each launcher, send some frames so every worker has run inference, then sum RSS, PSS
+and USS over the whole process tree.
+
+    python -m benchmarks.memory --app main:app --workers 4 --model-name default_model --output memory.json
+
+Launchers:
+    uvicorn          uvicorn --workers N (every worker imports torch and loads its own models)
+    prefork          prefork.py (models loaded once, weights in shared memory, workers forked)
+    prefork-noshare  prefork.py --no-share (forked, weights only shared copy-on-write)
+
+Summed RSS counts shared pages once per process and overstates the total; summed PSS
+is the real footprint of the tree, and USS is what each extra worker costs.
+
+For reference, main:app with one occupancy model and 3 workers on a development box:
+
+    uvicorn          5 processes | RSS 1717MB | PSS 1160MB | USS 975MB
+    prefork          4 processes | RSS 1529MB | PSS  502MB | USS  73MB
+
+Most of the saving is the imported torch/Python heap rather than the (13MB of)
+weights, which is why prefork-noshare measures about the same right after startup;
+shared memory keeps the weights shared however the workers' heaps evolve.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.environment import environment, git_commit
+from benchmarks.frames import load_occupancy_frames
+from benchmarks.resources import child_pids, memory_usage
+
+LAUNCHERS = ("uvicorn", "prefork", "prefork-noshare")
+MB = 1024 * 1024
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def launch_command(launcher: str, app: str, workers: int, port: int) -> list[str]:
+    if launcher == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning"]
+    command = [sys.executable, os.path.join(BACKEND_DIR, "prefork.py"), "--app", app, "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers)]
+    if launcher == "prefork-noshare":
+        command.append("--no-share")
+    return command
+
+def process_tree(pid: int) -> list[int]:
+    """pid and all of its descendants."""
+    pids = [pid]
+    for child in child_pids(pid):
+        pids.extend(process_tree(child))
+    return pids
+
+def wait_ready(base_url: str, ready_path: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + ready_path, timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{base_url}{ready_path} not ready after {timeout}s")
+
+def measure(launcher: str, args) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(launch_command(launcher, args.app, args.workers, port), cwd=args.cwd)
+    try:
+        start = time.perf_counter()
+        # Every worker answers /ready independently; ask often enough to reach them all
+        for _ in range(args.workers * 4):
+            wait_ready(base_url, args.ready_path, args.timeout)
+        startup_s = time.perf_counter() - start
+
+        frames = load_occupancy_frames()[:args.requests]
+        errors = 0
+        with httpx.Client(base_url=base_url, timeout=args.timeout) as client:
+            for i, frame in enumerate(frames):
+                payload = dict(frame, model_name=args.model_name, sensor_id=f"memory-{i % 8}")
+                if client.post(args.path, json=payload).status_code != 200:
+                    errors += 1
+        time.sleep(args.settle)
+
+        processes = []
+        for pid in process_tree(server.pid):
+            try:
+                usage = memory_usage(pid)
+            except (OSError, ValueError):
+                continue  # exited while we were looking
+            processes.append({"pid": pid, **{k: v / MB if v is not None else None for k, v in usage.items()}})
+        totals = {key: sum(p[key] for p in processes) if all(p[key] is not None for p in processes) else None
+                  for key in ("rss", "pss", "uss")}
+        return {
+            "launcher": launcher,
+            "workers": args.workers,
+            "startup_s": startup_s,
+            "requests": len(frames),
+            "errors": errors,
+            "processes": processes,
+            "total_mb": totals
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory of multi-worker launchers")
+    parser.add_argument("--app", default="main:app")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--launchers", nargs="+", choices=LAUNCHERS, default=list(LAUNCHERS))
+    parser.add_argument("--ready-path", default="/ready")
+    parser.add_argument("--path", default="/inference", help="endpoint the frames are posted to")
+    parser.add_argument("--model-name", default="default_model")
+    parser.add_argument("--requests", type=int, default=64, help="frames sent before measuring")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--cwd", default=BACKEND_DIR, help="working directory of the server")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for launcher in args.launchers:
+        result = measure(launcher, args)
+        results.append(result)
+        total = result["total_mb"]
+        fmt = lambda v: f"{v:8.1f}MB" if v is not None else "     n/a"
+        print(f"{launcher:<16} {len(result['processes'])} processes | RSS {fmt(total['rss'])} | "
+              f"PSS {fmt(total['pss'])} | USS {fmt(total['uss'])} | startup {result['startup_s']:.1f}s | "
+              f"{result['errors']} errors")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "memory",
+                **git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "environment": environment(),
+                "app": args.app,
+                "results": results
+            }, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Micro-benchmarks for the preprocessing and model hot paths, across point counts and
+batch sizes. Every case is timed the same way: calibrate the loop count so one repeat
+takes at least --min-time seconds, run --repeat repeats and keep the per-call min and
+median.
+
+    python -m benchmarks.micro --save-baseline benchmarks/baselines/micro.json
+    python -m benchmarks.micro --baseline benchmarks/baselines/micro.json --tolerance 0.2
+    python -m benchmarks.micro --filter forward --output forward.json
+
+With --baseline, cases whose median got slower by more than --tolerance are reported
+and the exit status is 1. Baselines are machine specific: record one on the machine
+that runs the comparison.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.environment import environment, git_commit
+from model.inference import _sample_or_pad
+from model.model import PointNetClassifier
+from model.preprocessing import RadarDataset, load_all_frames
+from model.sampling import SAMPLING_STRATEGIES
+from fall_detection.data_collection.preprocessing import FallDetectionDataset
+from fall_detection.model.pointnet_lstm import PointNetLSTM
+
+# name -> (setup(**params) returning a zero-argument callable, list of params dicts)
+CASES = {}
+
+def case(name: str, grid: list[dict]):
+    """Register setup as a benchmark run once per params dict in grid."""
+    def register(setup):
+        CASES[name] = (setup, grid)
+        return setup
+    return register
+
+def synthetic_cloud(n: int, dims: int = 5, seed: int = 0) -> np.ndarray:
+    """A reproducible (n, dims) cloud: x,y,z within a room, then SNR and noise columns."""
+    rng = np.random.default_rng(seed)
+    cloud = rng.uniform(-3.0, 3.0, size=(n, dims)).astype(np.float32)
+    if dims > 3:
+        cloud[:, 3:] = rng.uniform(0.0, 40.0, size=(n, dims - 3))
+    return cloud
+
+def synthetic_frame(n: int, seed: int) -> dict:
+    cloud = synthetic_cloud(n, seed=seed)
+    return {
+        "x_pos": cloud[:, 0].tolist(), "y_pos": cloud[:, 1].tolist(), "z_pos": cloud[:, 2].tolist(),
+        "snr": cloud[:, 3].tolist(), "noise": cloud[:, 4].tolist(), "people_count": seed % 3
+    }
+
+def grid(**axes) -> list[dict]:
+    """Cartesian product of the axes as a list of params dicts."""
+    combos = [{}]
+    for key, values in axes.items():
+        combos = [dict(c, **{key: v}) for c in combos for v in values]
+    return combos
+
+@case("sample_or_pad", grid(points=[32, 128, 512, 2048], sampling=list(SAMPLING_STRATEGIES)))
+def bench_sample_or_pad(points, sampling):
+    cloud = synthetic_cloud(points)
+    return lambda: _sample_or_pad(cloud, num_points=128, sampling=sampling)
+
+@case("radar_dataset_getitem", grid(points=[32, 256, 1024], sampling=list(SAMPLING_STRATEGIES)))
+def bench_radar_dataset_getitem(points, sampling):
+    clouds = [synthetic_cloud(points, seed=i) for i in range(16)]
+    dataset = RadarDataset(clouds, [0] * len(clouds), num_points=128, sampling=sampling)
+    index = iter(range(10 ** 12))
+    return lambda: dataset[next(index) % len(dataset)]
+
+@case("fall_normalize_sequence", grid(points=[32, 256], frames=[10, 30], sampling=list(SAMPLING_STRATEGIES)))
+def bench_fall_normalize_sequence(points, frames, sampling):
+    sequence = [synthetic_cloud(points, dims=4, seed=i) for i in range(frames)]
+    dataset = FallDetectionDataset([sequence], [0], num_points=128, sequence_length=30, sampling=sampling)
+    return lambda: dataset.normalize_sequence(sequence)
+
+@case("load_all_frames", grid(frames=[500, 2000], points=[64]))
+def bench_load_all_frames(frames, points):
+    # load_all_frames resolves data_dir under data/; an absolute path replaces that root
+    data_dir = tempfile.mkdtemp(prefix="micro_frames_")
+    per_file = 250
+    for start in range(0, frames, per_file):
+        with open(os.path.join(data_dir, f"frames_{start:06d}.json"), "w") as f:
+            json.dump([synthetic_frame(points, seed) for seed in range(start, min(start + per_file, frames))], f)
+    run = lambda: load_all_frames(data_dir)
+    run.cleanup = lambda: shutil.rmtree(data_dir, ignore_errors=True)
+    return run
+
+@case("classifier_forward", grid(batch=[1, 8, 32], points=[128, 512]))
+def bench_classifier_forward(batch, points):
+    model = PointNetClassifier(num_classes=5).eval()
+    x = torch.from_numpy(np.stack([synthetic_cloud(points, seed=i) for i in range(batch)]))
+
+    def run():
+        with torch.no_grad():
+            return model(x)
+    return run
+
+@case("lstm_forward", grid(batch=[1, 4, 8], points=[64, 128]))
+def bench_lstm_forward(batch, points):
+    model = PointNetLSTM(num_points=points).eval()
+    x = torch.from_numpy(np.stack([
+        np.stack([synthetic_cloud(points, dims=3, seed=b * 30 + t) for t in range(30)]) for b in range(batch)
+    ]))
+
+    def run():
+        with torch.no_grad():
+            return model(x)
+    return run
+
+def case_id(name: str, params: dict) -> str:
+    return name + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+
+def time_call(run, repeat: int, min_time: float) -> dict:
+    """Per-call seconds: calibrate loops so one repeat takes >= min_time, then repeat."""
+    run()  # warm up caches, lazy allocations and the autograd-free path
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append((time.perf_counter() - start) / loops)
+    return {"min_us": min(samples) * 1e6, "median_us": statistics.median(samples) * 1e6,
+            "loops": loops, "repeat": repeat}
+
+def run_cases(selected: list[str], repeat: int, min_time: float) -> dict:
+    results = {}
+    for name in selected:
+        setup, params_grid = CASES[name]
+        for params in params_grid:
+            key = case_id(name, params)
+            run = setup(**params)
+            try:
+                result = time_call(run, repeat, min_time)
+            finally:
+                if hasattr(run, "cleanup"):
+                    run.cleanup()
+            results[key] = {"case": name, "params": params, **result}
+            print(f"{key:<64} median {result['median_us']:>12.1f}us  min {result['min_us']:>12.1f}us")
+    return results
+
+def compare(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """Print the median change of every case in both files; return the regressed cases."""
+    regressions = []
+    print(f"\nCompared with baseline {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for key, result in results.items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        ratio = result["median_us"] / old["median_us"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print(f"{key:<64} {old['median_us']:>12.1f}us -> {result['median_us']:>12.1f}us ({ratio - 1:+.1%}){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for preprocessing and model forward passes")
+    parser.add_argument("--filter", action="append", help="only run cases whose name contains this (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per repeat")
+    parser.add_argument("--threads", type=int, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--save-baseline", help="write results as the new baseline JSON at this path")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown of the median")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (_, params_grid) in CASES.items():
+            for params in params_grid:
+                print(case_id(name, params))
+        return
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    selected = [name for name in CASES if not args.filter or any(f in name for f in args.filter)]
+    results = {
+        "benchmark": "micro",
+        **git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "results": run_cases(selected, args.repeat, args.min_time)
+    }
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Saved results to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), results["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Sample CPU time and memory of a process while a benchmark runs (Linux /proc, psutil elsewhere)."""
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+def cpu_seconds(pid: int) -> float:
+    """User + system CPU time of pid, in seconds."""
+    if os.path.exists(f"/proc/{pid}/stat"):
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces; fields after it are space separated
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    if psutil is not None:
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    if pid == os.getpid():
+        return time.process_time()
+    return 0.0
+
+def rss_bytes(pid: int) -> int:
+    """Resident set size of pid, in bytes (0 if it cannot be read)."""
+    if os.path.exists(f"/proc/{pid}/status"):
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+    if psutil is not None:
+        return psutil.Process(pid).memory_info().rss
+    return 0
+
+def memory_usage(pid: int) -> dict:
+    """
+    RSS, PSS and USS of pid in bytes. PSS charges each shared page to its sharers in
+    equal parts, so summing PSS over processes gives their true combined footprint;
+    USS counts only pages private to pid. PSS/USS are None where they cannot be read.
+    """
+    path = f"/proc/{pid}/smaps_rollup"
+    if os.path.exists(path):
+        fields = {}
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+        return {
+            "rss": fields.get("Rss", 0),
+            "pss": fields.get("Pss", 0),
+            "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+        }
+    if psutil is not None:
+        info = psutil.Process(pid).memory_full_info()
+        return {"rss": info.rss, "pss": getattr(info, "pss", None), "uss": getattr(info, "uss", None)}
+    return {"rss": rss_bytes(pid), "pss": None, "uss": None}
+
+def child_pids(pid: int) -> list[int]:
+    """Direct children of pid."""
+    task_dir = f"/proc/{pid}/task"
+    if os.path.isdir(task_dir):
+        children = []
+        for task in os.listdir(task_dir):
+            try:
+                with open(os.path.join(task_dir, task, "children")) as f:
+                    children.extend(int(child) for child in f.read().split())
+            except OSError:
+                continue
+        return sorted(set(children))
+    if psutil is not None:
+        return [child.pid for child in psutil.Process(pid).children()]
+    return []
+
+class ResourceSampler:
+    """Background thread that tracks CPU time and peak RSS of pid between start() and stop()."""
+
+    def __init__(self, pid: int = None, interval: float = 0.1):
+        self.pid = pid or os.getpid()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.rss_start = self.rss_peak = self.rss_end = 0
+        self.cpu_start = self.cpu_end = 0.0
+        self.started_at = self.stopped_at = 0.0
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.rss_peak = max(self.rss_peak, rss_bytes(self.pid))
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.cpu_start = cpu_seconds(self.pid)
+        self.rss_start = self.rss_peak = rss_bytes(self.pid)
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        self.stopped_at = time.perf_counter()
+        self.cpu_end = cpu_seconds(self.pid)
+        self.rss_end = rss_bytes(self.pid)
+        self.rss_peak = max(self.rss_peak, self.rss_end)
+        return self.summary()
+
+    def summary(self) -> dict:
+        wall = max(self.stopped_at - self.started_at, 1e-9)
+        cpu = self.cpu_end - self.cpu_start
+        mb = 1024 * 1024
+        return {
+            "pid": self.pid,
+            "cpu_seconds": cpu,
+            "cpu_percent": 100.0 * cpu / wall,  # of one core
+            "rss_mb": {
+                "start": self.rss_start / mb,
+                "peak": self.rss_peak / mb,
+                "end": self.rss_end / mb
+            }
+        }
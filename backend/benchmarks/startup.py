@@ -0,0 +1,97 @@
+"""
+Measure backend startup time: module import, and import-to-ready (models preloaded and warmed).
+
+Each run starts a fresh interpreter so import caches don't hide the real cost:
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter; prints one JSON line with the timings
+CHILD_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {backend_dir!r})
+import main
+t_import = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    t_first = None
+    while True:
+        response = client.get("/ready")
+        if t_first is None:
+            t_first = time.perf_counter()
+        if response.status_code == 200:
+            break
+        if time.perf_counter() - t0 > {timeout}:
+            raise SystemExit("timed out waiting for /ready")
+        time.sleep(0.005)
+    t_ready = time.perf_counter()
+    body = response.json()
+print(json.dumps({{
+    "import_s": t_import - t0,
+    "first_response_s": t_first - t0,
+    "ready_s": t_ready - t0,
+    "models": body["models"],
+    "errors": body["errors"]
+}}))
+"""
+
+def run_once(timeout: float, cwd: str) -> dict:
+    script = CHILD_SCRIPT.format(backend_dir=BACKEND_DIR, timeout=timeout)
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    # The app prints while starting; the timings are on the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend import-to-ready time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--cwd", default=BACKEND_DIR, help="working directory (where models.db lives)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        run = run_once(args.timeout, args.cwd)
+        print(f"Run {i + 1}/{args.runs}: import {run['import_s']:.3f}s | "
+              f"first response {run['first_response_s']:.3f}s | ready {run['ready_s']:.3f}s")
+        runs.append(run)
+
+    results = {
+        "benchmark": "startup",
+        "runs": runs,
+        "import_s": summarize([r["import_s"] for r in runs]),
+        "first_response_s": summarize([r["first_response_s"] for r in runs]),
+        "ready_s": summarize([r["ready_s"] for r in runs]),
+        "preload_models": os.environ.get("PRELOAD_MODELS")
+    }
+    print(f"Median import-to-ready: {results['ready_s']['median']:.3f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+if __name__ == "__main__":
+    main()
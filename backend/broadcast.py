@@ -0,0 +1,248 @@
+"""
+Broadcast of result messages (inference, fall_detection, training_progress, ...) to
+dashboard WebSockets. A Broadcaster sends to the clients connected to this process and
+publishes the message on a pub/sub backend so the other workers on the host send it to
+theirs:
+
+    local  in-process only (a single worker)
+    unix   Unix domain socket hub shared by every worker on the host; no broker needed
+
+Select the backend with BROADCAST_BACKEND and the socket with BROADCAST_SOCKET (or the
+"broadcast" section of server.json).
+"""
+import asyncio
+import fcntl
+import os
+import struct
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+from fastapi import WebSocket
+import metrics
+
+PUBSUB_BACKENDS = ("local", "unix")
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "radar-broadcast.sock")
+BROADCAST_CHANNEL = "broadcast"
+
+# Frames on the hub socket: 4-byte big-endian length, then "<channel>\n<message>" in UTF-8
+_HEADER = struct.Struct("!I")
+
+Subscriber = Callable[[str], Awaitable[None]]
+
+
+class LocalPubSub:
+    """Delivers published messages to the subscribers in this process."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+
+    def subscribe(self, channel: str, callback: Subscriber):
+        """Await callback(message) for every message published on channel."""
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, message: str, sender: Subscriber = None):
+        """Deliver message to every subscriber of channel except sender."""
+        await self._deliver(channel, message, sender)
+
+    async def _deliver(self, channel: str, message: str, sender: Subscriber = None):
+        for callback in self._subscribers.get(channel, []):
+            if callback == sender:
+                continue
+            try:
+                await callback(message)
+            except Exception as e:
+                print(f"Error delivering message on '{channel}': {e}")
+
+
+class UnixSocketPubSub(LocalPubSub):
+    """
+    Fans messages out to every process that uses the same socket path. The process
+    holding the lock file runs the hub: it accepts the other processes' connections and
+    forwards each message to all of them. The others connect as peers and, if the hub
+    goes away, one of them takes over. Messages published while no hub is reachable are
+    only delivered locally.
+    """
+
+    def __init__(self, path: str = DEFAULT_SOCKET_PATH, max_buffer: int = 4 * 1024 * 1024,
+                 retry_interval: float = 0.5):
+        super().__init__()
+        self.path = path
+        self.max_buffer = max_buffer  # Bytes queued for one peer before its messages are dropped
+        self.retry_interval = retry_interval
+        self.is_hub = False
+        self._peers: List[asyncio.StreamWriter] = []  # Hub: connected processes; peer: the hub
+        self._server = None
+        self._lock_fd = None
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._close()
+
+    async def publish(self, channel: str, message: str, sender: Subscriber = None):
+        await self._deliver(channel, message, sender)
+        self._forward(_encode(channel, message))
+
+    def _forward(self, frame: bytes, source: asyncio.StreamWriter = None):
+        for writer in self._peers[:]:
+            if writer is source:
+                continue
+            if writer.is_closing():
+                self._peers.remove(writer)
+                continue
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                metrics.PUBSUB_DROPPED.inc()
+                continue
+            writer.write(frame)
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                if self._try_lock():
+                    await self._serve()
+                else:
+                    await self._connect()
+            except (FileNotFoundError, ConnectionRefusedError):
+                pass  # No hub listening yet; retry, possibly as the hub
+            except (OSError, asyncio.IncompleteReadError) as e:
+                print(f"Broadcast hub connection lost: {e}")
+            self._close()
+            await asyncio.sleep(self.retry_interval)
+
+    async def _serve(self):
+        # Holding the lock means any existing socket file is left over from a dead hub
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_peer, self.path)
+        self.is_hub = True
+        print(f"Broadcast hub listening on {self.path} (pid {os.getpid()})")
+        await self._server.serve_forever()
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.append(writer)
+        try:
+            while True:
+                data = await _read_frame(reader)
+                channel, message = _decode(data)
+                await self._deliver(channel, message)
+                self._forward(_HEADER.pack(len(data)) + data, source=writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if writer in self._peers:
+                self._peers.remove(writer)
+            writer.close()
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        self._peers = [writer]
+        while True:
+            channel, message = _decode(await _read_frame(reader))
+            await self._deliver(channel, message)
+
+    def _close(self):
+        for writer in self._peers:
+            writer.close()
+        self._peers = []
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Releases the lock so another process can become the hub
+            self._lock_fd = None
+        self.is_hub = False
+
+
+def _encode(channel: str, message: str) -> bytes:
+    data = f"{channel}\n{message}".encode("utf-8")
+    return _HEADER.pack(len(data)) + data
+
+def _decode(data: bytes):
+    channel, _, message = data.decode("utf-8").partition("\n")
+    return channel, message
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    """The data of the next frame, without its length header."""
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return await reader.readexactly(size)
+
+def create_pubsub(backend: str = None, socket_path: str = None) -> LocalPubSub:
+    """Pub/sub backend by name (default: BROADCAST_BACKEND, else "local")."""
+    backend = backend or os.environ.get("BROADCAST_BACKEND", "local")
+    if backend == "local":
+        return LocalPubSub()
+    if backend == "unix":
+        return UnixSocketPubSub(socket_path or os.environ.get("BROADCAST_SOCKET", DEFAULT_SOCKET_PATH))
+    raise ValueError(f"Unknown broadcast backend '{backend}', expected one of {PUBSUB_BACKENDS}")
+
+
+class Broadcaster:
+    """Connected dashboard WebSockets and fan-out of result messages to all of them."""
+
+    def __init__(self, pubsub: LocalPubSub = None, channel: str = BROADCAST_CHANNEL):
+        self.clients: List[WebSocket] = []
+        self.pubsub = pubsub or create_pubsub()
+        self.channel = channel
+        self.pubsub.subscribe(channel, self._send)
+
+    async def start(self):
+        await self.pubsub.start()
+
+    async def stop(self):
+        await self.pubsub.stop()
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        self.clients.append(websocket)
+
+    def disconnect(self, websocket: WebSocket):
+        if websocket in self.clients:
+            self.clients.remove(websocket)
+
+    async def broadcast(self, message: str, exclude: WebSocket = None):
+        """Send message to every client on every worker (but exclude)."""
+        await self._send(message, exclude)
+        await self.pubsub.publish(self.channel, message, sender=self._send)
+
+    async def _send(self, message: str, exclude: WebSocket = None):
+        """Send message to this process's clients and clean up dead connections."""
+        start = time.perf_counter()
+        for ws in self.clients[:]:  # Iterate over a copy; failed clients are removed
+            if ws is exclude:
+                continue
+            try:
+                await ws.send_text(message)
+            except Exception as e:
+                print(f"Failed to send to client: {e}")
+                self.disconnect(ws)
+        metrics.BROADCAST_SECONDS.observe_since(start)
+
+    def __len__(self):
+        return len(self.clients)
@@ -0,0 +1,244 @@
+"""
+Catalog of the data files. Per-file statistics are computed once, when a file is
+uploaded (uploads.py) or built (SequenceBuilder), and stored in files.metadata, so
+listing, filtering and aggregating datasets, and checking a training data_dir, never
+read the data itself.
+
+Metadata of a catalogued file:
+    kind              "frames" (a recording: array of frames), "sequences" (fall
+                      sequence file), "empty" (an empty array, a recording without
+                      frames) or "other"
+    frames            frames in the file (across all sequences for a sequence file)
+    labelled_frames   frames with a people_count label
+    sequences         sequences in the file
+    labels            {label: count}: people_count of each frame, or label of each sequence
+    points_per_frame  {"min", "max", "mean", "std"} of the points per frame, None without frames
+    time_range_ms     [first, last] "Time Stamp (ms)", None if the frames have none
+    sha256            SHA-256 of the content
+"""
+import json
+import os
+from glob import glob
+from typing import Dict, Optional
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from database import model_db
+from utils import get_data_dir, get_data_subdir
+
+CATALOG_VERSION = 2  # 2: empty arrays are kind "empty" instead of "other"
+LABEL_KEY = "people_count"  # occupancy label, as model.preprocessing reads it
+TIMESTAMP_KEY = "Time Stamp (ms)"
+
+
+class FileStats:
+    """Accumulates a file's catalog statistics one record (frame or sequence) at a time."""
+
+    def __init__(self):
+        self.kind = "other"
+        self.frames = 0
+        self.labelled_frames = 0
+        self.sequences = 0
+        self.labels: Dict[str, int] = {}
+        self.points_min = None
+        self.points_max = None
+        self.points_sum = 0
+        self.points_sq_sum = 0
+        self.time_min = None
+        self.time_max = None
+
+    def add_text(self, text: str):
+        """Add a record given as JSON text, as JsonStreamValidator(on_object=...) passes it."""
+        self.add(json.loads(text))
+
+    def add(self, record):
+        if not isinstance(record, dict):
+            return
+        frames = record.get("frames")
+        if isinstance(frames, list):
+            self.kind = "sequences"
+            self.sequences += 1
+            if record.get("label") is not None:
+                self._count(record["label"])
+            for frame in frames:
+                if isinstance(frame, dict):
+                    self._add_frame(frame, count_label=False)
+        elif "x_pos" in record:
+            if self.kind == "other":
+                self.kind = "frames"
+            self._add_frame(record, count_label=True)
+
+    def _count(self, label):
+        key = str(label)
+        self.labels[key] = self.labels.get(key, 0) + 1
+
+    def _add_frame(self, frame: dict, count_label: bool):
+        self.frames += 1
+        points = frame.get("x_pos")
+        n = len(points) if isinstance(points, list) else 0
+        self.points_min = n if self.points_min is None else min(self.points_min, n)
+        self.points_max = n if self.points_max is None else max(self.points_max, n)
+        self.points_sum += n
+        self.points_sq_sum += n * n
+
+        timestamp = frame.get(TIMESTAMP_KEY)
+        if isinstance(timestamp, (int, float)):
+            self.time_min = timestamp if self.time_min is None else min(self.time_min, timestamp)
+            self.time_max = timestamp if self.time_max is None else max(self.time_max, timestamp)
+
+        label = frame.get(LABEL_KEY)
+        if label is not None:
+            self.labelled_frames += 1
+            if count_label:
+                self._count(label)
+
+    def metadata(self, content_sha256: str, empty_array: bool = False) -> dict:
+        """empty_array: the document is [], as JsonStreamValidator.empty_array reports it."""
+        kind = "empty" if empty_array else self.kind
+        points = None
+        if self.frames:
+            mean = self.points_sum / self.frames
+            points = {
+                "min": self.points_min,
+                "max": self.points_max,
+                "mean": mean,
+                "std": max(self.points_sq_sum / self.frames - mean * mean, 0.0) ** 0.5
+            }
+        return {
+            "catalog_version": CATALOG_VERSION,
+            "kind": kind,
+            "frames": self.frames,
+            "labelled_frames": self.labelled_frames,
+            "sequences": self.sequences,
+            "labels": dict(sorted(self.labels.items())),
+            "points_per_frame": points,
+            "time_range_ms": [self.time_min, self.time_max] if self.time_min is not None else None,
+            "sha256": content_sha256
+        }
+
+
+def scan_file(path: str) -> dict:
+    """
+    Catalog metadata of a JSON file on disk, streamed through the upload validator
+    (one piece in memory at a time). Raises uploads.InvalidJSON for invalid content.
+    """
+    import hashlib
+    from uploads import JsonStreamValidator, PIECE_SIZE
+
+    stats = FileStats()
+    validator = JsonStreamValidator(on_object=stats.add_text)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(PIECE_SIZE)
+            if not data:
+                break
+            validator.feed(data)
+            sha256.update(data)
+    validator.close()
+    return stats.metadata(sha256.hexdigest(), validator.empty_array)
+
+
+def register_file(path: str, metadata: dict, db=model_db) -> bool:
+    """Store metadata in the file's record, creating the record if the file has none."""
+    path = os.path.abspath(path)
+    size = os.path.getsize(path)
+    if db.update_file(path, size, metadata, metadata.get("sha256")):
+        return True
+    return db.add_file(
+        filename=os.path.basename(path),
+        file_path=path,
+        file_size_bytes=size,
+        content_type="application/json",
+        metadata=metadata,
+        content_sha256=metadata.get("sha256")
+    )
+
+
+def catalog_file(path: str, db=model_db) -> dict:
+    """Scan a file and store its metadata in the catalog."""
+    metadata = scan_file(path)
+    register_file(path, metadata, db)
+    return metadata
+
+
+def check_data_dir(data_dir: str, num_classes: int) -> Optional[str]:
+    """
+    Why training on data_dir would fail, judged from the catalog alone; None if it looks
+    trainable or some of its files are not catalogued (and so cannot be judged).
+    """
+    data_path = get_data_subdir(data_dir)
+    paths = set(glob(os.path.join(data_path, '*.json')))
+    if not paths:
+        return f"No JSON files in data directory '{data_dir}'"
+    records = model_db.query_catalog(directory=data_path)
+    catalogued = {record["file_path"] for record in records
+                  if (record.get("metadata") or {}).get("catalog_version") is not None}
+    if not paths <= catalogued:
+        return None
+
+    # load_all_frames reads each file as an array of frames; an empty array adds none
+    records = [record for record in records if record["file_path"] in paths]
+    metadata = [record["metadata"] for record in records]
+    if any(m["kind"] == "other" and m["frames"] == 0 and m["sequences"] == 0
+           and m["catalog_version"] < CATALOG_VERSION for m in metadata):
+        return None  # an empty array and an object looked the same before version 2
+    other = sorted(record["filename"] for record in records
+                   if record["metadata"]["kind"] not in ("frames", "empty"))
+    if other:
+        return f"Data directory '{data_dir}' has files that are not frame recordings: {', '.join(other)}"
+    summary = model_db.summarize_catalog(directory=data_path)
+    if summary["labelled_frames"] == 0:
+        return f"Data directory '{data_dir}' has no frames labelled with '{LABEL_KEY}'"
+    counts = [int(label) for label in summary["labels"] if label.lstrip("-").isdigit()]
+    if counts and (max(counts) >= num_classes or min(counts) < 0):
+        return (f"Data directory '{data_dir}' has {LABEL_KEY} values from {min(counts)} to {max(counts)}, "
+                f"which do not fit num_classes={num_classes}")
+    return None
+
+
+router = APIRouter(prefix="/catalog")
+
+
+def _directory(data_dir: Optional[str]) -> Optional[str]:
+    return get_data_subdir(data_dir) if data_dir is not None else None
+
+
+@router.get("")
+async def list_catalog(data_dir: Optional[str] = None, kind: Optional[str] = None,
+                       label: Optional[str] = None, min_frames: Optional[int] = None):
+    """Files with their statistics, filtered by directory, kind, label or frame count."""
+    files = model_db.query_catalog(_directory(data_dir), kind, label, min_frames)
+    return JSONResponse(content={"status": "success", "files": files, "total_files": len(files)})
+
+
+@router.get("/summary")
+async def catalog_summary(data_dir: Optional[str] = None, kind: Optional[str] = None,
+                          label: Optional[str] = None, min_frames: Optional[int] = None):
+    """Frame, label and point statistics aggregated over the matching files."""
+    summary = model_db.summarize_catalog(_directory(data_dir), kind, label, min_frames)
+    return JSONResponse(content={"status": "success", "summary": summary})
+
+
+def rescan(force: bool = False) -> dict:
+    """Catalog the JSON files in the data directory that have no statistics yet (or all)."""
+    known = {record["file_path"]: record for record in model_db.get_all_files()}
+    scanned, failed = [], {}
+    data_dir = get_data_dir()
+    for path in sorted(glob(os.path.join(data_dir, "**", "*.json"), recursive=True)):
+        metadata = (known.get(path) or {}).get("metadata") or {}
+        if metadata.get("catalog_version") == CATALOG_VERSION and not force:
+            continue
+        try:
+            catalog_file(path)
+            scanned.append(os.path.relpath(path, data_dir))
+        except (OSError, ValueError) as e:
+            failed[os.path.relpath(path, data_dir)] = str(e)
+    return {"scanned": scanned, "failed": failed}
+
+
+@router.post("/rescan")
+async def rescan_catalog(force: bool = False):
+    """Compute statistics for data files added without an upload (or recompute all)."""
+    result = await run_in_threadpool(rescan, force)
+    return JSONResponse(content={"status": "success", **result})
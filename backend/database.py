@@ -38,9 +38,17 @@ class ModelDatabase:
                     file_size_bytes INTEGER NOT NULL,
                     content_type TEXT,
                     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    metadata TEXT
+                    metadata TEXT,
+                    content_sha256 TEXT
                 )
             ''')
+
+            # Databases created before content hashing lack the column; their rows are
+            # hashed on demand when an upload of the same size arrives
+            cursor.execute('PRAGMA table_info(files)')
+            if 'content_sha256' not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute('ALTER TABLE files ADD COLUMN content_sha256 TEXT')
+            cursor.execute('CREATE INDEX IF NOT EXISTS files_size ON files (file_size_bytes)')
             conn.commit()
 
     def add_model(self, 
@@ -91,6 +99,25 @@ class ModelDatabase:
                 return model_dict
             return None
     
+    def update_model_metadata(self, name: str, updates: Dict) -> Optional[Dict]:
+        """Merge updates into a model's metadata. Returns the new metadata, or None if not found."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT metadata FROM models WHERE name = ?', (name,))
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                metadata = json.loads(row[0]) if row[0] else {}
+                metadata.update(updates)
+                cursor.execute('UPDATE models SET metadata = ? WHERE name = ?',
+                               (json.dumps(metadata), name))
+                conn.commit()
+                return metadata
+        except Exception as e:
+            print(f"Error updating model metadata: {e}")
+            return None
+
     def get_all_models(self) -> List[Dict]:
         """Get all models from the database."""
         with sqlite3.connect(self.db_path) as conn:
@@ -113,18 +140,19 @@ class ModelDatabase:
                  file_path: str,
                  file_size_bytes: int,
                  content_type: str = None,
-                 metadata: Dict = None) -> bool:
+                 metadata: Dict = None,
+                 content_sha256: str = None) -> bool:
         """Add a file record to the database."""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO files 
-                    (filename, file_path, file_size_bytes, content_type, metadata)
-                    VALUES (?, ?, ?, ?, ?)
+                    (filename, file_path, file_size_bytes, content_type, metadata, content_sha256)
+                    VALUES (?, ?, ?, ?, ?, ?)
                 ''', (
                     filename, file_path, file_size_bytes, content_type,
-                    json.dumps(metadata) if metadata else None
+                    json.dumps(metadata) if metadata else None, content_sha256
                 ))
                 conn.commit()
                 return True
@@ -164,6 +192,141 @@ class ModelDatabase:
             
             return files
 
+    def get_files_by_size(self, file_size_bytes: int) -> List[Dict]:
+        """File records of the given size, the candidates for a content-hash match."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM files WHERE file_size_bytes = ? ORDER BY id', (file_size_bytes,))
+            columns = [description[0] for description in cursor.description]
+            files = []
+            for row in cursor.fetchall():
+                file_dict = dict(zip(columns, row))
+                if file_dict.get('metadata'):
+                    file_dict['metadata'] = json.loads(file_dict['metadata'])
+                files.append(file_dict)
+            return files
+
+    def set_file_hash(self, file_id: int, content_sha256: str) -> bool:
+        """Store the SHA-256 of a file record's content."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('UPDATE files SET content_sha256 = ? WHERE id = ?', (content_sha256, file_id))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            print(f"Error storing file hash: {e}")
+            return False
+
+    def update_file(self,
+                    file_path: str,
+                    file_size_bytes: int,
+                    metadata: Dict = None,
+                    content_sha256: str = None) -> bool:
+        """Replace the size, metadata and hash of the record for file_path. False if there is none."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE files SET file_size_bytes = ?, metadata = ?, content_sha256 = ?
+                    WHERE file_path = ?
+                ''', (file_size_bytes, json.dumps(metadata) if metadata else None, content_sha256, file_path))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            print(f"Error updating file in database: {e}")
+            return False
+
+    @staticmethod
+    def _catalog_filter(directory: str = None, kind: str = None, label: str = None,
+                        min_frames: int = None):
+        """WHERE clause over files.metadata (see catalog.py); directory matches its direct children."""
+        clauses, params = [], []
+        if directory is not None:
+            prefix = os.path.join(os.path.normpath(directory), '')
+            clauses.append("substr(file_path, 1, length(?)) = ? AND instr(substr(file_path, length(?) + 1), '/') = 0")
+            params += [prefix, prefix, prefix]
+        if kind is not None:
+            clauses.append("json_extract(metadata, '$.kind') = ?")
+            params.append(kind)
+        if label is not None:
+            clauses.append("EXISTS (SELECT 1 FROM json_each(files.metadata, '$.labels') WHERE key = ?)")
+            params.append(label)
+        if min_frames is not None:
+            clauses.append("json_extract(metadata, '$.frames') >= ?")
+            params.append(min_frames)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query_catalog(self, directory: str = None, kind: str = None, label: str = None,
+                      min_frames: int = None) -> List[Dict]:
+        """File records matching the catalog filters, filtered in SQLite."""
+        where, params = self._catalog_filter(directory, kind, label, min_frames)
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM files' + where + ' ORDER BY file_path', params)
+            columns = [description[0] for description in cursor.description]
+            files = []
+            for row in cursor.fetchall():
+                file_dict = dict(zip(columns, row))
+                if file_dict.get('metadata'):
+                    file_dict['metadata'] = json.loads(file_dict['metadata'])
+                files.append(file_dict)
+            return files
+
+    def summarize_catalog(self, directory: str = None, kind: str = None, label: str = None,
+                          min_frames: int = None) -> Dict:
+        """Totals, label histogram and point statistics over the matching files' metadata."""
+        where, params = self._catalog_filter(directory, kind, label, min_frames)
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*),
+                       SUM(json_extract(metadata, '$.catalog_version') IS NULL),
+                       SUM(file_size_bytes),
+                       SUM(json_extract(metadata, '$.frames')),
+                       SUM(json_extract(metadata, '$.labelled_frames')),
+                       SUM(json_extract(metadata, '$.sequences')),
+                       MIN(json_extract(metadata, '$.points_per_frame.min')),
+                       MAX(json_extract(metadata, '$.points_per_frame.max')),
+                       SUM(json_extract(metadata, '$.frames') * json_extract(metadata, '$.points_per_frame.mean')),
+                       SUM(json_extract(metadata, '$.frames') * (
+                           json_extract(metadata, '$.points_per_frame.std') * json_extract(metadata, '$.points_per_frame.std') +
+                           json_extract(metadata, '$.points_per_frame.mean') * json_extract(metadata, '$.points_per_frame.mean'))),
+                       SUM(CASE WHEN json_extract(metadata, '$.points_per_frame') IS NOT NULL
+                                THEN json_extract(metadata, '$.frames') END),
+                       MIN(json_extract(metadata, '$.time_range_ms[0]')),
+                       MAX(json_extract(metadata, '$.time_range_ms[1]'))
+                FROM files''' + where, params)
+            (files, uncatalogued, size, frames, labelled, sequences, points_min, points_max,
+             points_sum, points_sq_sum, points_frames, time_min, time_max) = cursor.fetchone()
+
+            cursor.execute('''
+                SELECT labels.key, SUM(labels.value)
+                FROM files, json_each(files.metadata, '$.labels') AS labels''' + where +
+                ' GROUP BY labels.key ORDER BY labels.key', params)
+            label_counts = {key: count for key, count in cursor.fetchall()}
+
+        points = None
+        if points_frames:
+            mean = points_sum / points_frames
+            points = {
+                "min": points_min,
+                "max": points_max,
+                "mean": mean,
+                "std": max(points_sq_sum / points_frames - mean * mean, 0.0) ** 0.5
+            }
+        return {
+            "files": files,
+            "uncatalogued_files": uncatalogued or 0,
+            "size_bytes": size or 0,
+            "frames": frames or 0,
+            "labelled_frames": labelled or 0,
+            "sequences": sequences or 0,
+            "labels": label_counts,
+            "points_per_frame": points,
+            "time_range_ms": [time_min, time_max] if time_min is not None else None
+        }
+
     def delete_file(self, filename: str) -> bool:
         """Delete a file record from the database."""
         try:
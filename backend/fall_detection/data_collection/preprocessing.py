@@ -3,6 +3,9 @@ import json
 import numpy as np
 import random
 from torch.utils.data import Dataset, DataLoader
+from model.sampling import DEFAULT_SAMPLING, select_indices
+
+TIMESTAMP_KEY = "Time Stamp (ms)"
 
 def train_test_split(sequences, labels, test_size=0.2, random_seed=42):
     """
@@ -41,12 +44,34 @@ def train_test_split(sequences, labels, test_size=0.2, random_seed=42):
     
     return train_sequences, val_sequences, train_labels, val_labels
 
-def load_sequences(data_dir):
+def _frame_cloud(frame, channels=None):
+    """
+    Stack a frame's points as (Ni, 3), or (Ni, 4) with SNR when it is available
+    With channels=5, always (Ni, 5) x,y,z,snr,noise like the occupancy data (zeros when missing)
+    """
+    columns = [frame['x_pos'], frame['y_pos'], frame['z_pos']]
+    if channels == 5:
+        n = len(frame['x_pos'])
+        for key in ('snr', 'noise'):
+            values = frame.get(key)
+            columns.append(values if values is not None and len(values) == n else np.zeros(n))
+        return np.stack(columns, axis=1)
+    snr = frame.get('snr')
+    if snr is not None and len(snr) == len(frame['x_pos']):
+        columns.append(snr)
+    return np.stack(columns, axis=1)
+
+def load_sequences(data_dir, return_timestamps=False, channels=None):
     """
     Load fall and no-fall sequences from JSON files
+    Frames with per-point SNR keep it as a 4th column (x,y,z,snr) for SNR-based sampling
+    With return_timestamps, also return each sequence's frame timestamps (ms), which
+    identify frames shared by overlapping sequences of the same recording
+    channels=5 loads x,y,z,snr,noise for models that share the occupancy input
     """
     sequences = []
     labels = []
+    timestamps = []
     
     # Load fall sequences
     fall_path = os.path.join(data_dir, "fall_sequences.json")
@@ -56,14 +81,12 @@ def load_sequences(data_dir):
             for seq in data["sequences"]:
                 # Extract point clouds from frames
                 sequence_clouds = []
+                sequence_times = []
                 for frame in seq["frames"]:
-                    xyz = np.stack([
-                        frame['x_pos'],
-                        frame['y_pos'],
-                        frame['z_pos']
-                    ], axis=1)  # shape (Ni, 3)
-                    sequence_clouds.append(xyz)
+                    sequence_clouds.append(_frame_cloud(frame, channels))  # shape (Ni, 3), (Ni, 4) or (Ni, 5)
+                    sequence_times.append(frame.get(TIMESTAMP_KEY))
                 sequences.append(sequence_clouds)
+                timestamps.append(sequence_times)
                 labels.append(1)  # 1 for fall
     
     # Load no-fall sequences
@@ -73,41 +96,46 @@ def load_sequences(data_dir):
             data = json.load(f)
             for seq in data["sequences"]:
                 sequence_clouds = []
+                sequence_times = []
                 for frame in seq["frames"]:
-                    xyz = np.stack([
-                        frame['x_pos'],
-                        frame['y_pos'],
-                        frame['z_pos']
-                    ], axis=1)
-                sequence_clouds.append(xyz)
+                    sequence_clouds.append(_frame_cloud(frame, channels))
+                    sequence_times.append(frame.get(TIMESTAMP_KEY))
                 sequences.append(sequence_clouds)
+                timestamps.append(sequence_times)
                 labels.append(0)  # 0 for no_fall
     
     print(f"Loaded {len(sequences)} sequences")
     print(f"Falls: {labels.count(1)}, No Falls: {labels.count(0)}")
+    if return_timestamps:
+        return sequences, labels, timestamps
     return sequences, labels
 
 class FallDetectionDataset(Dataset):
-    def __init__(self, sequences, labels, num_points=128, sequence_length=30):
+    def __init__(self, sequences, labels, num_points=128, sequence_length=30, sampling=DEFAULT_SAMPLING,
+                 timestamps=None, channels=3):
         self.sequences = sequences  # List of sequences, each with variable frames
         self.labels = labels
+        self.timestamps = timestamps  # Optional per-frame timestamps, parallel to sequences
+        self.channels = channels  # Point features fed to the model (3: x,y,z; 5: x,y,z,snr,noise)
         self.num_points = num_points
         self.sequence_length = sequence_length
+        self.sampling = sampling
         
     def __len__(self):
         return len(self.sequences)
     
+    def normalize_frame(self, cloud):
+        """Normalize one frame to a fixed number of points with self.channels features"""
+        N = cloud.shape[0]
+        if N >= self.num_points:
+            choice = select_indices(cloud, self.num_points, self.sampling)
+            return cloud[choice, :self.channels]
+        pad = np.zeros((self.num_points - N, self.channels), dtype=cloud.dtype)
+        return np.vstack([cloud[:, :self.channels], pad])
+
     def normalize_sequence(self, sequence):
         """Normalize each frame in sequence to fixed number of points"""
-        normalized = []
-        for cloud in sequence:
-            N = cloud.shape[0]
-            if N >= self.num_points:
-                choice = np.random.choice(N, self.num_points, replace=False)
-                normalized.append(cloud[choice, :])
-            else:
-                pad = np.zeros((self.num_points - N, 3), dtype=cloud.dtype)
-                normalized.append(np.vstack([cloud, pad]))
+        normalized = [self.normalize_frame(cloud) for cloud in sequence]
         
         # Ensure sequence length is fixed
         if len(normalized) > self.sequence_length:
@@ -115,11 +143,11 @@ class FallDetectionDataset(Dataset):
             normalized = normalized[-self.sequence_length:]
         elif len(normalized) < self.sequence_length:
             # Pad with copies of the last frame
-            last_frame = normalized[-1] if normalized else np.zeros((self.num_points, 3))
+            last_frame = normalized[-1] if normalized else np.zeros((self.num_points, self.channels))
             while len(normalized) < self.sequence_length:
                 normalized.append(last_frame.copy())
         
-        return np.stack(normalized)  # (sequence_length, num_points, 3)
+        return np.stack(normalized)  # (sequence_length, num_points, channels)
     
     def __getitem__(self, idx):
         sequence = self.sequences[idx]  # List of (Ni, 3) arrays
@@ -136,30 +164,39 @@ def get_dataloaders(data_dir,
                     sequence_length=30,
                     test_split=0.2,
                     random_seed=42,
-                    return_raw=False):
+                    return_raw=False,
+                    sampling=DEFAULT_SAMPLING,
+                    channels=3):
     """Create train and validation dataloaders"""
     
     # Load sequences and labels
-    sequences, labels = load_sequences(data_dir)
+    sequences, labels, timestamps = load_sequences(data_dir, return_timestamps=True,
+                                                   channels=5 if channels == 5 else None)
     
     # Return raw data if requested (for class weights calculation)
     if return_raw:
         return sequences, labels
     
-    # Split data while maintaining class balance
+    # Split data while maintaining class balance (timestamps travel with their sequence)
     X_train, X_val, y_train, y_val = train_test_split(
-        sequences, labels,
+        list(zip(sequences, timestamps)), labels,
         test_size=test_split,
         random_seed=random_seed
     )
     
     # Create datasets
-    train_ds = FallDetectionDataset(X_train, y_train, 
+    train_ds = FallDetectionDataset([seq for seq, _ in X_train], y_train, 
                                    num_points=num_points,
-                                   sequence_length=sequence_length)
-    val_ds = FallDetectionDataset(X_val, y_val, 
+                                   sequence_length=sequence_length,
+                                   sampling=sampling,
+                                   timestamps=[ts for _, ts in X_train],
+                                   channels=channels)
+    val_ds = FallDetectionDataset([seq for seq, _ in X_val], y_val, 
                                  num_points=num_points,
-                                 sequence_length=sequence_length)
+                                 sequence_length=sequence_length,
+                                 sampling=sampling,
+                                 timestamps=[ts for _, ts in X_val],
+                                 channels=channels)
     
     # Create dataloaders with proper shuffling
     train_loader = DataLoader(train_ds,
@@ -1,18 +1,25 @@
 import json
+import os
+import sys
 from pathlib import Path
 from typing import List, Dict, Any
 
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 class SequenceBuilder:
-    def __init__(self, sequence_length: int = 30, frame_variations: int = 0, no_fall_slide: int = 30):
+    def __init__(self, sequence_length: int = 30, frame_variations: int = 0, no_fall_slide: int = 30,
+                 catalog_db: str = None):
         """
         Initialize sequence builder
         sequence_length: number of frames per sequence
         frame_variations: number of frame variations before/after fall (+/-)
         no_fall_slide: number of frames to skip for no-fall sequences
+        catalog_db: models database to record each written file's statistics in (see catalog.py)
         """
         self.sequence_length = sequence_length
         self.frame_variations = frame_variations
         self.no_fall_slide = no_fall_slide
+        self.catalog_db = catalog_db
         
     def find_nearest_frame(self, frames: List[Dict], timestamp_ms: int) -> int:
         """Find index of frame closest to timestamp"""
@@ -32,6 +39,17 @@ class SequenceBuilder:
             "end_time": sequence_frames[-1]["Time Stamp (ms)"]
         }
     
+    def catalog(self, output_json: str):
+        """Store the written file's frame/label statistics in the catalog, if configured"""
+        if self.catalog_db is None:
+            return
+        if BACKEND_DIR not in sys.path:
+            sys.path.append(BACKEND_DIR)
+        from database import ModelDatabase
+        from catalog import catalog_file
+        metadata = catalog_file(output_json, ModelDatabase(self.catalog_db))
+        print(f"Cataloged {output_json}: {metadata['sequences']} sequences, labels {metadata['labels']}")
+
     def build_no_fall_sequences(self, input_json: str, output_json: str):
         """
         Create sequences from normal activity using sliding window with skip
@@ -67,6 +85,7 @@ class SequenceBuilder:
             json.dump({"sequences": all_sequences}, f, indent=2)
             
         print(f"Created {len(sequences)} no-fall sequences")
+        self.catalog(output_json)
     
     def build_fall_sequences(self, input_json: str, timestamps_json: str, output_json: str):
         """
@@ -112,6 +131,7 @@ class SequenceBuilder:
             
         print(f"Created {len(sequences)} new fall sequences from {len(fall_events)} events")
         print(f"Total fall sequences: {len(all_sequences)}")
+        self.catalog(output_json)
 
 def process_data():
     """Process both fall and no-fall data"""
@@ -122,7 +142,8 @@ def process_data():
     builder = SequenceBuilder(
         sequence_length=30,
         frame_variations=0,  # No frame variations for falls
-        no_fall_slide=30      # No sliding window for no-falls
+        no_fall_slide=30,     # No sliding window for no-falls
+        catalog_db=os.path.join(BACKEND_DIR, "models.db")
     )
     
     # Process no-fall data
@@ -1,92 +1,146 @@
+import base64
+import time
 import torch
 import numpy as np
-from collections import deque
-from ..model.pointnet_lstm import PointNetLSTM
+from collections import OrderedDict, deque
+from ..model.pointnet_lstm import PointNetLSTM, load_model_metadata
+from model.sampling import DEFAULT_SAMPLING, select_indices
+import metrics
+from profiling import profiler
+
+MODEL_LABEL = "fall_detector"
+
+class FallSession:
+    """One sensor's most recent normalized frames plus its fall-probability EMA."""
+
+    def __init__(self, sequence_length):
+        # Using append for oldest→newest order
+        self.frame_buffer = deque(maxlen=sequence_length)
+        self.ema_value = None  # Will be initialized on first prediction
 
 class FallDetector:
-    def __init__(self, model_path, sequence_length=30, num_points=128, device=None):
+    def __init__(self, model_path, sequence_length=30, num_points=128, device=None, sampling=None, max_sensors=1024):
         self.sequence_length = sequence_length
         self.num_points = num_points
+        self.max_sensors = max_sensors
         self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        # Use the point-selection strategy recorded when the weights were trained
+        self.sampling = sampling or load_model_metadata(model_path).get('sampling', DEFAULT_SAMPLING)
         
         # Initialize model
-        self.model = PointNetLSTM(num_points=num_points)
-        state_dict = torch.load(model_path, map_location=self.device)
-        self.model.load_state_dict(state_dict)
-        self.model.to(self.device)
-        self.model.eval()
+        self.model = self.load_model(model_path)
         
-        # Initialize frame buffer as a deque with maxlen
-        # Using append for oldest→newest order
-        self.frame_buffer = deque(maxlen=sequence_length)
+        # Frame buffer and EMA per sensor (bounded LRU table)
+        self.sessions = OrderedDict()
         
-        # Initialize EMA
         self.ema_alpha = 0.7  # Higher alpha means more weight on recent values
-        self.ema_value = None  # Will be initialized on first prediction
+        self.threshold = 0.7  # Applied to the smoothed probability
         
-    def normalize_points(self, points):
+    def load_model(self, model_path):
+        """Load PointNetLSTM weights and warm the model with a dummy sequence"""
+        model = PointNetLSTM(num_points=self.num_points)
+        state_dict = torch.load(model_path, map_location=self.device)
+        model.load_state_dict(state_dict)
+        model.to(self.device)
+        model.eval()
+        with torch.no_grad():
+            model(torch.zeros(1, self.sequence_length, self.num_points, 3, device=self.device))
+        return model
+
+    def swap_model(self, model):
+        """Atomically replace the model used for inference (e.g. after a retrain)"""
+        self.model = model
+
+    def normalize_points(self, points, scores=None):
         """Normalize point cloud to fixed number of points"""
         N = len(points)
         if N >= self.num_points:
-            choice = np.random.choice(N, self.num_points, replace=False)
+            choice = select_indices(points, self.num_points, self.sampling, scores=scores)
             return points[choice]
         else:
             pad = np.zeros((self.num_points - N, 3), dtype=points.dtype)
             return np.vstack([points, pad])
             
-    def update_ema(self, new_value):
-        """Update exponential moving average"""
-        if self.ema_value is None:
-            self.ema_value = new_value
+    def prepare_frame(self, frame_data):
+        """Extract a frame's points and normalize them to (num_points, 3)"""
+        points = np.stack([
+            frame_data['x_pos'],
+            frame_data['y_pos'],
+            frame_data['z_pos']
+        ], axis=1)
+
+        snr = frame_data.get('snr')
+        scores = np.asarray(snr) if snr is not None and len(snr) == len(points) else None
+
+        return self.normalize_points(points, scores)
+            
+    def session(self, sensor_id="default"):
+        """The sensor's session, created on first use"""
+        session = self.sessions.get(sensor_id)
+        if session is not None:
+            self.sessions.move_to_end(sensor_id)
+            return session
+        session = FallSession(self.sequence_length)
+        self.sessions[sensor_id] = session
+        while len(self.sessions) > self.max_sensors:
+            self.sessions.popitem(last=False)  # evict least recently seen sensor
+        return session
+
+    def update_ema(self, session, new_value):
+        """Update the session's exponential moving average"""
+        if session.ema_value is None:
+            session.ema_value = new_value
         else:
-            self.ema_value = self.ema_alpha * new_value + (1 - self.ema_alpha) * self.ema_value
-        return self.ema_value
+            session.ema_value = self.ema_alpha * new_value + (1 - self.ema_alpha) * session.ema_value
+        return session.ema_value
             
-    def process_frame(self, frame_data):
-        """Process a single frame and return fall detection result
-        Returns None until buffer has enough frames for first inference"""
+    def process_frame(self, frame_data, sensor_id="default"):
+        """Process a single frame of sensor_id and return fall detection result
+        Returns None until the sensor's buffer has enough frames for first inference"""
         try:
-            # Extract and normalize point cloud
-            points = np.stack([
-                frame_data['x_pos'],
-                frame_data['y_pos'],
-                frame_data['z_pos']
-            ], axis=1)
-            
-            normalized_points = self.normalize_points(points)
+            start = time.perf_counter()
+            normalized_points = self.prepare_frame(frame_data)
+            session = self.session(sensor_id)
             # Add newest frame to the end, maintaining oldest→newest order
-            self.frame_buffer.append(normalized_points)
+            session.frame_buffer.append(normalized_points)
+            metrics.PREPROCESS_SECONDS.observe_since(start, MODEL_LABEL)
+            metrics.FRAMES_PROCESSED.inc(sensor_id, MODEL_LABEL)
             
             # Perform inference if we have enough frames
-            if len(self.frame_buffer) >= self.sequence_length:
-                return self.detect_fall()
+            if len(session.frame_buffer) >= self.sequence_length:
+                return self.detect_fall(session)
             
             return None
         except Exception as e:
             print(f"Error processing frame: {e}")
+            metrics.FRAMES_DROPPED.inc(sensor_id, MODEL_LABEL)
             return None
         
-    def detect_fall(self):
-        """Perform fall detection on current sequence"""
+    def detect_fall(self, session):
+        """Perform fall detection on the session's current sequence"""
         try:
-            with torch.no_grad():
+            with profiler.section("detect_fall"), torch.no_grad():
                 # Convert deque to numpy array
                 # Frames are in oldest→newest order
-                sequence = np.stack(list(self.frame_buffer))
+                sequence = np.stack(list(session.frame_buffer))
                 sequence = torch.from_numpy(sequence).float()
                 sequence = sequence.unsqueeze(0)  # Add batch dimension
                 sequence = sequence.to(self.device)
                 
-                # Get prediction
-                outputs = self.model(sequence)
+                # Get prediction (hold one reference in case the model is swapped mid-call)
+                model = self.model
+                start = time.perf_counter()
+                outputs = model(sequence)
                 probabilities = torch.softmax(outputs, dim=1)
                 fall_prob = probabilities[0, 1].item()
+                metrics.FORWARD_SECONDS.observe_since(start, MODEL_LABEL)
+                metrics.BATCH_SIZE.observe(sequence.shape[0], MODEL_LABEL)
                 
                 # Update EMA
-                smoothed_prob = self.update_ema(fall_prob)
+                smoothed_prob = self.update_ema(session, fall_prob)
                 
                 return {
-                    "is_fall": smoothed_prob > 0.7,  # Threshold applied to smoothed probability
+                    "is_fall": smoothed_prob > self.threshold,  # Threshold applied to smoothed probability
                     "fall_probability": smoothed_prob,  # Return smoothed probability
                     "raw_probability": fall_prob,  # Also return raw probability for debugging
                     "sequence_complete": True
@@ -95,7 +149,39 @@ class FallDetector:
             print(f"Error during fall detection: {e}")
             return None
             
-    def reset(self):
-        """Clear the frame buffer and reset EMA"""
-        self.frame_buffer.clear()
-        self.ema_value = None  # Reset EMA when clearing buffer 
\ No newline at end of file
+    def export_session(self, sensor_id):
+        """
+        JSON-serializable state of a sensor's session (frame buffer and EMA), for handing
+        the sensor over to another worker; None if the sensor has no session.
+        """
+        session = self.sessions.get(sensor_id)
+        if session is None:
+            return None
+        frames = np.asarray(list(session.frame_buffer), dtype=np.float32).reshape(-1, self.num_points, 3)
+        return {
+            "sequence_length": self.sequence_length,
+            "num_points": self.num_points,
+            "shape": list(frames.shape),
+            "frames": base64.b64encode(frames.tobytes()).decode("ascii"),
+            "ema_value": session.ema_value
+        }
+
+    def import_session(self, sensor_id, state):
+        """Replace sensor_id's session with one exported by export_session."""
+        if state["num_points"] != self.num_points:
+            raise ValueError(f"Session has {state['num_points']} points per frame, expected {self.num_points}")
+        frames = np.frombuffer(base64.b64decode(state["frames"]), dtype=np.float32).reshape(state["shape"])
+        session = FallSession(self.sequence_length)
+        session.frame_buffer.extend(frames.copy())  # keeps the newest sequence_length frames
+        session.ema_value = state.get("ema_value")
+        self.sessions[sensor_id] = session
+        self.sessions.move_to_end(sensor_id)
+        while len(self.sessions) > self.max_sensors:
+            self.sessions.popitem(last=False)
+
+    def reset(self, sensor_id=None):
+        """Clear one sensor's frame buffer and EMA or, with no sensor_id, every sensor's"""
+        if sensor_id is None:
+            self.sessions.clear()
+        else:
+            self.sessions.pop(sensor_id, None)
@@ -1,12 +1,24 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List
-from model.inference import predict_occupancy
-from fall_detection.inference.fall_detector import FallDetector
+from model.inference import predict
+from model.sampling import DEFAULT_SAMPLING
+from database import model_db
+from fall_detection.inference.fall_detector import FallDetector, MODEL_LABEL
+from fall_detection.sessions import session_router
+from registry import ModelRegistry, ModelSpec
+from ingest import timed_body, ConnectionStats
+from broadcast import Broadcaster
+from recorder import create_recorder
+import metrics
+import profiling
+import asyncio
 import json
 import os
+import time
 
 app = FastAPI()
 
@@ -16,6 +28,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.include_router(profiling.router)
 
 # Initialize fall detector
 model_paths = [
@@ -40,9 +53,33 @@ fall_detector = FallDetector(
     model_path=model_path  # Changed from weights_path to model_path
 )
 
-clients: List[WebSocket] = []
+# Watch the fall weights and swap retrained weights in without a restart
+model_registry = ModelRegistry()
+model_registry.register("fall_detector", ModelSpec(model_path, fall_detector.load_model))
+model_registry.subscribe("fall_detector", fall_detector.swap_model)
+model_registry.adopt("fall_detector", fall_detector.model)
+
+broadcaster = Broadcaster()
+
+# FallDetector's per-sensor sessions are not thread-safe, so frames are handed to the
+# threadpool one at a time in arrival order (asyncio.Lock is FIFO)
+fall_order = asyncio.Lock()
+
+# Messages of one /ws connection waiting for the fall detector; beyond this the oldest are dropped
+WS_QUEUE_SIZE = int(os.environ.get("WS_QUEUE_SIZE", 32))
+
+# Live /ws connections, reported by /ws/stats
+ws_connections = {}
+
+# Optional append-only recording of every frame and its result (set RECORDER_DIR)
+recorder = create_recorder()
+
+# Session export/import so the sensor router can move a sensor to another worker
+app.include_router(session_router(lambda: fall_detector, fall_order))
 
 class RadarPayload(BaseModel):
+    model_name: str = "default_model"  # Occupancy model used by /occupancy
+    sensor_id: str = "default"  # Selects the fall-detection session (frame buffer and EMA)
     x_pos:    List[float]
     y_pos:    List[float]
     z_pos:    List[float]
@@ -54,68 +91,161 @@ class RadarPayload(BaseModel):
         return [[self.x_pos[i], self.y_pos[i], self.z_pos[i]]
                 for i in range(len(self.x_pos))]
 
-async def broadcast_to_clients(message: str):
-    """Send message to all connected clients and clean up dead connections."""
-    dead = []
-    for ws in clients[:]:  # Create a copy of the list to iterate over
+@app.on_event("startup")
+async def start_model_registry():
+    """Start polling the fall model weights for hot-reload and join the other workers' broadcasts."""
+    model_registry.start()
+    await broadcaster.start()
+    if recorder is not None:
+        recorder.start()
+
+@app.on_event("shutdown")
+async def stop_model_registry():
+    model_registry.stop()
+    await broadcaster.stop()
+    if recorder is not None:
+        recorder.stop()
+
+def _process_ws_frame(data: dict, sensor_id: str) -> dict:
+    """Run one WebSocket frame through the fall detector and build its reply."""
+    frame = {
+        "x_pos": data["x_pos"],
+        "y_pos": data["y_pos"],
+        "z_pos": data["z_pos"],
+        "snr": data.get("snr", []),
+        "noise": data.get("noise", [])
+    }
+    fall_result = fall_detector.process_frame(frame, sensor_id)
+    if recorder is not None:
+        recorder.record(sensor_id, frame, fall_detection=fall_result)
+
+    # Create response message
+    message = {"point_data": frame}
+
+    # Add fall detection result if available
+    if fall_result:
+        message["fall_detection"] = fall_result
+    return message
+
+def _process_ws_message(data: dict) -> dict:
+    """Run one /ws message (a frame or {"frames": [...]}) through the fall detector."""
+    sensor_id = data.get("sensor_id", "default")
+    if "frames" in data:
+        return {"frames": [_process_ws_frame(frame, frame.get("sensor_id", sensor_id))
+                           for frame in data["frames"]]}
+    return _process_ws_frame(data, sensor_id)
+
+async def _in_order(function, *args):
+    """Run function in the threadpool, after the frames handed over before it."""
+    async with fall_order:
+        return await run_in_threadpool(function, *args)
+
+def _message_frames(data: dict) -> int:
+    return len(data["frames"]) if isinstance(data.get("frames"), list) else 1
+
+async def _ws_read(websocket: WebSocket, frames: asyncio.Queue, replies: asyncio.Queue, stats: ConnectionStats):
+    """Receive messages into the bounded frame queue, dropping the oldest when it is full."""
+    while True:
+        text = await websocket.receive_text()
+        received = time.perf_counter()
+        try:
+            data = json.loads(text)
+            if not isinstance(data, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            await replies.put((None, {"status": "error", "message": f"Invalid message: {e}"}, 0))
+            continue
+
+        metrics.QUEUE_DEPTH.observe(frames.qsize())
+        if frames.full():
+            # Behind: the oldest waiting message is the least useful one
+            _, old = frames.get_nowait()
+            dropped = _message_frames(old)
+            stats.dropped += dropped
+            sensor_id = old.get("sensor_id", "default")
+            metrics.FRAMES_DROPPED.inc(sensor_id, MODEL_LABEL, amount=dropped)
+            await replies.put((None, {"event": "dropped", "sensor_id": sensor_id, "frames": dropped}, 0))
+        frames.put_nowait((received, data))
+        stats.queued = frames.qsize()
+
+async def _ws_infer(frames: asyncio.Queue, replies: asyncio.Queue, stats: ConnectionStats):
+    """Run queued messages through the fall detector off the event loop, in order."""
+    while True:
+        received, data = await frames.get()
+        stats.queued = frames.qsize()
         try:
-            await ws.send_text(message)
-        except Exception as e:
-            print(f"Failed to send to client: {e}")
-            if ws in clients:  # Check if client is still in list
-                clients.remove(ws)
+            # Shielded: a disconnect must not release fall_order while the thread still runs
+            message = await asyncio.shield(_in_order(_process_ws_message, data))
+        except (KeyError, TypeError, AttributeError) as e:
+            message = {"status": "error", "message": f"Invalid frame: {e}"}
+        await replies.put((received, message, _message_frames(data)))
+
+async def _ws_write(websocket: WebSocket, replies: asyncio.Queue, stats: ConnectionStats):
+    """Send results (and drop/error notices) back, recording receive-to-result latency."""
+    while True:
+        received, message, count = await replies.get()
+        await websocket.send_json(message)
+        if received is not None:
+            stats.record(received, count)
+            metrics.WS_FRAME_SECONDS.observe_since(received, "fall")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """Handle WebSocket connections and process real-time data."""
-    await websocket.accept()
-    clients.append(websocket)
+    """
+    Handle WebSocket connections and process real-time data. A message is one frame,
+    or {"sensor_id": ..., "frames": [...]} with several frames of a sensor (processed
+    in order, answered with one {"frames": [...]} message).
+
+    Reading, inference and writing run as separate tasks, so the socket keeps being read
+    while a forward pass runs. Up to WS_QUEUE_SIZE messages wait for the detector; when
+    it falls further behind, the oldest is answered with {"event": "dropped", ...}
+    instead of a result. Replies of a slow client wait in a queue of the same size.
+    """
+    await broadcaster.connect(websocket)
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else "unknown"
+    stats = ConnectionStats(client)
+    ws_connections[id(websocket)] = stats
+    frames = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+    replies = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+    tasks = [
+        asyncio.create_task(_ws_read(websocket, frames, replies, stats)),
+        asyncio.create_task(_ws_infer(frames, replies, stats)),
+        asyncio.create_task(_ws_write(websocket, replies, stats))
+    ]
     try:
-        while True:
-            # Receive JSON data
-            data = await websocket.receive_json()
-            
-            # Process frame through fall detector
-            fall_result = fall_detector.process_frame({
-                "x_pos": data["x_pos"],
-                "y_pos": data["y_pos"],
-                "z_pos": data["z_pos"],
-                "snr": data.get("snr", []),
-                "noise": data.get("noise", [])
-            })
-
-            # Create response message
-            message = {
-                "point_data": {
-                    "x_pos": data["x_pos"],
-                    "y_pos": data["y_pos"],
-                    "z_pos": data["z_pos"],
-                    "snr": data.get("snr", []),
-                    "noise": data.get("noise", [])
-                }
-            }
-            
-            # Add fall detection result if available
-            if fall_result:
-                message["fall_detection"] = fall_result
-            
-            # Send back to client
-            await websocket.send_json(message)
-            
-    except WebSocketDisconnect:
-        if websocket in clients:
-            clients.remove(websocket)
-    except Exception as e:
-        print(f"Error processing frame: {e}")
-        if websocket in clients:
-            clients.remove(websocket)
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            e = task.exception()
+            if e is not None and not isinstance(e, WebSocketDisconnect):
+                print(f"Error processing frame: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        ws_connections.pop(id(websocket), None)
+        broadcaster.disconnect(websocket)
+
+@app.get("/ws/stats")
+async def ws_stats():
+    """Frames, drops, queue length and receive-to-result latency of each live /ws connection."""
+    return JSONResponse(content={
+        "status": "success",
+        "connections": [stats.to_dict() for stats in ws_connections.values()]
+    })
 
 @app.post("/occupancy")
 async def occupancy_hook(payload: RadarPayload):
     """Process radar data and broadcast results to WebSocket clients."""
-    sensor_data = payload.to_sensor_data()
+    model_info = model_db.get_model(payload.model_name)
+    if not model_info:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Model {payload.model_name} not found"}
+        )
 
-    result = predict_occupancy(sensor_data)
+    sensor_data = payload.to_sensor_data()
+    metadata = model_info.get('metadata') or {}
+    result = predict(sensor_data, payload.model_name, model_info['num_classes'], payload.snr, payload.noise,
+                     metadata.get('sampling', DEFAULT_SAMPLING), metadata.get('tta_draws', 1))
 
     combined_message = json.dumps({
         "occupancy": result,
@@ -127,23 +257,28 @@ async def occupancy_hook(payload: RadarPayload):
             "noise": payload.noise
         }
     })
-    await broadcast_to_clients(combined_message)
+    await broadcaster.broadcast(combined_message)
 
     return JSONResponse(content={
         "status": "ok", 
-        "clients": len(clients)
+        "clients": len(broadcaster)
     })
 
 @app.post("/fall")
-async def fall_hook(payload: RadarPayload):
+async def fall_hook(payload: RadarPayload = Depends(timed_body(RadarPayload, "fall"))):
     """Process fall detection for HTTP requests."""
-    fall_result = fall_detector.process_frame({
+    frame = {
         "x_pos": payload.x_pos,
         "y_pos": payload.y_pos,
         "z_pos": payload.z_pos,
         "snr": payload.snr,
         "noise": payload.noise
-    })
+    }
+    # Off the event loop, so /ws connections keep being read and written meanwhile; shielded
+    # so a client disconnect does not release fall_order while the thread still runs
+    fall_result = await asyncio.shield(_in_order(fall_detector.process_frame, frame, payload.sensor_id))
+    if recorder is not None:
+        recorder.record(payload.sensor_id, frame, fall_detection=fall_result)
 
     if fall_result:
         message = json.dumps({
@@ -156,13 +291,18 @@ async def fall_hook(payload: RadarPayload):
                 "noise": payload.noise
             }
         })
-        await broadcast_to_clients(message)
+        await broadcaster.broadcast(message)
 
     return JSONResponse(content={
         "status": "ok",
-        "clients": len(clients)
+        "clients": len(broadcaster)
     })
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Export metrics in the Prometheus text format."""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/")
 async def home():
     """Return simple home page."""
@@ -1,9 +1,10 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.tensorboard import SummaryWriter
 import os
 import sys
+import json
+import numpy as np
 
 # Add backend directory to path
 backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -13,6 +14,7 @@ if backend_dir not in sys.path:
 # Direct imports from backend
 from model.model import TNet
 from fall_detection.data_collection.preprocessing import get_dataloaders
+from model.sampling import DEFAULT_SAMPLING
 
 class PointNetLSTM(nn.Module):
     def __init__(self, num_points=128, hidden_size=256):  # Reduced from 512 to 256
@@ -82,12 +84,18 @@ class PointNetLSTM(nn.Module):
         # Extract point cloud features
         x = self.pointnet_forward(x)  # (batch, seq, 1024)
         
+        return self.classify_features(x)
+
+    def classify_features(self, x):
+        """LSTM and fall head over per-frame PointNet features (batch, seq, 1024)"""
         # Process temporal sequence
         lstm_out, _ = self.lstm(x)  # (batch, seq, hidden)
         
         # Use last timestep for classification
-        x = lstm_out[:, -1, :]  # (batch, hidden)
-        
+        return self.head(lstm_out[:, -1, :])  # (batch, hidden)
+
+    def head(self, x):
+        """Fall head over the LSTM's last hidden state (batch, hidden)"""
         # Classification layers
         x = torch.relu(self.bn4(self.fc1(x)))
         x = self.dropout(x)
@@ -97,6 +105,100 @@ class PointNetLSTM(nn.Module):
         
         return x  # Returns logits [no_fall, fall]
 
+def compute_class_weights(labels):
+    """Cross-entropy weights [no_fall, fall] for the label balance of the training data"""
+    n_falls = labels.count(1)
+    n_no_falls = labels.count(0)
+    total = n_falls + n_no_falls
+    
+    # Increase fall weight significantly to combat bias
+    fall_weight = 1.2 * total / (2 * n_falls)      # Reduced from 2.0 to 1.0 to decrease sensitivity
+    no_fall_weight = 1.5 * total / (2 * n_no_falls)
+    print(f"\nClass weights - Fall: {fall_weight:.3f}, No-Fall: {no_fall_weight:.3f}")
+    
+    return torch.tensor([no_fall_weight, fall_weight])
+
+def frame_features(model, points, batch_size=1024):
+    """
+    PointNet features of independent frames, computed in chunks of batch_size frames.
+    points: (N, num_points, 3) tensor -> (N, 1024). In eval mode every frame's feature
+    depends only on that frame, so windows can share them.
+    """
+    chunks = [model.pointnet_forward(points[i:i + batch_size].unsqueeze(0))[0]
+              for i in range(0, points.shape[0], batch_size)]
+    return torch.cat(chunks) if chunks else points.new_zeros((0, 1024))
+
+def compact_frame_features(model, frames, batch_size=1024):
+    """
+    frame_features for a list of (num_points, 3) frames, computed on each frame's
+    distinct points only. Max pooling ignores repeated points (zero padding, resampled
+    duplicates), so in eval mode the features equal those of the full frames, while
+    small frames cost a fraction of num_points. Frames are batched by distinct-point
+    count, each batch padded to its widest frame by repeating a point.
+    """
+    device = next(model.parameters()).device
+    compact = [np.unique(frame, axis=0) for frame in frames]
+    order = np.argsort([len(points) for points in compact], kind="stable")
+    features = torch.empty((len(frames), 1024), device=device)
+    for start in range(0, len(order), batch_size):
+        index = order[start:start + batch_size]
+        width = len(compact[index[-1]])
+        batch = np.stack([np.concatenate([compact[i], np.repeat(compact[i][:1], width - len(compact[i]), axis=0)])
+                          for i in index]).astype(np.float32)
+        features[torch.from_numpy(index).to(device)] = \
+            model.pointnet_forward(torch.from_numpy(batch).to(device).unsqueeze(0))[0]
+    return features
+
+def sliding_windows(features, sequence_length):
+    """Every window of sequence_length consecutive frames as a (N-L+1, L, F) view of (N, F) features"""
+    return features.unfold(0, sequence_length, 1).permute(0, 2, 1)
+
+def window_logits(model, features, sequence_length, batch_size=512):
+    """
+    Logits for every sliding window over per-frame features (N, 1024); row i is the
+    window ending at frame i + sequence_length - 1. Windows are built from the shared
+    features instead of re-running PointNet on each frame sequence_length times.
+    """
+    lstm = model.lstm
+    if lstm.num_layers != 1 or lstm.bidirectional or lstm.proj_size:
+        windows = sliding_windows(features, sequence_length)
+        return torch.cat([model.classify_features(windows[i:i + batch_size].contiguous())
+                          for i in range(0, windows.shape[0], batch_size)])
+
+    # The input half of each LSTM step depends only on the frame, so it is computed once
+    # per frame rather than once per window the frame appears in
+    gates_x = torch.addmm(lstm.bias_ih_l0 + lstm.bias_hh_l0, features, lstm.weight_ih_l0.t())
+    windows = sliding_windows(gates_x, sequence_length)  # (N-L+1, L, 4*hidden) view
+    weight_hh = lstm.weight_hh_l0.t()
+    logits = []
+    for i in range(0, windows.shape[0], batch_size):
+        batch = windows[i:i + batch_size]
+        h = batch.new_zeros((batch.shape[0], lstm.hidden_size))
+        c = torch.zeros_like(h)
+        for t in range(sequence_length):
+            # Same gate order (input, forget, cell, output) as nn.LSTM
+            in_gate, forget_gate, cell_gate, out_gate = (batch[:, t] + h @ weight_hh).chunk(4, dim=1)
+            c = torch.sigmoid(forget_gate) * c + torch.sigmoid(in_gate) * torch.tanh(cell_gate)
+            h = torch.sigmoid(out_gate) * torch.tanh(c)
+        logits.append(model.head(h))
+    return torch.cat(logits) if logits else features.new_zeros((0, 2))
+
+def model_metadata_path(model_path):
+    """Sidecar JSON next to the weights recording how the model was trained"""
+    return os.path.splitext(model_path)[0] + '.json'
+
+def save_model_metadata(model_path, metadata):
+    with open(model_metadata_path(model_path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+def load_model_metadata(model_path):
+    """Return the metadata saved with the weights, or {} for older models without it"""
+    try:
+        with open(model_metadata_path(model_path), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
 def train_step(model, loader, optimizer, criterion, device):
     model.train()
     total_loss = 0
@@ -214,7 +316,122 @@ def evaluate(model, loader, criterion, device):
     
     return metrics
 
+def group_recordings(sequences, timestamps, sequence_length, max_gap_ms=1000):
+    """
+    Merge sequences cut from the same recording (overlapping or adjacent frame
+    timestamps) so shared frames are processed once; sequence_length None accepts
+    timed sequences of any length. Timestamps are ms of day, so
+    different recordings can overlap in time: a sequence only joins a recording whose
+    frames at its timestamps are the same clouds, otherwise it starts another one.
+    Returns a list of (clouds, windows) where clouds are a recording's unique frames in
+    time order and windows is a list of (sequence index, frame indices into clouds).
+    Sequences without timestamps or of another length get a recording of their own,
+    padded like FallDetectionDataset.normalize_sequence.
+    """
+    recordings = []
+    timed = []
+    for i, sequence in enumerate(sequences):
+        times = timestamps[i] if timestamps is not None else None
+        if (times is not None and sequence_length in (None, len(sequence)) and len(times) == len(sequence)
+                and all(t is not None for t in times)):
+            timed.append(i)
+            continue
+        # Last sequence_length frames, padded by repeating the last frame
+        length = sequence_length or len(sequence)
+        clouds = list(sequence[-length:]) or [np.zeros((0, 5), dtype=np.float32)]
+        indices = list(range(len(clouds))) + [len(clouds) - 1] * (length - len(clouds))
+        recordings.append((clouds, [(i, indices)]))
+
+    timed.sort(key=lambda i: timestamps[i][0])
+    open_groups = []  # [end timestamp, {timestamp: cloud}, sequence indices]
+    groups = []
+    for i in timed:
+        start = timestamps[i][0]
+        # Groups ending too early for this sequence are too early for all later ones
+        groups += [group for group in open_groups if group[0] + max_gap_ms < start]
+        open_groups = [group for group in open_groups if group[0] + max_gap_ms >= start]
+        for group in open_groups:
+            if _same_recording(group[1], timestamps[i], sequences[i]):
+                break
+        else:
+            group = [timestamps[i][-1], {}, []]
+            open_groups.append(group)
+        group[0] = max(group[0], timestamps[i][-1])
+        for t, cloud in zip(timestamps[i], sequences[i]):
+            group[1].setdefault(t, cloud)
+        group[2].append(i)
+
+    for _, frames, members in groups + open_groups:
+        order = sorted(frames)
+        position = {t: k for k, t in enumerate(order)}
+        windows = [(j, [position[t] for t in timestamps[j]]) for j in members]
+        recordings.append(([frames[t] for t in order], windows))
+    return recordings
+
+def _same_recording(frames, times, clouds):
+    """Whether every frame of a sequence matches the group's frame at that timestamp, if any"""
+    seen = {}
+    for t, cloud in zip(times, clouds):
+        other = frames.get(t, seen.get(t))
+        if other is not None and (other.shape != cloud.shape or not np.array_equal(other, cloud)):
+            return False
+        seen[t] = cloud
+    return True
+
+def evaluate_sliding(model, dataset, criterion, device, frame_batch=1024, window_batch=256):
+    """
+    Same metrics as evaluate(), but PointNet features are computed once per recording
+    frame and each sequence's window is gathered from the cached feature matrix before
+    the LSTM, so the cost scales with frames rather than frames x sequence length.
+    dataset: FallDetectionDataset, ideally with timestamps to find shared frames.
+    """
+    model.eval()
+    recordings = group_recordings(dataset.sequences, dataset.timestamps, dataset.sequence_length)
+    outputs = [None] * len(dataset)
+    frames = 0
+
+    with torch.no_grad():
+        for clouds, windows in recordings:
+            points = np.stack([dataset.normalize_frame(cloud) for cloud in clouds]).astype(np.float32)
+            features = frame_features(model, torch.from_numpy(points).to(device), frame_batch)
+            frames += len(clouds)
+            for start in range(0, len(windows), window_batch):
+                batch = windows[start:start + window_batch]
+                index = torch.tensor([indices for _, indices in batch], device=device)
+                logits = model.classify_features(features[index])  # (batch, seq, 1024) -> (batch, 2)
+                for (i, _), row in zip(batch, logits):
+                    outputs[i] = row
+
+    if not outputs:
+        return {'loss': 0, 'accuracy': 0, 'fall_accuracy': 0, 'no_fall_accuracy': 0,
+                'fall_total': 0, 'no_fall_total': 0, 'frames': 0}
+
+    outputs = torch.stack(outputs)
+    labels = torch.as_tensor(np.asarray(dataset.labels), dtype=torch.long, device=device)
+    loss = criterion(outputs, labels).item()
+    _, predicted = outputs.max(1)
+
+    fall_mask = labels == 1
+    no_fall_mask = labels == 0
+    fall_total = fall_mask.sum().item()
+    no_fall_total = no_fall_mask.sum().item()
+    fall_correct = predicted[fall_mask].eq(labels[fall_mask]).sum().item()
+    no_fall_correct = predicted[no_fall_mask].eq(labels[no_fall_mask]).sum().item()
+
+    return {
+        'loss': loss,
+        'accuracy': predicted.eq(labels).sum().item() / len(labels),
+        'fall_accuracy': fall_correct / fall_total if fall_total > 0 else 0,
+        'no_fall_accuracy': no_fall_correct / no_fall_total if no_fall_total > 0 else 0,
+        'fall_total': fall_total,
+        'no_fall_total': no_fall_total,
+        'frames': frames  # PointNet passes, vs len(dataset) * sequence_length for evaluate()
+    }
+
 if __name__ == '__main__':
+    # Training-only dependency, kept out of the import path used by the detector
+    from torch.utils.tensorboard import SummaryWriter
+
     # Set device
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     print(f"Using device: {device}")
@@ -223,25 +440,24 @@ if __name__ == '__main__':
     data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
                            'data_collection/data/sequences')
     
+    # Point-selection strategy (random, snr or fps), saved with the weights for inference
+    sampling = os.environ.get('FALL_SAMPLING', DEFAULT_SAMPLING)
+
+    # Validation mode: 'sliding' shares per-frame features across overlapping
+    # sequences of a recording, 'sequence' runs every sequence independently
+    eval_mode = os.environ.get('FALL_EVAL_MODE', 'sliding')
+
     # Load sequences to calculate class weights
     sequences, labels = get_dataloaders(data_dir, return_raw=True)
-    n_falls = labels.count(1)
-    n_no_falls = labels.count(0)
-    total = n_falls + n_no_falls
-    
-    # Increase fall weight significantly to combat bias
-    fall_weight = 1.2 * total / (2 * n_falls)      # Reduced from 2.0 to 1.0 to decrease sensitivity
-    no_fall_weight = 1.5 * total / (2 * n_no_falls)
-    print(f"\nClass weights - Fall: {fall_weight:.3f}, No-Fall: {no_fall_weight:.3f}")
-    
-    class_weights = torch.tensor([no_fall_weight, fall_weight]).to(device)
+    class_weights = compute_class_weights(labels).to(device)
     
     # Create dataloaders with adjusted parameters
     train_loader, val_loader = get_dataloaders(
         data_dir,
         batch_size=8,  # Reduced from 16
         num_points=128,
-        test_split=0.1  # Use more data for training
+        test_split=0.1,  # Use more data for training
+        sampling=sampling
     )
 
     # Initialize model
@@ -272,7 +488,10 @@ if __name__ == '__main__':
             print('-' * 20)
             
             train_loss = train_step(model, train_loader, optimizer, criterion, device)
-            val_metrics = evaluate(model, val_loader, criterion, device)
+            if eval_mode == 'sliding':
+                val_metrics = evaluate_sliding(model, val_loader.dataset, criterion, device)
+            else:
+                val_metrics = evaluate(model, val_loader, criterion, device)
 
             # Log metrics
             print(f'\nEpoch Summary:')
@@ -298,4 +517,5 @@ if __name__ == '__main__':
 
     # Save final model
     torch.save(model.state_dict(), 'pointnet_lstm_fall.pth')
+    save_model_metadata('pointnet_lstm_fall.pth', {'sampling': sampling, 'num_points': 128})
     print("Saved final model") 
\ No newline at end of file
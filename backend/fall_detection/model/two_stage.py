@@ -0,0 +1,252 @@
+"""
+Two-stage PointNetLSTM training on cached backbone features.
+
+Stage 1 freezes a pretrained PointNet backbone, embeds every unique frame of the
+training and validation data once and stores the 1024-d embeddings on disk as a
+memory-mapped .npy file. Stage 2 trains only the LSTM and fall head on windows gathered
+from that cache, so an epoch no longer runs PointNet at all. An optional joint
+fine-tune then trains the whole model end to end for a few epochs.
+
+Each frame is sampled once when it is cached, so the random point-subsampling
+augmentation of regular training is frozen for the head epochs; the joint fine-tune
+sees fresh samples again.
+
+    python -m fall_detection.model.two_stage --backbone pointnet_lstm_fall.pth \\
+        --epochs 30 --finetune-epochs 2 --output pointnet_lstm_fall.pth
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, Dataset
+
+# Add backend directory to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+from fall_detection.data_collection.preprocessing import get_dataloaders
+from fall_detection.model.pointnet_lstm import (PointNetLSTM, compute_class_weights, evaluate, frame_features,
+                                                group_recordings, load_model_metadata, save_model_metadata,
+                                                train_step)
+from model.sampling import DEFAULT_SAMPLING
+
+# Trained in stage 2; everything else is the frozen PointNet backbone
+HEAD_MODULES = ("lstm", "fc1", "fc2", "fc3", "bn4", "bn5")
+FEATURE_DIM = 1024
+
+def set_backbone_trainable(model, trainable):
+    for name, param in model.named_parameters():
+        if not name.startswith(HEAD_MODULES):
+            param.requires_grad = trainable
+
+def head_parameters(model):
+    return [param for name, param in model.named_parameters() if name.startswith(HEAD_MODULES)]
+
+def _data_digest(dataset):
+    """SHA-256 of the sequences' clouds, timestamps and labels, so edited data is re-embedded"""
+    digest = hashlib.sha256()
+    timestamps = dataset.timestamps or [None] * len(dataset)
+    for sequence, times, label in zip(dataset.sequences, timestamps, dataset.labels):
+        digest.update(json.dumps([int(label), len(sequence), times]).encode("utf-8"))
+        for cloud in sequence:
+            cloud = np.ascontiguousarray(cloud)
+            digest.update(f"{cloud.dtype.str}{cloud.shape}".encode("utf-8"))
+            digest.update(cloud.tobytes())
+    return digest.hexdigest()
+
+def _cache_key(dataset, backbone_path, dtype):
+    stat = os.stat(backbone_path)
+    return {
+        "backbone": os.path.abspath(backbone_path),
+        "backbone_mtime_ns": stat.st_mtime_ns,
+        "backbone_size": stat.st_size,
+        "sampling": dataset.sampling,
+        "num_points": dataset.num_points,
+        "sequence_length": dataset.sequence_length,
+        "channels": dataset.channels,
+        "dtype": np.dtype(dtype).name,
+        "sequences": len(dataset),
+        "frames": sum(len(sequence) for sequence in dataset.sequences),
+        "data_sha256": _data_digest(dataset)
+    }
+
+def build_feature_cache(model, dataset, cache_dir, backbone_path, device, frame_batch=1024, dtype=np.float32):
+    """
+    Embed every unique frame of dataset with the (frozen) backbone into
+    cache_dir/features.npy and record each sequence's window as row indices into it.
+    An existing cache built from the same backbone weights and data is reused.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    key = _cache_key(dataset, backbone_path, dtype)
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            if json.load(f).get("key") == key:
+                print(f"Reusing feature cache in {cache_dir}")
+                return
+
+    recordings = group_recordings(dataset.sequences, dataset.timestamps, dataset.sequence_length)
+    total_frames = sum(len(clouds) for clouds, _ in recordings)
+    # Write to temporary names and rename at the end so an interrupted build is never reused
+    features = np.lib.format.open_memmap(os.path.join(cache_dir, "features.tmp.npy"), mode='w+',
+                                         dtype=dtype, shape=(total_frames, FEATURE_DIM))
+    windows = np.zeros((len(dataset), dataset.sequence_length), dtype=np.int64)
+
+    model.eval()
+    start = time.perf_counter()
+    offset = 0
+    with torch.no_grad():
+        for clouds, sequence_windows in recordings:
+            points = np.stack([dataset.normalize_frame(cloud) for cloud in clouds]).astype(np.float32)
+            embedded = frame_features(model, torch.from_numpy(points).to(device), frame_batch)
+            features[offset:offset + len(clouds)] = embedded.cpu().numpy().astype(dtype)
+            for i, indices in sequence_windows:
+                windows[i] = np.asarray(indices) + offset
+            offset += len(clouds)
+    features.flush()
+    del features
+
+    os.replace(os.path.join(cache_dir, "features.tmp.npy"), os.path.join(cache_dir, "features.npy"))
+    np.save(os.path.join(cache_dir, "windows.npy"), windows)
+    np.save(os.path.join(cache_dir, "labels.npy"), np.asarray(dataset.labels, dtype=np.int64))
+    with open(meta_path, 'w') as f:
+        json.dump({"key": key, "dtype": np.dtype(dtype).name}, f, indent=2)
+    print(f"Cached {total_frames} frame embeddings for {len(dataset)} sequences "
+          f"in {time.perf_counter() - start:.1f}s ({cache_dir})")
+
+class CachedFeatureDataset(Dataset):
+    """Sequences as (sequence_length, 1024) windows gathered from a memory-mapped feature cache"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.windows = np.load(os.path.join(cache_dir, "windows.npy"))
+        self.labels = np.load(os.path.join(cache_dir, "labels.npy"))
+        self._features = None  # opened lazily so DataLoader workers each map the file
+
+    @property
+    def features(self):
+        if self._features is None:
+            self._features = np.load(os.path.join(self.cache_dir, "features.npy"), mmap_mode='r')
+        return self._features
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        return np.asarray(self.features[self.windows[idx]], dtype=np.float32), self.labels[idx]
+
+def train_head_step(model, loader, optimizer, criterion, device):
+    """One epoch of the LSTM and head on cached features"""
+    model.train()
+    total_loss = 0
+    total = 0
+    for features, labels in loader:
+        features, labels = features.to(device), labels.to(device)
+        optimizer.zero_grad()
+        loss = criterion(model.classify_features(features), labels)
+        loss.backward()
+        optimizer.step()
+        total_loss += loss.item() * labels.size(0)
+        total += labels.size(0)
+    return total_loss / total if total > 0 else 0
+
+def evaluate_head(model, loader, criterion, device):
+    model.eval()
+    total_loss = 0
+    predictions = []
+    targets = []
+    with torch.no_grad():
+        for features, labels in loader:
+            features, labels = features.to(device), labels.to(device)
+            outputs = model.classify_features(features)
+            total_loss += criterion(outputs, labels).item() * labels.size(0)
+            predictions.append(outputs.argmax(1))
+            targets.append(labels)
+    if not targets:
+        return {'loss': 0, 'accuracy': 0, 'fall_accuracy': 0, 'no_fall_accuracy': 0}
+    predicted = torch.cat(predictions)
+    labels = torch.cat(targets)
+    fall_mask = labels == 1
+    no_fall_mask = labels == 0
+    return {
+        'loss': total_loss / len(labels),
+        'accuracy': predicted.eq(labels).float().mean().item(),
+        'fall_accuracy': predicted[fall_mask].eq(1).float().mean().item() if fall_mask.any() else 0,
+        'no_fall_accuracy': predicted[no_fall_mask].eq(0).float().mean().item() if no_fall_mask.any() else 0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the fall LSTM head on cached PointNet features")
+    parser.add_argument("--backbone", required=True, help="pretrained PointNetLSTM weights (backbone is frozen)")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                                           'data_collection/data/sequences'))
+    parser.add_argument("--cache-dir", default=os.path.join('runs', 'fall_feature_cache'))
+    parser.add_argument("--sampling", help="point-selection strategy (default: the backbone's)")
+    parser.add_argument("--epochs", type=int, default=30, help="head-only epochs on cached features")
+    parser.add_argument("--finetune-epochs", type=int, default=0, help="joint epochs on raw frames afterwards")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--finetune-lr", type=float, default=1e-4)
+    parser.add_argument("--float16", action="store_true", help="store embeddings as float16 (half the disk/IO)")
+    parser.add_argument("--output", default='pointnet_lstm_fall.pth')
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+
+    sampling = args.sampling or load_model_metadata(args.backbone).get('sampling', DEFAULT_SAMPLING)
+    model = PointNetLSTM(num_points=128, hidden_size=256)
+    model.load_state_dict(torch.load(args.backbone, map_location=device))
+    model.to(device)
+
+    train_loader, val_loader = get_dataloaders(args.data_dir, batch_size=8, num_points=128,
+                                               test_split=0.1, sampling=sampling)
+    class_weights = compute_class_weights(list(train_loader.dataset.labels) + list(val_loader.dataset.labels))
+    criterion = nn.CrossEntropyLoss(weight=class_weights.to(device))
+
+    # Stage 1: embed every frame once with the frozen backbone
+    dtype = np.float16 if args.float16 else np.float32
+    for split, loader in (("train", train_loader), ("val", val_loader)):
+        build_feature_cache(model, loader.dataset, os.path.join(args.cache_dir, split), args.backbone, device,
+                            dtype=dtype)
+
+    # Stage 2: LSTM + head on cached features
+    set_backbone_trainable(model, False)
+    head_train = DataLoader(CachedFeatureDataset(os.path.join(args.cache_dir, "train")),
+                            batch_size=args.batch_size, shuffle=True, drop_last=True)
+    head_val = DataLoader(CachedFeatureDataset(os.path.join(args.cache_dir, "val")),
+                          batch_size=args.batch_size, shuffle=False)
+    optimizer = optim.Adam(head_parameters(model), lr=args.lr, weight_decay=0.01)
+    for epoch in range(1, args.epochs + 1):
+        start = time.perf_counter()
+        train_loss = train_head_step(model, head_train, optimizer, criterion, device)
+        val_metrics = evaluate_head(model, head_val, criterion, device)
+        print(f"Head epoch {epoch}/{args.epochs} ({time.perf_counter() - start:.1f}s) | "
+              f"Train Loss: {train_loss:.4f} | Val Loss: {val_metrics['loss']:.4f} | "
+              f"Val Acc: {val_metrics['accuracy']:.2%} | Fall Acc: {val_metrics['fall_accuracy']:.2%} | "
+              f"No-Fall Acc: {val_metrics['no_fall_accuracy']:.2%}")
+
+    # Optional stage 3: joint fine-tune of backbone and head on raw frames
+    set_backbone_trainable(model, True)
+    if args.finetune_epochs > 0:
+        optimizer = optim.Adam(model.parameters(), lr=args.finetune_lr, weight_decay=0.01)
+        for epoch in range(1, args.finetune_epochs + 1):
+            train_loss = train_step(model, train_loader, optimizer, criterion, device)
+            val_metrics = evaluate(model, val_loader, criterion, device)
+            print(f"Fine-tune epoch {epoch}/{args.finetune_epochs} | Train Loss: {train_loss:.4f} | "
+                  f"Val Loss: {val_metrics['loss']:.4f} | Val Acc: {val_metrics['accuracy']:.2%}")
+
+    torch.save(model.state_dict(), args.output)
+    save_model_metadata(args.output, {'sampling': sampling, 'num_points': 128})
+    print(f"Saved model to {args.output}")
+
+if __name__ == '__main__':
+    main()
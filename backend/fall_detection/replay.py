@@ -0,0 +1,270 @@
+"""
+Offline fall-detector replay: run FallDetector's model over long recordings much faster
+than real time and score the alarms it would have raised.
+
+Each frame is normalized exactly as the live detector does and its PointNet features are
+computed once, in large batches, over its distinct points only (the zero padding of small
+frames does not change the max-pooled feature). Every 30-frame window is then classified
+from those cached features, with the LSTM's input projection also computed once per
+frame, so a recording costs one PointNet pass per frame instead of thirty.
+Raw window probabilities are computed once; smoothing and thresholds are re-applied per
+threshold for free.
+
+    python -m fall_detection.replay recording.json --events fall_timestamps.json \\
+        --thresholds 0.5 0.6 0.7 0.8 --output replay.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+# Add backend directory to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+from fall_detection.inference.fall_detector import FallDetector
+from fall_detection.model.pointnet_lstm import compact_frame_features, group_recordings, window_logits
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'model', 'pointnet_lstm_fall.pth')
+TIMESTAMP_KEY = "Time Stamp (ms)"
+POINT_KEYS = ("x_pos", "y_pos", "z_pos", "snr", "noise")
+
+def load_recordings(path, max_gap_ms=5000):
+    """
+    Load the recordings in a file: either a list of frames (log_parser output, one
+    recording) or a sequence file ({"sequences": [{"frames": [...]}, ...]},
+    sequence_builder output). Sequences are regrouped into the recordings they were cut
+    from with group_recordings: timestamps are ms of day, so separate recordings can
+    overlap in time and are told apart by their frames. Frames shared by overlapping
+    sequences are kept once; each recording is in timestamp order.
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    if isinstance(data, list):
+        return [data]
+
+    sequences = [sequence["frames"] for sequence in data.get("sequences", [])]
+    clouds = [[_frame_points(frame) for frame in frames] for frames in sequences]
+    timestamps = [[frame.get(TIMESTAMP_KEY) for frame in frames] for frames in sequences]
+    frame_of = {id(cloud): frame for frames, sequence_clouds in zip(sequences, clouds)
+                for frame, cloud in zip(frames, sequence_clouds)}
+    return [[frame_of[id(cloud)] for cloud in recording]
+            for recording, _ in group_recordings(clouds, timestamps, None, max_gap_ms)]
+
+def load_recording(path):
+    """All frames of a file, one recording after another (see load_recordings)"""
+    return [frame for recording in load_recordings(path) for frame in recording]
+
+def _frame_points(frame):
+    """A frame's point columns as one array, to compare frames that share a timestamp"""
+    return np.concatenate([np.asarray(frame.get(key) or [], dtype=np.float64) for key in POINT_KEYS])
+
+def load_fall_events(path):
+    """Ground-truth fall times (ms of day) from a FallTimestampCollector file"""
+    with open(path, 'r') as f:
+        return [event["ms_of_day"] for event in json.load(f)["fall_events"]]
+
+def split_segments(timestamps, max_gap_ms):
+    """Split frame indices where consecutive timestamps are more than max_gap_ms apart"""
+    if len(timestamps) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(timestamps) > max_gap_ms) + 1
+    bounds = [0, *breaks.tolist(), len(timestamps)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def ema(values, alpha):
+    """Same smoothing as FallDetector.update_ema over a whole segment; NaNs are skipped"""
+    smoothed = np.full_like(values, np.nan)
+    state = None
+    for i, value in enumerate(values):
+        if np.isnan(value):
+            continue
+        state = value if state is None else alpha * value + (1 - alpha) * state
+        smoothed[i] = state
+    return smoothed
+
+class FallReplay:
+    """Batched, feature-sharing equivalent of streaming frames through a FallDetector"""
+
+    def __init__(self, detector, frame_batch=1024, window_batch=512, chunk_frames=8192):
+        self.detector = detector
+        self.frame_batch = frame_batch      # frames per PointNet forward
+        self.window_batch = window_batch    # windows per LSTM forward
+        self.chunk_frames = chunk_frames    # frames held in memory at once
+
+    def probabilities(self, frames):
+        """
+        Raw fall probability of the window ending at each frame (NaN for the first
+        sequence_length - 1 frames, which the live detector also has no result for)
+        """
+        detector = self.detector
+        model = detector.model
+        length = detector.sequence_length
+        probs = np.full(len(frames), np.nan)
+        tail = None  # features of the last length-1 frames of the previous chunk
+
+        with torch.no_grad():
+            for start in range(0, len(frames), self.chunk_frames):
+                chunk = frames[start:start + self.chunk_frames]
+                points = [detector.prepare_frame(frame) for frame in chunk]
+                features = compact_frame_features(model, points, self.frame_batch)
+                if tail is not None:
+                    features = torch.cat([tail, features])
+                first = start - (tail.shape[0] if tail is not None else 0)  # frame index of features[0]
+                if features.shape[0] >= length:
+                    logits = window_logits(model, features, length, self.window_batch)
+                    probs[first + length - 1:first + features.shape[0]] = \
+                        torch.softmax(logits, dim=1)[:, 1].cpu().numpy()
+                tail = features[-(length - 1):]
+        return probs
+
+def find_alarms(timestamps, smoothed, threshold, merge_gap_ms):
+    """
+    Group frames whose smoothed probability exceeds threshold (the live is_fall flag)
+    into alarm events; runs closer than merge_gap_ms count as one event.
+    """
+    alarms = []
+    for i in np.flatnonzero(smoothed > threshold):
+        t = float(timestamps[i])
+        if alarms and t - alarms[-1]["end_ms"] <= merge_gap_ms:
+            alarm = alarms[-1]
+            alarm["end_ms"] = t
+            alarm["frames"] += 1
+            alarm["peak_probability"] = max(alarm["peak_probability"], float(smoothed[i]))
+        else:
+            alarms.append({"start_ms": t, "end_ms": t, "frames": 1, "peak_probability": float(smoothed[i])})
+    return alarms
+
+def score_alarms(alarms, falls, max_latency_ms):
+    """
+    Match each ground-truth fall to the first alarm starting within max_latency_ms after
+    it; every alarm not matched to a fall is a false alarm.
+    """
+    matched = set()
+    detections = []
+    for fall_ms in sorted(falls):
+        hit = next((i for i, alarm in enumerate(alarms)
+                    if i not in matched and 0 <= alarm["start_ms"] - fall_ms <= max_latency_ms), None)
+        if hit is None:
+            detections.append({"fall_ms": fall_ms, "detected": False, "latency_ms": None})
+        else:
+            matched.add(hit)
+            detections.append({"fall_ms": fall_ms, "detected": True,
+                               "latency_ms": alarms[hit]["start_ms"] - fall_ms})
+    false_alarms = [alarm for i, alarm in enumerate(alarms) if i not in matched]
+    return detections, false_alarms
+
+def evaluate_thresholds(segments, thresholds, falls, hours, merge_gap_ms, max_latency_ms):
+    """segments: (timestamps, smoothed) per stream; alarms are found per stream, then scored together"""
+    results = []
+    for threshold in thresholds:
+        alarms = [alarm for timestamps, smoothed in segments
+                  for alarm in find_alarms(timestamps, smoothed, threshold, merge_gap_ms)]
+        alarms.sort(key=lambda alarm: alarm["start_ms"])
+        detections, false_alarms = score_alarms(alarms, falls, max_latency_ms)
+        latencies = [d["latency_ms"] for d in detections if d["detected"]]
+        results.append({
+            "threshold": threshold,
+            "alarms": alarms,
+            "detections": detections,
+            "falls": len(falls),
+            "detected": len(latencies),
+            "recall": len(latencies) / len(falls) if falls else None,
+            "latency_ms": {
+                "mean": float(np.mean(latencies)) if latencies else None,
+                "median": float(np.median(latencies)) if latencies else None,
+                "max": float(np.max(latencies)) if latencies else None
+            },
+            "false_alarms": len(false_alarms),
+            "false_alarms_per_hour": len(false_alarms) / hours if hours > 0 else None
+        })
+    return results
+
+def replay(paths, detector, thresholds, falls=(), frame_batch=1024, window_batch=512,
+           chunk_frames=8192, max_gap_ms=5000, merge_gap_ms=2000, max_latency_ms=10000):
+    """Replay recordings through the detector's model and score every threshold"""
+    engine = FallReplay(detector, frame_batch, window_batch, chunk_frames)
+    segments = []
+    frames_total = 0
+    recorded_ms = 0.0
+    start = time.perf_counter()
+
+    for path in paths:
+        recordings = load_recordings(path, max_gap_ms)
+        for frames in recordings:
+            timestamps = np.array([frame.get(TIMESTAMP_KEY, 0) for frame in frames], dtype=np.float64)
+            # A long gap means the sensor stopped; the detector starts over like a new stream
+            for begin, end in split_segments(timestamps, max_gap_ms):
+                probs = engine.probabilities(frames[begin:end])
+                segments.append((timestamps[begin:end], ema(probs, detector.ema_alpha)))
+                recorded_ms += timestamps[end - 1] - timestamps[begin]
+            frames_total += len(frames)
+        print(f"Replayed {path}: {sum(len(frames) for frames in recordings)} frames, "
+              f"{len(recordings)} recordings")
+
+    elapsed = time.perf_counter() - start
+    hours = recorded_ms / 3_600_000
+
+    return {
+        "recordings": list(paths),
+        "frames": frames_total,
+        "recorded_hours": hours,
+        "elapsed_s": elapsed,
+        "frames_per_second": frames_total / elapsed if elapsed > 0 else None,
+        "realtime_factor": recorded_ms / 1000 / elapsed if elapsed > 0 else None,
+        "sampling": detector.sampling,
+        "ema_alpha": detector.ema_alpha,
+        "thresholds": evaluate_thresholds(segments, thresholds, list(falls), hours,
+                                          merge_gap_ms, max_latency_ms)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recordings through the fall detector offline")
+    parser.add_argument("recordings", nargs="+", help="frame lists or sequence files (JSON)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="PointNetLSTM weights")
+    parser.add_argument("--events", help="ground-truth fall_timestamps.json")
+    parser.add_argument("--thresholds", type=float, nargs="+", help="smoothed-probability thresholds (default: the detector's)")
+    parser.add_argument("--ema-alpha", type=float, help="override the detector's EMA alpha")
+    parser.add_argument("--sampling", help="override the sampling strategy saved with the weights")
+    parser.add_argument("--frame-batch", type=int, default=1024, help="frames per PointNet forward")
+    parser.add_argument("--window-batch", type=int, default=512, help="windows per LSTM forward")
+    parser.add_argument("--chunk-frames", type=int, default=8192, help="frames held in memory at once")
+    parser.add_argument("--max-gap-ms", type=float, default=5000, help="gap that starts a new stream")
+    parser.add_argument("--merge-gap-ms", type=float, default=2000, help="alarms closer than this are one event")
+    parser.add_argument("--max-latency-ms", type=float, default=10000, help="latest alarm that still detects a fall")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    detector = FallDetector(model_path=args.model, sampling=args.sampling)
+    if args.ema_alpha is not None:
+        detector.ema_alpha = args.ema_alpha
+    falls = load_fall_events(args.events) if args.events else []
+
+    results = replay(args.recordings, detector, args.thresholds or [detector.threshold], falls,
+                     args.frame_batch, args.window_batch, args.chunk_frames,
+                     args.max_gap_ms, args.merge_gap_ms, args.max_latency_ms)
+
+    print(f"\n{results['frames']} frames ({results['recorded_hours']:.2f}h recorded) in {results['elapsed_s']:.1f}s "
+          f"- {results['frames_per_second']:.0f} frames/s, {results['realtime_factor']:.0f}x real time")
+    for r in results["thresholds"]:
+        recall = f"{r['detected']}/{r['falls']} falls" if falls else "no ground truth"
+        latency = r["latency_ms"]["median"]
+        latency = f"median latency {latency:.0f}ms" if latency is not None else "median latency n/a"
+        per_hour = r["false_alarms_per_hour"]
+        per_hour = f"{per_hour:.2f}/h" if per_hour is not None else "n/a"
+        print(f"threshold {r['threshold']:.2f}: {len(r['alarms'])} alarms | {recall} | {latency} | "
+              f"{r['false_alarms']} false alarms ({per_hour})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import nullcontext
+from typing import Callable, Optional
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+
+def session_router(get_detector: Callable[[], Optional[object]], lock: asyncio.Lock = None) -> APIRouter:
+    """
+    Endpoints that export, import and drop one sensor's FallDetector session, used by
+    the sensor router (router.py) to move a sensor between workers. lock, if given, is
+    held while a session is read or replaced so it cannot race the frame processing.
+    """
+    router = APIRouter()
+
+    def _detector():
+        detector = get_detector()
+        if detector is None:
+            return None, JSONResponse(
+                status_code=503,
+                content={"status": "error", "message": "Fall detector not loaded"}
+            )
+        return detector, None
+
+    @router.get("/sessions/{sensor_id}")
+    async def export_session(sensor_id: str):
+        """Frame buffer and EMA of a sensor, for handing it over to another worker."""
+        detector, error = _detector()
+        if error:
+            return error
+        async with lock or nullcontext():
+            state = detector.export_session(sensor_id)
+        if state is None:
+            return JSONResponse(
+                status_code=404,
+                content={"status": "error", "message": f"No session for sensor '{sensor_id}'"}
+            )
+        return JSONResponse(content={"status": "success", "session": state})
+
+    @router.put("/sessions/{sensor_id}")
+    async def import_session(sensor_id: str, request: Request):
+        """Replace a sensor's session with one exported by another worker."""
+        detector, error = _detector()
+        if error:
+            return error
+        try:
+            state = (await request.json())["session"]
+            async with lock or nullcontext():
+                detector.import_session(sensor_id, state)
+        except (KeyError, TypeError, ValueError) as e:
+            return JSONResponse(
+                status_code=400,
+                content={"status": "error", "message": f"Invalid session: {e}"}
+            )
+        return JSONResponse(content={"status": "success"})
+
+    @router.delete("/sessions/{sensor_id}")
+    async def drop_session(sensor_id: str):
+        detector, error = _detector()
+        if error:
+            return error
+        async with lock or nullcontext():
+            detector.reset(sensor_id)
+        return JSONResponse(content={"status": "success"})
+
+    return router
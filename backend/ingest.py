@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import deque
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from metrics import REQUEST_PARSE_SECONDS
+
+
+def timed_body(model_cls: type, endpoint: str):
+    """
+    Dependency that reads and validates the request body as model_cls, recording the
+    time spent in radar_request_parse_seconds. Invalid bodies produce the usual 422.
+    """
+    parse_seconds = REQUEST_PARSE_SECONDS.labels(endpoint)
+
+    async def parse(request: Request) -> BaseModel:
+        start = time.perf_counter()
+        body = await request.body()
+        try:
+            payload = model_cls.model_validate_json(body)
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+            raise RequestValidationError([{**err, "loc": ("body",) + tuple(err["loc"])} for err in errors])
+        parse_seconds.observe_since(start)
+        return payload
+
+    return parse
+
+
+class PipelinedIngest:
+    """
+    Schedules the frames received on one WebSocket so the receive loop never waits for
+    inference. Up to max_in_flight frames are processed at once, at most one per stream
+    (e.g. a sensor and model) so each stream's frames stay in order. A frame that arrives
+    while an older frame of its stream is still waiting replaces it: a client that sends
+    faster than its frames are processed gets its latest frames, not a growing backlog.
+    """
+
+    def __init__(self, process: Callable[[Any], Awaitable[None]], max_in_flight: int = 4):
+        self.process = process  # coroutine function handling one frame (inference and reply)
+        self.max_in_flight = max_in_flight
+        self.waiting: Dict[Hashable, Any] = {}  # stream -> latest frame not yet started, oldest stream first
+        self.running: Dict[Hashable, asyncio.Task] = {}
+
+    def submit(self, stream: Hashable, frame) -> Optional[Any]:
+        """Schedule frame; returns the frame of the same stream it replaced, if any."""
+        dropped = self.waiting.get(stream)
+        self.waiting[stream] = frame  # a replaced frame keeps its stream's place in line
+        self._dispatch()
+        return dropped
+
+    def _dispatch(self):
+        for stream in list(self.waiting):
+            if len(self.running) >= self.max_in_flight:
+                break
+            if stream in self.running:
+                continue
+            task = asyncio.ensure_future(self.process(self.waiting.pop(stream)))
+            self.running[stream] = task
+            task.add_done_callback(partial(self._done, stream))
+
+    def _done(self, stream: Hashable, task: asyncio.Task):
+        del self.running[stream]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error processing frame of {stream}: {task.exception()}")
+        self._dispatch()
+
+    def close(self):
+        """Forget waiting frames and cancel the running ones (the client is gone)."""
+        self.waiting.clear()
+        for task in list(self.running.values()):
+            task.cancel()
+
+    def __len__(self):
+        return len(self.running)
+
+
+class ConnectionStats:
+    """Frame counts and recent receive-to-result latencies of one WebSocket connection."""
+
+    def __init__(self, client: str, window: int = 1024):
+        self.client = client
+        self.connected_at = time.time()
+        self.frames = 0
+        self.dropped = 0
+        self.queued = 0
+        self.latencies = deque(maxlen=window)  # seconds from receiving a message to sending its result
+
+    def record(self, received: float, frames: int = 1):
+        self.frames += frames
+        self.latencies.append(time.perf_counter() - received)
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile_ms(p: float):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000.0
+
+        return {
+            "client": self.client,
+            "connected_s": time.time() - self.connected_at,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "queued": self.queued,
+            "latency_ms": {
+                "p50": percentile_ms(0.5),
+                "p95": percentile_ms(0.95),
+                "p99": percentile_ms(0.99),
+                "max": latencies[-1] * 1000.0 if latencies else None
+            }
+        }
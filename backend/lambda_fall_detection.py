@@ -1,6 +1,8 @@
 import json
 import logging
 import os
+import select
+import time
 import urllib3
 import websocket
 import ssl
@@ -11,33 +13,98 @@ logger.setLevel(logging.INFO)
 # Set these in your Lambda's environment variables:
 WEBSOCKET_URL = os.environ.get("WEBSOCKET_URL", "ws://localhost:8000/ws")  # Change this to your actual WebSocket URL when deployed
 HTTP_FALLBACK_URL = os.environ.get("HTTP_FALLBACK_URL", "http://localhost:8000/fall")  # HTTP fallback endpoint
+WEBSOCKET_TIMEOUT_S = float(os.environ.get("WEBSOCKET_TIMEOUT_S", "5"))
+# Wait for the server's reply to each message, so a message sent just as the server closes
+# the connection is resent (or sent over HTTP). Turning it off saves a round trip per
+# invocation but such a message is lost without an error.
+WAIT_FOR_REPLY = os.environ.get("WEBSOCKET_WAIT_REPLY", "1") == "1"
+# A connection idle for longer than this (e.g. across a frozen container) is pinged before use
+PING_AFTER_S = float(os.environ.get("WEBSOCKET_PING_AFTER_S", "30"))
+# Send the frames of a batched event as one {"frames": [...]} message instead of one message each
+BATCH_MESSAGES = os.environ.get("BATCH_MESSAGES", "1") == "1"
 
 http = urllib3.PoolManager()
 
-def forward_to_websocket(data):
-    """Attempt to forward data via WebSocket"""
+# Kept open across warm invocations of the same container
+_connection = None
+_last_used = 0.0
+
+def close_connection():
+    """Drop the cached WebSocket connection (the next invocation reconnects)"""
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+        _connection = None
+
+def _connect():
+    return websocket.create_connection(
+        WEBSOCKET_URL,
+        timeout=WEBSOCKET_TIMEOUT_S,
+        sslopt={"cert_reqs": ssl.CERT_NONE}  # Only for testing, use proper SSL in production
+    )
+
+def _readable(ws):
+    sock = ws.sock
+    if hasattr(sock, "pending") and sock.pending():
+        return True
+    return bool(select.select([sock], [], [], 0)[0])
+
+def _healthy(ws):
+    """
+    Drain what the server sent since the last invocation (replies, broadcasts) so its
+    send buffer never fills, and ping a connection that has been idle for a while.
+    A closed or unresponsive connection is reported unhealthy.
+    """
+    if not ws.connected:
+        return False
     try:
-        # Create a WebSocket connection
-        ws = websocket.create_connection(
-            WEBSOCKET_URL,
-            sslopt={"cert_reqs": ssl.CERT_NONE}  # Only for testing, use proper SSL in production
-        )
-        
-        # Send the data
-        ws.send(json.dumps(data))
-        
-        # Get response
-        result = ws.recv()
-        logger.info("WebSocket response: %s", result)
-        
-        # Close connection
-        ws.close()
+        while _readable(ws):
+            opcode, _ = ws.recv_data_frame(control_frame=True)
+            if opcode == websocket.ABNF.OPCODE_CLOSE:
+                return False
+        if time.monotonic() - _last_used > PING_AFTER_S:
+            ws.ping()
+            while True:
+                opcode, _ = ws.recv_data_frame(control_frame=True)
+                if opcode == websocket.ABNF.OPCODE_PONG:
+                    break
+                if opcode == websocket.ABNF.OPCODE_CLOSE:
+                    return False
         return True
-        
     except Exception as e:
-        logger.error("WebSocket error: %s", e)
+        logger.info("Cached WebSocket connection is stale: %s", e)
         return False
 
+def forward_to_websocket(data):
+    """Forward data over the cached WebSocket connection, reconnecting once if it went stale"""
+    global _connection, _last_used
+    message = json.dumps(data)
+    for attempt in range(2):
+        sent = False
+        try:
+            if _connection is None or not _healthy(_connection):
+                close_connection()
+                _connection = _connect()
+            _connection.send(message)
+            sent = True
+            if WAIT_FOR_REPLY:
+                result = _connection.recv()
+                if not result:
+                    raise websocket.WebSocketConnectionClosedException("Connection closed before the reply")
+                logger.info("WebSocket response: %s", result)
+            _last_used = time.monotonic()
+            return True
+        except Exception as e:
+            logger.error("WebSocket error: %s", e)
+            close_connection()
+            if sent and not WAIT_FOR_REPLY:
+                # It may have been processed; resending could feed the fall detector the same frames twice
+                return True
+    return False
+
 def forward_to_http(data):
     """Fallback to HTTP if WebSocket fails"""
     try:
@@ -55,38 +122,71 @@ def forward_to_http(data):
         logger.error("HTTP Fallback error: %s", e)
         return False
 
-def lambda_handler(event, context):
-    # Log incoming data
-    logger.info("Received radar data: %s", json.dumps(event))
-    
-    # Extract point cloud data
-    try:
+def extract_frames(event):
+    """
+    Point data of each frame in the event: a single frame, a list of frames, or
+    {"frames": [...]} (batched events). sensor_id is taken from the frame or the event.
+    """
+    if isinstance(event, list):
+        records, defaults = event, {}
+    elif "frames" in event:
+        records, defaults = event["frames"], event
+    else:
+        records, defaults = [event], event
+
+    frames = []
+    for record in records:
         point_data = {
-            "x_pos": event.get("x_pos", []),
-            "y_pos": event.get("y_pos", []),
-            "z_pos": event.get("z_pos", []),
-            "snr": event.get("snr", []),
-            "noise": event.get("noise", [])
+            "x_pos": record.get("x_pos", []),
+            "y_pos": record.get("y_pos", []),
+            "z_pos": record.get("z_pos", []),
+            "snr": record.get("snr", []),
+            "noise": record.get("noise", [])
         }
-        
+        sensor_id = record.get("sensor_id", defaults.get("sensor_id"))
+        if sensor_id is not None:
+            point_data["sensor_id"] = sensor_id
+
         # Validate data
         if not (point_data["x_pos"] and point_data["y_pos"] and point_data["z_pos"]):
             raise ValueError("Missing required point cloud coordinates")
-            
-        # Try WebSocket first, fallback to HTTP
-        if not forward_to_websocket(point_data):
-            logger.info("WebSocket failed, trying HTTP fallback...")
-            if not forward_to_http(point_data):
-                raise Exception("Both WebSocket and HTTP forwarding failed")
-        
+        frames.append(point_data)
+    if not frames:
+        raise ValueError("Event contains no frames")
+    return frames
+
+def lambda_handler(event, context):
+    try:
+        # Extract point cloud data
+        frames = extract_frames(event)
+        logger.info("Received %d radar frame(s)", len(frames))
+        logger.debug("Received radar data: %s", json.dumps(event))
+
+        if len(frames) == 1:
+            messages = frames
+        elif BATCH_MESSAGES:
+            messages = [{"sensor_id": frames[0].get("sensor_id", "default"), "frames": frames}]
+        else:
+            messages = frames
+
+        # Try WebSocket first, fallback to HTTP (one request per frame over a pooled connection)
+        for message in messages:
+            if not forward_to_websocket(message):
+                logger.info("WebSocket failed, trying HTTP fallback...")
+                for frame in message.get("frames", [message]):
+                    if not forward_to_http(frame):
+                        raise Exception("Both WebSocket and HTTP forwarding failed")
+
+        timestamp = event.get("timestamp", "") if isinstance(event, dict) else ""
         return {
             "statusCode": 200,
             "body": json.dumps({
                 "message": "Data forwarded successfully",
-                "timestamp": event.get("timestamp", "")
+                "frames": len(frames),
+                "timestamp": timestamp
             })
         }
-        
+
     except Exception as e:
         logger.error("Error processing data: %s", e)
         return {
@@ -96,7 +196,7 @@ def lambda_handler(event, context):
             })
         }
 
-# For local testing
+# For local testing (see benchmarks/lambda_harness.py for latency measurements)
 if __name__ == "__main__":
     # Test data
     test_event = {
@@ -107,7 +207,7 @@ if __name__ == "__main__":
         "noise": [1, 1, 1],
         "timestamp": "2024-02-20T12:00:00Z"
     }
-    
+
     print("Testing with sample data...")
     result = lambda_handler(test_event, None)
-    print("Result:", result) 
\ No newline at end of file
+    print("Result:", result)
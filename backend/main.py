@@ -1,19 +1,29 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List
-from model.model import create_model
-from model.inference import predict
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
 import json
 import asyncio
 import os
 import sys
-import shutil
+import threading
+import time
+import numpy as np
 from pathlib import Path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from database import model_db
-from utils import get_models_dir, get_data_dir
+from utils import get_models_dir
+from model.sampling import SAMPLING_STRATEGIES, DEFAULT_SAMPLING
+from occupancy import OccupancyPipeline, ModelNotFoundError
+from broadcast import Broadcaster
+from recorder import create_recorder
+from ingest import timed_body, PipelinedIngest
+import metrics
+import profiling
+import uploads
+import catalog
 app = FastAPI()
 
 app.add_middleware(
@@ -22,11 +32,41 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.include_router(profiling.router)
+app.include_router(uploads.router)
+app.include_router(catalog.router)
 
-clients: List[WebSocket] = []
+broadcaster = Broadcaster()
+
+# Optional append-only recording of every frame and its result (set RECORDER_DIR)
+recorder = create_recorder()
+
+# Upper bound on test-time augmentation draws (batch size of one inference call)
+MAX_TTA_DRAWS = 32
+
+# Rate control and per-sensor smoothing in front of the occupancy models
+occupancy_pipeline = OccupancyPipeline(
+    ema_alpha=float(os.environ.get("OCCUPANCY_EMA_ALPHA", 0.6)),
+    max_sensors=int(os.environ.get("OCCUPANCY_MAX_SENSORS", 1024)),
+    max_staleness_s=float(os.environ.get("INFERENCE_MAX_STALENESS_S", 1.0)),
+    max_skip_frames=int(os.environ.get("INFERENCE_MAX_SKIP_FRAMES", 20)),
+    confidence_threshold=float(os.environ.get("INFERENCE_CONFIDENCE_THRESHOLD", 0.9)),
+    reduced_rate=int(os.environ.get("INFERENCE_REDUCED_RATE", 4))
+)
+
+# Frames of one /ws connection in inference at once (at most one per sensor and model)
+WS_MAX_IN_FLIGHT = int(os.environ.get("WS_MAX_IN_FLIGHT", 4))
+
+# Frames currently inside /inference (reported as queue depth and in-flight gauge)
+in_flight = 0
+metrics.IN_FLIGHT.set_function(lambda: in_flight)
+metrics.registry.gauge(
+    "radar_inference_skip_ratio", "Share of frames that reused a previous result"
+).set_function(lambda: occupancy_pipeline.rate_controller.skip_ratio)
 
 class RadarPayload(BaseModel):
     model_name: str = "default_model"  # Default value if not provided
+    sensor_id: str = "default"  # Identifies the stream for temporal smoothing
     x_pos:    List[float]
     y_pos:    List[float]
     z_pos:    List[float]
@@ -43,6 +83,79 @@ class RadarPayload(BaseModel):
         return [[self.x_pos[i], self.y_pos[i], self.z_pos[i]]
                 for i in range(min_length)]
 
+    def point_data(self) -> dict:
+        return {
+            "x_pos": self.x_pos,
+            "y_pos": self.y_pos,
+            "z_pos": self.z_pos,
+            "snr": self.snr,
+            "noise": self.noise
+        }
+
+class RadarBatchPayload(BaseModel):
+    """
+    Frames of any number of sensors in columnar form. The points of frame i are
+    x_pos[offsets[i]:offsets[i+1]] (likewise y_pos, z_pos, snr and noise); its sensor,
+    timestamp and model are sensor_ids[i], timestamps_ms[i] and model_names[i].
+    """
+    model_name: str = "default_model"  # Model of every frame when model_names is empty
+    sensor_ids:    List[str]
+    timestamps_ms: List[int] = []   # Optional; the arrival time is recorded without it
+    model_names:   List[str] = []
+    offsets:       List[int]        # len(sensor_ids) + 1 entries, from 0 to len(x_pos)
+    x_pos:    List[float]
+    y_pos:    List[float]
+    z_pos:    List[float]
+    snr:      List[float] = []      # Empty, or one value per point
+    noise:    List[float] = []
+
+    def columns_error(self) -> str:
+        """Why the columns do not describe a batch of frames; None if they do."""
+        frames = len(self.sensor_ids)
+        if len(self.offsets) != frames + 1:
+            return f"offsets must have {frames + 1} entries (one more than sensor_ids), got {len(self.offsets)}"
+        for name in ("timestamps_ms", "model_names"):
+            if getattr(self, name) and len(getattr(self, name)) != frames:
+                return f"{name} must have one entry per frame ({frames}), got {len(getattr(self, name))}"
+        points = len(self.x_pos)
+        if len(self.y_pos) != points or len(self.z_pos) != points:
+            return "x_pos, y_pos and z_pos must have the same length"
+        for name in ("snr", "noise"):
+            if getattr(self, name) and len(getattr(self, name)) != points:
+                return f"{name} must be empty or have one value per point ({points})"
+        if self.offsets[0] != 0 or self.offsets[-1] != points:
+            return f"offsets must start at 0 and end at the number of points ({points})"
+        if any(a > b for a, b in zip(self.offsets, self.offsets[1:])):
+            return "offsets must not decrease"
+        return None
+
+    def frames(self) -> list:
+        """(sensor_id, model_name, (M,5) points) of each frame, slices of one column array."""
+        columns = [self.x_pos, self.y_pos, self.z_pos, self.snr, self.noise]
+        points = np.zeros((len(self.x_pos), 5), dtype=np.float32)
+        for j, column in enumerate(columns):
+            if column:
+                points[:, j] = column
+        model_names = self.model_names or [self.model_name] * len(self.sensor_ids)
+        return [(sensor_id, model_name, points[start:end])
+                for sensor_id, model_name, start, end
+                in zip(self.sensor_ids, model_names, self.offsets, self.offsets[1:])]
+
+    def point_data(self, i: int) -> dict:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {
+            "x_pos": self.x_pos[start:end],
+            "y_pos": self.y_pos[start:end],
+            "z_pos": self.z_pos[start:end],
+            "snr": self.snr[start:end],
+            "noise": self.noise[start:end]
+        }
+
+class WsRadarPayload(RadarPayload):
+    """A frame streamed over /ws; seq is echoed in its reply."""
+    seq: Optional[int] = None
+    timestamp_ms: Optional[int] = None
+
 class CreateModelPayload(BaseModel):
     name: str
     num_classes: int
@@ -51,49 +164,209 @@ class CreateModelPayload(BaseModel):
     batch_size: int
     learning_rate: float
     weight_decay: float
+    sampling: str = DEFAULT_SAMPLING  # Point-selection strategy, recorded in model metadata
+    tta_draws: int = 1  # Subsamples averaged per inference (test-time augmentation)
+
+class InferenceConfigPayload(BaseModel):
+    tta_draws: int
+
+# Models to preload on startup: comma-separated names, unset means every model in the database
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS")
+
+# Optional shared-backbone model (model.multihead) serving occupancy and fall detection
+# from one embedding per frame on /combined
+COMBINED_MODEL_PATH = os.environ.get("COMBINED_MODEL_PATH")
+combined_predictor = None
+# Its per-sensor fall state is not thread-safe, so frames reach the threadpool one at a
+# time in arrival order (asyncio.Lock is FIFO)
+combined_order = asyncio.Lock()
+
+# Warm-up is retried this many times, WARM_UP_RETRY_S apart, before /ready reports "failed"
+WARM_UP_ATTEMPTS = max(1, int(os.environ.get("WARM_UP_ATTEMPTS", 3)))
+WARM_UP_RETRY_S = float(os.environ.get("WARM_UP_RETRY_S", 5.0))
+
+startup_state = {
+    "ready": False,
+    "failed": False,
+    "models": [],
+    "errors": {}
+}
+
+def load_models() -> dict:
+    """
+    Load and warm the configured models; returns {name: error} for those that failed.
+    Also called by the pre-fork launcher before forking workers, so it skips models
+    that are already loaded.
+    """
+    global combined_predictor
+    from model.inference import preload_models
+
+    names = None
+    if PRELOAD_MODELS is not None:
+        names = [name.strip() for name in PRELOAD_MODELS.split(",") if name.strip()]
+    errors = preload_models(names)
+    if COMBINED_MODEL_PATH and combined_predictor is None:
+        from model.combined import CombinedPredictor
+        try:
+            combined_predictor = CombinedPredictor(COMBINED_MODEL_PATH)
+        except Exception as e:
+            errors["combined"] = str(e)
+    return errors
+
+def warm_up():
+    """Import the inference stack and preload/warm configured models off the event loop."""
+    # torch and the model code are imported here rather than at module import so the
+    # server starts accepting connections (and answering /ready) immediately
+    for attempt in range(1, WARM_UP_ATTEMPTS + 1):
+        try:
+            from model.inference import model_registry
+
+            startup_state["errors"] = load_models()
+            startup_state["models"] = model_registry.loaded_names()
+            model_registry.start()
+            startup_state["ready"] = True
+            return
+        except Exception as e:
+            print(f"Error during warm-up (attempt {attempt}/{WARM_UP_ATTEMPTS}): {e}")
+            startup_state["errors"] = {"warm_up": str(e)}
+        if attempt < WARM_UP_ATTEMPTS:
+            time.sleep(WARM_UP_RETRY_S)
+    startup_state["failed"] = True
+
+@app.on_event("startup")
+async def start_warm_up():
+    """Start preloading models in the background."""
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("startup")
+async def start_broadcaster():
+    """Join the other workers' broadcasts (BROADCAST_BACKEND) and start the recorder."""
+    await broadcaster.start()
+    if recorder is not None:
+        recorder.start()
+
+@app.on_event("shutdown")
+async def stop_model_registry():
+    inference = sys.modules.get("model.inference")
+    if inference is not None:
+        inference.model_registry.stop()
+    await broadcaster.stop()
+    if recorder is not None:
+        recorder.stop()
+
+@app.get("/ready")
+async def readiness():
+    """Report whether configured models are loaded and warmed, or why warm-up failed."""
+    if startup_state["ready"]:
+        status = "ready"
+    else:
+        status = "failed" if startup_state["failed"] else "starting"
+    return JSONResponse(
+        status_code=200 if startup_state["ready"] else 503,
+        content={
+            "status": status,
+            "models": startup_state["models"],
+            "errors": startup_state["errors"]
+        }
+    )
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """Handle WebSocket connections."""
-    await websocket.accept()
-    clients.append(websocket)
+    """
+    Dashboard connection receiving every broadcast. Sensors may also stream frames here,
+    one WsRadarPayload per message, answered with {"event": "inference", "sensor_id",
+    "seq", "occupancy"} and broadcast to the other clients. Frames keep being read while
+    earlier ones are in inference (see PipelinedIngest); a frame superseded by a newer
+    one of its sensor before it started is answered with {"event": "dropped", ...}.
+    """
+    await broadcaster.connect(websocket)
+    ingest = PipelinedIngest(lambda frame: _ws_inference(websocket, *frame), WS_MAX_IN_FLIGHT)
+    parse_seconds = metrics.REQUEST_PARSE_SECONDS.labels("ws")
     try:
         while True:
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            received = time.perf_counter()
+            try:
+                payload = WsRadarPayload.model_validate_json(text)
+            except ValidationError:
+                continue  # Keep-alives and other non-frame messages
+            parse_seconds.observe_since(received)
+
+            dropped = ingest.submit((payload.sensor_id, payload.model_name), (payload, received))
+            if dropped is not None:
+                metrics.FRAMES_DROPPED.inc(payload.sensor_id, payload.model_name)
+                await websocket.send_json({"event": "dropped", "sensor_id": payload.sensor_id,
+                                           "seq": dropped[0].seq})
     except WebSocketDisconnect:
-        clients.remove(websocket)
+        broadcaster.disconnect(websocket)
+    except Exception as e:
+        print(f"Error processing frame: {e}")
+        broadcaster.disconnect(websocket)
+    finally:
+        ingest.close()
 
-async def broadcast_to_clients(message: str):
-    """Send message to all connected clients and clean up dead connections."""
-    dead = []
-    for ws in clients:
-        try:
-            await ws.send_text(message)
-        except:
-            dead.append(ws)
-    for ws in dead:
-        clients.remove(ws)
+async def _ws_inference(websocket: WebSocket, payload: WsRadarPayload, received: float):
+    """Run one /ws frame through the occupancy pipeline (off the event loop) and answer it."""
+    global in_flight
+    metrics.QUEUE_DEPTH.observe(in_flight)
+    in_flight += 1
+    try:
+        result = await run_in_threadpool(occupancy_pipeline.process, payload.sensor_id, payload.model_name,
+                                         payload.to_sensor_data(), payload.snr, payload.noise)
+    except Exception as e:
+        if not isinstance(e, ModelNotFoundError):
+            metrics.FRAMES_DROPPED.inc(payload.sensor_id, payload.model_name)
+            print(f"Error processing frame of {payload.sensor_id}: {e}")
+        await websocket.send_json({"status": "error", "message": str(e),
+                                   "sensor_id": payload.sensor_id, "seq": payload.seq})
+        return
+    finally:
+        in_flight -= 1
+    if recorder is not None:
+        recorder.record(payload.sensor_id, payload.point_data(), occupancy=result, timestamp_ms=payload.timestamp_ms)
+
+    await websocket.send_json({"event": "inference", "sensor_id": payload.sensor_id,
+                               "seq": payload.seq, "occupancy": result})
+    metrics.WS_FRAME_SECONDS.observe_since(received, "inference")
+    await broadcaster.broadcast(json.dumps({
+        "event": "inference",
+        "sensor_id": payload.sensor_id,
+        "occupancy": result,
+        "point_data": payload.point_data()
+    }), exclude=websocket)
 
 @app.post("/inference")
-async def inference_hook(payload: RadarPayload):
+async def inference_hook(payload: RadarPayload = Depends(timed_body(RadarPayload, "inference"))):
     """Process radar data and broadcast results to WebSocket clients."""
-    sensor_data = payload.to_sensor_data()
+    global in_flight
+    metrics.QUEUE_DEPTH.observe(in_flight)
+    in_flight += 1
+    try:
+        return await _run_inference(payload)
+    except Exception:
+        metrics.FRAMES_DROPPED.inc(payload.sensor_id, payload.model_name)
+        raise
+    finally:
+        in_flight -= 1
 
-    # Get model info from database to get num_classes
-    model_info = model_db.get_model(payload.model_name)
-    if not model_info:
+async def _run_inference(payload: RadarPayload):
+    try:
+        result = await run_in_threadpool(occupancy_pipeline.process, payload.sensor_id, payload.model_name,
+                                         payload.to_sensor_data(), payload.snr, payload.noise)
+    except ModelNotFoundError as e:
         return JSONResponse(
             status_code=404,
             content={
                 "status": "error",
-                "message": f"Model '{payload.model_name}' not found in database"
+                "message": str(e)
             }
         )
-    
-    result = predict(sensor_data, payload.model_name, model_info['num_classes'], payload.snr, payload.noise)
+    if recorder is not None:
+        recorder.record(payload.sensor_id, payload.point_data(), occupancy=result)
 
     combined_message = json.dumps({
         "event": "inference",
+        "sensor_id": payload.sensor_id,
         "occupancy": result,
         "point_data": {
             "x_pos": payload.x_pos,
@@ -103,17 +376,156 @@ async def inference_hook(payload: RadarPayload):
             "noise": payload.noise
         }
     })
-    await broadcast_to_clients(combined_message)
+    await broadcaster.broadcast(combined_message)
 
     return JSONResponse(content={
         "status": "ok", 
-        "clients": len(clients)
+        "clients": len(broadcaster),
+        "occupancy": result
+    })
+
+@app.post("/inference/batch")
+async def inference_batch_hook(payload: RadarBatchPayload = Depends(timed_body(RadarBatchPayload, "inference_batch"))):
+    """
+    Occupancy for many frames of many sensors in one request, with one batched model
+    forward per model. Results come back per frame, in request order; a frame for an
+    unknown model or without points gets an error entry instead of failing the batch.
+    """
+    global in_flight
+    error = payload.columns_error()
+    if error:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "status": "error",
+                "message": error
+            }
+        )
+
+    frames = payload.frames()
+    metrics.QUEUE_DEPTH.observe(in_flight)
+    in_flight += len(frames)
+    try:
+        results = await run_in_threadpool(occupancy_pipeline.process_batch, frames)
+    except Exception:
+        for sensor_id, model_name, _ in frames:
+            metrics.FRAMES_DROPPED.inc(sensor_id, model_name)
+        raise
+    finally:
+        in_flight -= len(frames)
+
+    responses = []
+    for i, ((sensor_id, _, _), result) in enumerate(zip(frames, results)):
+        timestamp_ms = payload.timestamps_ms[i] if payload.timestamps_ms else None
+        if isinstance(result, Exception):
+            responses.append({"sensor_id": sensor_id, "timestamp_ms": timestamp_ms,
+                              "status": "error", "message": str(result)})
+            continue
+        point_data = payload.point_data(i)
+        if recorder is not None:
+            recorder.record(sensor_id, point_data, occupancy=result, timestamp_ms=timestamp_ms)
+        await broadcaster.broadcast(json.dumps({
+            "event": "inference",
+            "sensor_id": sensor_id,
+            "timestamp_ms": timestamp_ms,
+            "occupancy": result,
+            "point_data": point_data
+        }))
+        responses.append({"sensor_id": sensor_id, "timestamp_ms": timestamp_ms,
+                          "status": "ok", "occupancy": result})
+
+    return JSONResponse(content={
+        "status": "ok",
+        "clients": len(broadcaster),
+        "frames": responses
+    })
+
+async def _combined_in_order(payload: RadarPayload) -> dict:
+    async with combined_order:
+        return await run_in_threadpool(combined_predictor.process_frame, payload.sensor_id,
+                                       payload.to_sensor_data(), payload.snr, payload.noise)
+
+@app.post("/combined")
+async def combined_hook(payload: RadarPayload = Depends(timed_body(RadarPayload, "combined"))):
+    """Occupancy and fall detection for one frame from a single shared-backbone pass."""
+    if combined_predictor is None:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "error",
+                "message": "Combined model not loaded (set COMBINED_MODEL_PATH)"
+            }
+        )
+
+    # Off the event loop; shielded so a client disconnect does not release combined_order
+    # while the thread still runs
+    result = await asyncio.shield(_combined_in_order(payload))
+
+    message = {
+        "event": "combined",
+        "sensor_id": payload.sensor_id,
+        "occupancy": result["occupancy"],
+        "point_data": {
+            "x_pos": payload.x_pos,
+            "y_pos": payload.y_pos,
+            "z_pos": payload.z_pos,
+            "snr": payload.snr,
+            "noise": payload.noise
+        }
+    }
+    if result["fall_detection"]:
+        message["fall_detection"] = result["fall_detection"]
+    await broadcaster.broadcast(json.dumps(message))
+
+    return JSONResponse(content={
+        "status": "ok",
+        "clients": len(broadcaster),
+        **result
+    })
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Export metrics in the Prometheus text format."""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/inference/stats")
+async def inference_stats():
+    """Report how often frames reused a previous result instead of running the model."""
+    return JSONResponse(content={
+        "status": "success",
+        **occupancy_pipeline.stats()
     })
 
 @app.post("/create_model")
 async def create_model_endpoint(payload: CreateModelPayload):
     """Create a new model."""
+    if payload.sampling not in SAMPLING_STRATEGIES:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "status": "error",
+                "message": f"Unknown sampling strategy '{payload.sampling}', expected one of {list(SAMPLING_STRATEGIES)}"
+            }
+        )
+    if not 1 <= payload.tta_draws <= MAX_TTA_DRAWS:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "status": "error",
+                "message": f"tta_draws must be between 1 and {MAX_TTA_DRAWS}"
+            }
+        )
+    # Reject unusable training data from the catalog before loading anything
+    data_error = catalog.check_data_dir(payload.data_dir, payload.num_classes)
+    if data_error:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": data_error}
+        )
     try:
+        # Training-only dependencies (sklearn, DataLoader workers) are imported on demand
+        from model.model import create_model
+
         models_dir = get_models_dir()
         os.makedirs(models_dir, exist_ok=True)
 
@@ -124,7 +536,7 @@ async def create_model_endpoint(payload: CreateModelPayload):
                 # Run the broadcast in the event loop properly
                 try:
                     future = asyncio.run_coroutine_threadsafe(
-                        broadcast_to_clients(json.dumps(data)), 
+                        broadcaster.broadcast(json.dumps(data)), 
                         loop
                     )
                     # Don't wait for the result to avoid blocking
@@ -141,7 +553,8 @@ async def create_model_endpoint(payload: CreateModelPayload):
                     payload.batch_size,
                     payload.learning_rate,
                     payload.weight_decay,
-                    progress_callback
+                    progress_callback,
+                    payload.sampling
                 )
         except Exception as e:
             return JSONResponse(
@@ -169,7 +582,8 @@ async def create_model_endpoint(payload: CreateModelPayload):
                 epochs=payload.epochs,
                 batch_size=payload.batch_size,
                 learning_rate=payload.learning_rate,
-                weight_decay=payload.weight_decay
+                weight_decay=payload.weight_decay,
+                metadata={"sampling": payload.sampling, "tta_draws": payload.tta_draws}
         )
             
         if success:
@@ -205,6 +619,22 @@ async def create_model_endpoint(payload: CreateModelPayload):
 @app.post("/start_training")
 async def start_training_endpoint(payload: CreateModelPayload):
     """Start model training with real-time progress updates."""
+    if payload.sampling not in SAMPLING_STRATEGIES:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "status": "error",
+                "message": f"Unknown sampling strategy '{payload.sampling}', expected one of {list(SAMPLING_STRATEGIES)}"
+            }
+        )
+    if not 1 <= payload.tta_draws <= MAX_TTA_DRAWS:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "status": "error",
+                "message": f"tta_draws must be between 1 and {MAX_TTA_DRAWS}"
+            }
+        )
     try:
         # Send training start notification
         start_message = json.dumps({
@@ -214,7 +644,10 @@ async def start_training_endpoint(payload: CreateModelPayload):
             "batch_size": payload.batch_size,
             "learning_rate": payload.learning_rate
         })
-        await broadcast_to_clients(start_message)
+        await broadcaster.broadcast(start_message)
+
+        # Training-only dependencies (sklearn, DataLoader workers) are imported on demand
+        from model.model import create_model
 
         # Use absolute path for models directory
         models_dir = get_models_dir()
@@ -227,7 +660,7 @@ async def start_training_endpoint(payload: CreateModelPayload):
                 # Run the broadcast in the event loop from thread
                 try:
                     future = asyncio.run_coroutine_threadsafe(
-                        broadcast_to_clients(json.dumps(data)), 
+                        broadcaster.broadcast(json.dumps(data)), 
                         loop
                     )
                     # Don't wait for the result to avoid blocking training
@@ -244,7 +677,8 @@ async def start_training_endpoint(payload: CreateModelPayload):
                     payload.batch_size,
                     payload.learning_rate,
                     payload.weight_decay,
-                    progress_callback
+                    progress_callback,
+                    payload.sampling
                 )
 
             model_path = os.path.join(models_dir, f"{payload.name}.pth")
@@ -264,7 +698,8 @@ async def start_training_endpoint(payload: CreateModelPayload):
                     epochs=payload.epochs,
                     batch_size=payload.batch_size,
                     learning_rate=payload.learning_rate,
-                    weight_decay=payload.weight_decay
+                    weight_decay=payload.weight_decay,
+                    metadata={"sampling": payload.sampling, "tta_draws": payload.tta_draws}
             )
                 
             if success:
@@ -333,20 +768,45 @@ async def get_model(model_name: str):
             }
         )
     
+@app.put("/models/{model_name}/inference_config")
+async def update_inference_config(model_name: str, payload: InferenceConfigPayload):
+    """Change per-model inference settings stored in the model's metadata."""
+    if not 1 <= payload.tta_draws <= MAX_TTA_DRAWS:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "status": "error",
+                "message": f"tta_draws must be between 1 and {MAX_TTA_DRAWS}"
+            }
+        )
+    if not model_db.get_model(model_name):
+        return JSONResponse(
+            status_code=404,
+            content={
+                "status": "error",
+                "message": f"Model '{model_name}' not found"
+            }
+        )
+
+    metadata = model_db.update_model_metadata(model_name, {"tta_draws": payload.tta_draws})
+    if metadata is None:
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status": "error",
+                "message": "Failed to update model metadata"
+            }
+        )
+    return JSONResponse(content={
+        "status": "success",
+        "model": model_name,
+        "metadata": metadata
+    })
+
 @app.post("/upload_data")
 async def upload_data(file: UploadFile = File(...)):
     """Upload a JSON file to the data directory and store metadata in database."""
     try:
-        # Validate file type - only allow JSON files
-        if not file.filename.lower().endswith('.json'):
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "status": "error",
-                    "message": "Only JSON files (.json) are allowed"
-                }
-            )
-        
         # Validate content type if provided
         if file.content_type and file.content_type not in ['application/json', 'text/json']:
             return JSONResponse(
@@ -356,83 +816,29 @@ async def upload_data(file: UploadFile = File(...)):
                     "message": "Invalid content type. Only JSON files are allowed"
                 }
             )
-        
-        # Validate JSON content
+
+        # Stream into a part file while hashing and validating the JSON, then publish it
         try:
-            content = await file.read()
-            # Try to parse as JSON to validate
-            json.loads(content.decode('utf-8'))
-            # Reset file pointer for saving
-            await file.seek(0)
-        except json.JSONDecodeError:
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "status": "error",
-                    "message": "Invalid JSON content. Please upload a valid JSON file"
-                }
-            )
-        except UnicodeDecodeError:
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "status": "error",
-                    "message": "File must be UTF-8 encoded"
-                }
-            )
-        
-        # Get the data directory path
-        data_dir = get_data_dir()
-        
-        # Create the full file path
-        file_path = os.path.join(data_dir, file.filename)
-        
-        # Check if file already exists
-        if os.path.exists(file_path):
-            return JSONResponse(
-                status_code=409,
-                content={
-                    "status": "error",
-                    "message": f"File '{file.filename}' already exists"
-                }
-            )
-        
-        # Save the uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        
-        # Store file metadata in database
-        success = model_db.add_file(
-            filename=file.filename,
-            file_path=file_path,
-            file_size_bytes=file_size,
-            content_type="application/json"
-        )
-        
-        if not success:
-            # If database storage fails, remove the uploaded file
-            os.remove(file_path)
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "status": "error",
-                    "message": "File uploaded but failed to store metadata in database"
-                }
-            )
-        
-        return JSONResponse(content={
-            "status": "success",
-            "message": f"JSON file '{file.filename}' uploaded successfully",
-            "file_info": {
-                "filename": file.filename,
-                "size_bytes": file_size,
-                "path": file_path,
-                "content_type": "application/json"
-            }
-        })
+            upload = await run_in_threadpool(uploads.create_upload, file.filename)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+        except FileExistsError as e:
+            return JSONResponse(status_code=409, content={"status": "error", "message": str(e)})
+
+        try:
+            with open(upload.part_path, "ab", buffering=0) as buffer:
+                while True:
+                    data = await file.read(uploads.PIECE_SIZE)
+                    if not data:
+                        break
+                    await run_in_threadpool(uploads.append_piece, upload, buffer, data)
+        except (uploads.InvalidJSON, UnicodeDecodeError) as e:
+            return uploads.rejected(upload, e)
+        except Exception:
+            uploads.discard_upload(upload)
+            raise
+
+        return await run_in_threadpool(uploads.complete_upload, upload)
         
     except Exception as e:
         return JSONResponse(
@@ -0,0 +1,250 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond preprocessing up to slow forwards
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+# Distinct client sensor ids kept as label values, matching the tracker's cap;
+# later sensors are reported under OTHER_LABEL so a scrape stays bounded
+MAX_SENSOR_LABELS = 1024
+OTHER_LABEL = "other"
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 bounded_label: Optional[str] = None, max_values: int = MAX_SENSOR_LABELS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+        # Label whose values come from clients; only max_values of them get their own series
+        self._bounded = self.labelnames.index(bounded_label) if bounded_label else None
+        self._max_values = max_values
+        self._seen = set()
+
+    def labels(self, *values):
+        """Return the child for these label values; cache it on hot paths with fixed labels."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                values = self._bound(values)
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _bound(self, values: Tuple) -> Tuple:
+        """Collapse the bounded label into OTHER_LABEL once max_values are taken."""
+        if self._bounded is None:
+            return values
+        value = values[self._bounded]
+        if value not in self._seen:
+            if len(self._seen) >= self._max_values:
+                return values[:self._bounded] + (OTHER_LABEL,) + values[self._bounded + 1:]
+            self._seen.add(value)
+        return values
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, *values, amount: float = 1.0):
+        self.labels(*values).inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        value = self.function() if self.function is not None else self.value
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float, *values):
+        self.labels(*values).set(value)
+
+    def set_function(self, function: Callable[[], float], *values):
+        """Compute the value at scrape time instead of on every update."""
+        self.labels(*values).function = function
+
+
+class _HistogramChild:
+    """Bucket counts are preallocated; observe() only bisects and increments."""
+
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def observe_since(self, start: float):
+        """Observe the time elapsed since a time.perf_counter() reading."""
+        self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        counts = list(self.counts)
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float, *values):
+        self.labels(*values).observe(value)
+
+    def observe_since(self, start: float, *values):
+        self.labels(*values).observe(time.perf_counter() - start)
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                bounded_label: Optional[str] = None) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, bounded_label))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Content type expected by Prometheus scrapers
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Hot-path metrics shared by the occupancy and fall-detection apps
+REQUEST_PARSE_SECONDS = registry.histogram(
+    "radar_request_parse_seconds", "Time to read and validate a request body", ("endpoint",))
+PREPROCESS_SECONDS = registry.histogram(
+    "radar_preprocess_seconds", "Time to turn a frame into model input", ("model",))
+FORWARD_SECONDS = registry.histogram(
+    "radar_model_forward_seconds", "Model forward pass time", ("model",))
+BROADCAST_SECONDS = registry.histogram(
+    "radar_broadcast_seconds", "Time to send one message to all WebSocket clients")
+DB_LOOKUP_SECONDS = registry.histogram(
+    "radar_db_lookup_seconds", "Model database lookup time")
+QUEUE_DEPTH = registry.histogram(
+    "radar_inference_queue_depth", "Frames already in flight when a new frame arrives",
+    buckets=SIZE_BUCKETS)
+BATCH_SIZE = registry.histogram(
+    "radar_inference_batch_size", "Samples per model forward pass", ("model",), buckets=SIZE_BUCKETS)
+FRAMES_PROCESSED = registry.counter(
+    "radar_frames_processed_total", "Frames that produced a result", ("sensor", "model"), "sensor")
+FRAMES_SKIPPED = registry.counter(
+    "radar_frames_skipped_total", "Frames answered by reusing a previous result", ("sensor", "model"),
+    "sensor")
+FRAMES_DROPPED = registry.counter(
+    "radar_frames_dropped_total", "Frames discarded without a result", ("sensor", "model"), "sensor")
+PUBSUB_DROPPED = registry.counter(
+    "radar_pubsub_dropped_total", "Broadcasts not forwarded to a worker whose connection was backed up")
+WS_FRAME_SECONDS = registry.histogram(
+    "radar_ws_frame_seconds", "Time from receiving a WebSocket frame to sending its result", ("endpoint",))
+IN_FLIGHT = registry.gauge(
+    "radar_inference_in_flight", "Frames currently being processed")
@@ -0,0 +1,131 @@
+# model/combined.py
+import time
+from collections import OrderedDict, deque
+import numpy as np
+import torch
+from .inference import DEVICE, _points_5d, _sample_or_pad, model_registry
+from .multihead import load_multihead
+from .sampling import DEFAULT_SAMPLING
+from registry import ModelSpec
+import metrics
+from profiling import profiler
+
+MODEL_NAME = "multihead"
+
+class SensorBuffer:
+    """Embeddings of a sensor's most recent frames plus its fall-probability EMA."""
+
+    def __init__(self, sequence_length: int):
+        self.embeddings = deque(maxlen=sequence_length)  # oldest -> newest (1024,) tensors
+        self.ema_value = None
+
+class CombinedPredictor:
+    """
+    Serves occupancy and fall detection from one MultiHeadPointNet backbone pass per
+    frame. Each frame's embedding feeds the occupancy head directly and is appended to
+    the sensor's buffer; once sequence_length embeddings are buffered the fall LSTM runs
+    over them, so fall detection no longer re-embeds any frame.
+
+    The model is registered with the shared model registry under MODEL_NAME and is
+    hot-reloaded when its weights change; buffered embeddings from the previous
+    backbone are dropped on a swap.
+    """
+
+    def __init__(self, model_path: str, max_sensors: int = 1024, ema_alpha: float = 0.7, threshold: float = 0.7):
+        self.model_path = model_path
+        self.max_sensors = max_sensors
+        self.ema_alpha = ema_alpha  # Same smoothing as FallDetector
+        self.threshold = threshold
+        self._buffers: "OrderedDict[str, SensorBuffer]" = OrderedDict()
+        self.metadata = {}
+
+        model_registry.register(MODEL_NAME, ModelSpec(model_path, self._load))
+        model_registry.subscribe(MODEL_NAME, self._on_swap)
+        model_registry.load(MODEL_NAME)
+
+    def _load(self, path: str):
+        model, metadata = load_multihead(path, DEVICE)
+        with torch.no_grad():
+            embeddings = model.embed(torch.zeros(1, metadata.get('num_points', 128), 5, device=DEVICE))
+            model.classify_fall(embeddings.unsqueeze(1).repeat(1, metadata.get('sequence_length', 30), 1))
+        self.metadata = metadata
+        return model
+
+    def _on_swap(self, model):
+        self._buffers.clear()
+
+    @property
+    def sequence_length(self) -> int:
+        return self.metadata.get('sequence_length', 30)
+
+    def _buffer(self, sensor_id: str) -> SensorBuffer:
+        buffer = self._buffers.get(sensor_id)
+        if buffer is not None:
+            self._buffers.move_to_end(sensor_id)
+            return buffer
+        buffer = SensorBuffer(self.sequence_length)
+        self._buffers[sensor_id] = buffer
+        while len(self._buffers) > self.max_sensors:
+            self._buffers.popitem(last=False)  # evict least recently seen sensor
+        return buffer
+
+    def process_frame(self, sensor_id: str, sensor_data: list, snr_data: list = None, noise_data: list = None) -> dict:
+        """
+        Returns {"occupancy": {"predicted_count", "probabilities"},
+                 "fall_detection": {...} or None until the sensor has sequence_length frames}
+        """
+        with profiler.section("combined"):
+            return self._process_frame(sensor_id, sensor_data, snr_data, noise_data)
+
+    def _process_frame(self, sensor_id, sensor_data, snr_data, noise_data) -> dict:
+        model = model_registry.get(MODEL_NAME).model
+
+        start = time.perf_counter()
+        pts = _sample_or_pad(_points_5d(sensor_data, snr_data, noise_data),
+                             num_points=self.metadata.get('num_points', 128),
+                             sampling=self.metadata.get('sampling', DEFAULT_SAMPLING))
+        x = torch.from_numpy(pts).unsqueeze(0).to(DEVICE)   # (1,128,5)
+        metrics.PREPROCESS_SECONDS.observe_since(start, MODEL_NAME)
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            embedding = model.embed(x)                        # (1,1024), the only backbone pass
+            probs = torch.softmax(model.classify_occupancy(embedding), dim=1)[0].cpu().numpy()
+            buffer = self._buffer(sensor_id)
+            buffer.embeddings.append(embedding[0])
+            fall_prob = None
+            if len(buffer.embeddings) >= self.sequence_length:
+                sequence = torch.stack(list(buffer.embeddings)).unsqueeze(0)  # (1,seq,1024)
+                fall_prob = torch.softmax(model.classify_fall(sequence), dim=1)[0, 1].item()
+        metrics.FORWARD_SECONDS.observe_since(start, MODEL_NAME)
+        metrics.FRAMES_PROCESSED.inc(sensor_id, MODEL_NAME)
+
+        result = {
+            "occupancy": {
+                "predicted_count": int(np.argmax(probs)),
+                "probabilities": probs.tolist()
+            },
+            "fall_detection": None
+        }
+        if fall_prob is not None:
+            if buffer.ema_value is None:
+                buffer.ema_value = fall_prob
+            else:
+                buffer.ema_value = self.ema_alpha * fall_prob + (1 - self.ema_alpha) * buffer.ema_value
+            result["fall_detection"] = {
+                "is_fall": buffer.ema_value > self.threshold,
+                "fall_probability": buffer.ema_value,
+                "raw_probability": fall_prob,
+                "sequence_complete": True
+            }
+        return result
+
+    def reset(self, sensor_id: str = None):
+        """Forget one sensor's buffered frames or, with no sensor_id, every sensor's."""
+        if sensor_id is None:
+            self._buffers.clear()
+        else:
+            self._buffers.pop(sensor_id, None)
+
+    def __len__(self):
+        return len(self._buffers)
@@ -1,91 +1,193 @@
 # model/inference.py
-import os, numpy as np, torch
+import os, time, numpy as np, torch
+from functools import partial
 from .model import PointNetClassifier
+from .sampling import DEFAULT_SAMPLING, select_indices, pad_indices, random_index_sets
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import model_db
+from registry import ModelRegistry, ModelSpec
+import metrics
+from profiling import profiler
 
 # (A) Where the weights live
 HERE       = os.path.dirname(__file__)
 REPO_ROOT  = os.path.abspath(os.path.join(HERE, "..", ".."))
 DEVICE     = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-_model: PointNetClassifier = None
-_current_model_path: str = None
+# Largest batch predict_batch sends through the model at once (bounds activation memory)
+MAX_FORWARD_BATCH = 256
+
+def _load_classifier(model_path: str, num_classes: int) -> PointNetClassifier:
+    """Load classifier weights and warm the model with a dummy batch."""
+    m = PointNetClassifier(num_classes=num_classes)
+    try:
+        state = torch.load(model_path, map_location=DEVICE)
+        m.load_state_dict(state)
+        m.to(DEVICE).eval()
+        with torch.no_grad():
+            m(torch.zeros(1, 128, 5, device=DEVICE))
+    except Exception as e:
+        raise RuntimeError(f"Failed to load model from {model_path}: {e}")
+    return m
+
+def _db_model_specs() -> dict:
+    """Model specs for every model registered in the database."""
+    return {
+        m['name']: ModelSpec(
+            m['file_path'],
+            partial(_load_classifier, num_classes=m['num_classes']),
+            params={"num_classes": m['num_classes']}
+        )
+        for m in model_db.get_all_models()
+    }
+
+# Loaded classifiers, hot-reloaded in the background when retrained
+model_registry = ModelRegistry()
+model_registry.add_source(_db_model_specs)
 
 def _load_model(model_name: str, num_classes: int) -> PointNetClassifier:
-    global _model, _current_model_path
-    
+    entry = model_registry.get(model_name)
+    if entry is not None:
+        return entry.model
+
     model_info = model_db.get_model(model_name)
     if not model_info:
         raise ValueError(f"Model '{model_name}' not found in database")
-    
-    model_path = model_info['file_path']
-    # Check if we need to load a new model (different path or no model loaded)
-    if _model is None or _current_model_path != model_path:
-        m = PointNetClassifier(num_classes=num_classes)
-        
-        # Ensure the model path exists
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model file not found: {model_path}")
-            
+
+    # Cold miss: load synchronously once, later retrains are swapped in by the registry
+    spec = ModelSpec(
+        model_info['file_path'],
+        partial(_load_classifier, num_classes=num_classes),
+        params={"num_classes": num_classes}
+    )
+    return model_registry.load(model_name, spec).model
+
+def preload_models(names: list[str] = None) -> dict:
+    """
+    Load and warm models before the first request needs them.
+    names: models to preload (default: every model in the database)
+    returns: {model_name: error message} for models that failed to load
+    """
+    errors = {}
+    specs = _db_model_specs()
+    for name in (names if names is not None else list(specs)):
+        spec = specs.get(name)
+        if spec is None:
+            errors[name] = "not found in database"
+            continue
         try:
-            state = torch.load(model_path, map_location=DEVICE)
-            m.load_state_dict(state)
-            m.to(DEVICE).eval()
-            _model = m
-            _current_model_path = model_path
+            model_registry.load(name, spec)
         except Exception as e:
-            raise RuntimeError(f"Failed to load model from {model_path}: {e}")
-    
-    return _model
+            errors[name] = str(e)
+    return errors
 
-def _sample_or_pad(pts: np.ndarray, num_points: int = 128) -> np.ndarray:
+def _sample_or_pad(pts: np.ndarray, num_points: int = 128, sampling: str = DEFAULT_SAMPLING) -> np.ndarray:
     N = pts.shape[0]
     if N >= num_points:
-        idx = np.random.choice(N, num_points, replace=False)
+        idx = select_indices(pts, num_points, sampling)
         return pts[idx]
     else:
-        pad_idx = np.random.choice(N, num_points - N, replace=True)
+        pad_idx = pad_indices(N, num_points - N, sampling)
         return np.vstack([pts, pts[pad_idx]])
 
-def predict(sensor_data: list[list[float]], model_name: str, num_classes: int, snr_data: list[float] = None, noise_data: list[float] = None) -> dict:
+def _points_5d(sensor_data, snr_data=None, noise_data=None) -> np.ndarray:
+    """One frame's [x,y,z] points as the (M,5) x,y,z,snr,noise model input."""
+    pts = np.array(sensor_data, dtype=np.float32)      # (M,3)
+    
+    # Create 5D features by adding SNR and noise
+    if snr_data is not None and noise_data is not None and len(snr_data) == len(pts) and len(noise_data) == len(pts):
+        # Use provided SNR and noise data
+        snr_array = np.array(snr_data, dtype=np.float32)
+        noise_array = np.array(noise_data, dtype=np.float32)
+        return np.column_stack([pts, snr_array, noise_array])  # (M,5)
+    # Pad with zeros if SNR/noise not provided
+    zeros = np.zeros((pts.shape[0], 2), dtype=np.float32)
+    return np.column_stack([pts, zeros])  # (M,5)
+
+def _tta_batch(pts: np.ndarray, draws: int, num_points: int = 128) -> np.ndarray:
+    """K random subsamples of one frame stacked as (K, num_points, D)."""
+    idx = random_index_sets(pts.shape[0], num_points, draws)    # (K,num_points)
+    return pts[idx]
+
+def _model_input(pts_5d: np.ndarray, sampling: str, tta_draws: int) -> np.ndarray:
+    """One frame's (M,5) points as the (K,128,5) samples of its forward pass."""
+    # Different draws only exist for random sampling of frames larger than the model
+    # input; smaller frames are only padded with repeats, which max-pooling ignores
+    if tta_draws > 1 and sampling == "random" and pts_5d.shape[0] > 128:
+        return _tta_batch(pts_5d, tta_draws)                   # (K,128,5)
+    return _sample_or_pad(pts_5d, num_points=128, sampling=sampling)[None]    # (1,128,5)
+
+def _result(draw_probs: np.ndarray) -> dict:
+    probs = draw_probs.mean(axis=0)
+    return {
+        "predicted_count": int(probs.argmax()),
+        "probabilities":    probs.tolist(),
+        "variance":         draw_probs.var(axis=0).tolist(),
+        "draws":            int(draw_probs.shape[0])
+    }
+
+def predict(sensor_data: list[list[float]], model_name: str, num_classes: int, snr_data: list[float] = None, noise_data: list[float] = None, sampling: str = DEFAULT_SAMPLING, tta_draws: int = 1) -> dict:
     """
     sensor_data: list of [x,y,z] points for one frame
     model_name: string name of the model to load
     num_classes: number of classes the model was trained on
     snr_data: list of SNR values corresponding to each point (optional)
     noise_data: list of noise values corresponding to each point (optional)
+    sampling: point-selection strategy the model was trained with (see model.sampling)
+    tta_draws: number of random subsamples averaged in one batched forward (test-time augmentation)
     returns: {
       'predicted_count': int,
-      'probabilities': [p0, p1, p2, p3, p4]  # sum to 1
+      'probabilities': [p0, p1, p2, p3, p4],  # sum to 1, mean over draws
+      'variance': [v0, v1, v2, v3, v4],       # per-class variance across draws
+      'draws': int                            # subsamples actually used
     }
     """
+    with profiler.section("predict"):
+        return _predict(sensor_data, model_name, num_classes, snr_data, noise_data, sampling, tta_draws)
+
+def _predict(sensor_data, model_name, num_classes, snr_data, noise_data, sampling, tta_draws) -> dict:
     model = _load_model(model_name, num_classes)
 
-    pts = np.array(sensor_data, dtype=np.float32)      # (M,3)
-    
-    # Create 5D features by adding SNR and noise
-    if snr_data is not None and noise_data is not None and len(snr_data) == len(pts) and len(noise_data) == len(pts):
-        # Use provided SNR and noise data
-        snr_array = np.array(snr_data, dtype=np.float32)
-        noise_array = np.array(noise_data, dtype=np.float32)
-        pts_5d = np.column_stack([pts, snr_array, noise_array])  # (M,5)
-    else:
-        # Pad with zeros if SNR/noise not provided
-        zeros = np.zeros((pts.shape[0], 2), dtype=np.float32)
-        pts_5d = np.column_stack([pts, zeros])  # (M,5)
-    
-    pts_fixed = _sample_or_pad(pts_5d, num_points=128)    # (128,5)
-    x = torch.from_numpy(pts_fixed)                        # → (128,5)
-    x = x.unsqueeze(0).to(DEVICE)                          # → (1,128,5)
+    start = time.perf_counter()
+    pts_5d = _points_5d(sensor_data, snr_data, noise_data)
+    x = torch.from_numpy(_model_input(pts_5d, sampling, tta_draws)).to(DEVICE)
+    metrics.PREPROCESS_SECONDS.observe_since(start, model_name)
+    metrics.BATCH_SIZE.observe(x.shape[0], model_name)
 
+    start = time.perf_counter()
     with torch.no_grad():
-        logits = model(x)                                  # (1,5)
-        probs  = torch.softmax(logits, dim=1)[0].cpu().numpy()
+        logits = model(x)                                  # (K,5)
+        draw_probs = torch.softmax(logits, dim=1).cpu().numpy()
+    metrics.FORWARD_SECONDS.observe_since(start, model_name)
+    return _result(draw_probs)
 
-    pred_count = int(probs.argmax())
-    return {
-        "predicted_count": pred_count,
-        "probabilities":    probs.tolist()
-    }
\ No newline at end of file
+def predict_batch(frames: list[np.ndarray], model_name: str, num_classes: int, sampling: str = DEFAULT_SAMPLING, tta_draws: int = 1) -> list[dict]:
+    """
+    frames: (M,5) x,y,z,snr,noise points of each frame (M may differ between frames)
+    model_name, num_classes, sampling, tta_draws: as for predict()
+    returns: predict()'s result for each frame, in order
+
+    The samples of all frames (tta_draws each) go through the model together, in
+    forwards of at most MAX_FORWARD_BATCH samples.
+    """
+    with profiler.section("predict_batch"):
+        model = _load_model(model_name, num_classes)
+
+        start = time.perf_counter()
+        inputs = [_model_input(pts, sampling, tta_draws) for pts in frames]
+        x = np.concatenate(inputs)                              # (sum K,128,5)
+        metrics.PREPROCESS_SECONDS.observe_since(start, model_name)
+
+        draw_probs = []
+        with torch.no_grad():
+            for i in range(0, x.shape[0], MAX_FORWARD_BATCH):
+                chunk = torch.from_numpy(x[i:i + MAX_FORWARD_BATCH]).to(DEVICE)
+                metrics.BATCH_SIZE.observe(chunk.shape[0], model_name)
+                start = time.perf_counter()
+                draw_probs.append(torch.softmax(model(chunk), dim=1).cpu().numpy())
+                metrics.FORWARD_SECONDS.observe_since(start, model_name)
+        draw_probs = np.concatenate(draw_probs)
+
+        bounds = np.cumsum([len(samples) for samples in inputs])[:-1]
+        return [_result(probs) for probs in np.split(draw_probs, bounds)]
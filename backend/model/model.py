@@ -3,11 +3,11 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from .preprocessing import get_dataloaders
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import get_model_path
+from .sampling import DEFAULT_SAMPLING
 
 class TNet(nn.Module):
     def __init__(self, k=5):  # Changed from k=3 to k=5 for 5D input
@@ -122,7 +122,7 @@ def evaluate(model, loader, criterion, device):
             total += labels.size(0)
     return loss_sum / len(loader.dataset), correct / total
 
-def create_model(name: str, num_classes: int, data_dir: str, epochs: int, batch_size: int, learning_rate: float, weight_decay: float, progress_callback=None):
+def create_model(name: str, num_classes: int, data_dir: str, epochs: int, batch_size: int, learning_rate: float, weight_decay: float, progress_callback=None, sampling: str = DEFAULT_SAMPLING):
 
     # Send training start notification
     if progress_callback:
@@ -138,8 +138,11 @@ def create_model(name: str, num_classes: int, data_dir: str, epochs: int, batch_
         except Exception as e:
             print(f"Error sending start notification: {e}")
 
+    # Imported here so inference-only processes never load sklearn
+    from .preprocessing import get_dataloaders
+
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    train_loader, val_loader = get_dataloaders(data_dir, batch_size, num_points=128)
+    train_loader, val_loader = get_dataloaders(data_dir, batch_size, num_points=128, sampling=sampling)
     model = PointNetClassifier(num_classes).to(device)
     optimizer = optim.Adam(model.parameters(), lr=learning_rate, weight_decay=weight_decay)
     criterion = nn.CrossEntropyLoss()
@@ -169,7 +172,10 @@ def create_model(name: str, num_classes: int, data_dir: str, epochs: int, batch_
 
     model_path = get_model_path(name)
     os.makedirs(os.path.dirname(model_path), exist_ok=True)
-    torch.save(model.state_dict(), model_path)
+    # Write to a temp file and rename so a hot-reloading server never sees partial weights
+    tmp_path = f"{model_path}.tmp"
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, model_path)
     
     # Send completion notification
     if progress_callback:
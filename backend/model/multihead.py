@@ -0,0 +1,275 @@
+# model/multihead.py
+"""
+One PointNet backbone embedding each frame once for both occupancy counting and fall
+detection. The occupancy head classifies a single frame's embedding; the fall head runs
+the LSTM over the embeddings of the last sequence_length frames, so a deployment that
+serves both embeds every frame once instead of twice.
+
+Both heads see the 5D (x,y,z,snr,noise) input the occupancy classifier already uses.
+
+Train with the multi-task objective (run from backend/):
+    python -m model.multihead --occupancy-data json --num-classes 5 \\
+        --occupancy-weights ../models/default_model.pth --output ../models/multihead.pth
+"""
+import argparse
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from .model import TNet
+from .sampling import DEFAULT_SAMPLING
+
+FEATURE_DIM = 1024
+
+class PointNetBackbone(nn.Module):
+    """PointNetClassifier up to the max-pooled 1024-d global feature"""
+
+    def __init__(self, in_channels=5):
+        super().__init__()
+        self.input_tnet = TNet(k=in_channels)
+        self.conv1 = nn.Conv1d(in_channels, 64, 1)
+        self.bn1   = nn.BatchNorm1d(64)
+
+        self.feature_tnet = TNet(k=64)
+        self.conv2 = nn.Conv1d(64, 128, 1)
+        self.conv3 = nn.Conv1d(128, 1024, 1)
+        self.bn2   = nn.BatchNorm1d(128)
+        self.bn3   = nn.BatchNorm1d(1024)
+
+    def forward(self, x):
+        # x: (B, N, C) -> (B, 1024)
+        x = x.transpose(2, 1)
+        trans = self.input_tnet(x)
+        x = torch.bmm(trans, x)
+        x = torch.relu(self.bn1(self.conv1(x)))
+
+        trans_feat = self.feature_tnet(x)
+        x = torch.bmm(trans_feat, x)
+        x = torch.relu(self.bn2(self.conv2(x)))
+        x = self.bn3(self.conv3(x))
+        return torch.max(x, 2)[0]
+
+class OccupancyHead(nn.Module):
+    """PointNetClassifier's fully connected layers"""
+
+    def __init__(self, num_classes):
+        super().__init__()
+        self.fc1 = nn.Linear(1024, 512)
+        self.bn4 = nn.BatchNorm1d(512)
+        self.drop1 = nn.Dropout(p=0.5)
+        self.fc2 = nn.Linear(512, 256)
+        self.bn5 = nn.BatchNorm1d(256)
+        self.drop2 = nn.Dropout(p=0.5)
+        self.fc3 = nn.Linear(256, num_classes)
+
+    def forward(self, x):
+        x = torch.relu(self.bn4(self.fc1(x)))
+        x = self.drop1(x)
+        x = torch.relu(self.bn5(self.fc2(x)))
+        x = self.drop2(x)
+        return self.fc3(x)
+
+class FallHead(nn.Module):
+    """PointNetLSTM's LSTM and classification layers"""
+
+    def __init__(self, hidden_size=256):
+        super().__init__()
+        self.lstm = nn.LSTM(input_size=1024, hidden_size=hidden_size, num_layers=1, batch_first=True)
+        self.fc1 = nn.Linear(hidden_size, 256)
+        self.fc2 = nn.Linear(256, 128)
+        self.fc3 = nn.Linear(128, 2)
+        self.bn4 = nn.BatchNorm1d(256)
+        self.bn5 = nn.BatchNorm1d(128)
+        self.dropout = nn.Dropout(0.5)
+
+    def forward(self, x):
+        # x: (B, seq, 1024) -> logits [no_fall, fall]
+        lstm_out, _ = self.lstm(x)
+        x = lstm_out[:, -1, :]
+        x = torch.relu(self.bn4(self.fc1(x)))
+        x = self.dropout(x)
+        x = torch.relu(self.bn5(self.fc2(x)))
+        x = self.dropout(x)
+        return self.fc3(x)
+
+class MultiHeadPointNet(nn.Module):
+    def __init__(self, num_classes, hidden_size=256, in_channels=5):
+        super().__init__()
+        self.backbone = PointNetBackbone(in_channels)
+        self.occupancy_head = OccupancyHead(num_classes)
+        self.fall_head = FallHead(hidden_size)
+
+    def embed(self, points):
+        """(B, N, C) frames -> (B, 1024) embeddings"""
+        return self.backbone(points)
+
+    def classify_occupancy(self, embeddings):
+        return self.occupancy_head(embeddings)
+
+    def classify_fall(self, embeddings):
+        """(B, seq, 1024) embeddings of consecutive frames -> fall logits"""
+        return self.fall_head(embeddings)
+
+    def forward(self, sequences):
+        """
+        sequences: (B, seq, N, C). Returns occupancy logits for every frame (B, seq, K)
+        and fall logits for each sequence (B, 2) from a single backbone pass.
+        """
+        batch_size, seq_len = sequences.shape[:2]
+        embeddings = self.embed(sequences.flatten(0, 1)).view(batch_size, seq_len, -1)
+        occupancy = self.classify_occupancy(embeddings.flatten(0, 1)).view(batch_size, seq_len, -1)
+        return occupancy, self.classify_fall(embeddings)
+
+    def load_pretrained(self, occupancy_state=None, fall_state=None):
+        """
+        Initialize from existing single-task weights: a PointNetClassifier state dict
+        provides the backbone and occupancy head (same layer names), a PointNetLSTM
+        state dict the LSTM and fall head. The fall backbone is 3D and is not reused.
+        """
+        if occupancy_state is not None:
+            backbone = {k: v for k, v in occupancy_state.items() if not k.startswith(("fc", "bn4", "bn5"))}
+            head = {k: v for k, v in occupancy_state.items() if k.startswith(("fc", "bn4", "bn5"))}
+            self.backbone.load_state_dict(backbone)
+            self.occupancy_head.load_state_dict(head)
+        if fall_state is not None:
+            head = {k: v for k, v in fall_state.items() if k.startswith(("lstm", "fc", "bn4", "bn5"))}
+            self.fall_head.load_state_dict(head)
+
+def metadata_path(model_path):
+    """Sidecar JSON next to the weights describing how to build and feed the model"""
+    return os.path.splitext(model_path)[0] + '.json'
+
+def load_multihead(model_path, device=None):
+    """Build a MultiHeadPointNet from weights and their sidecar metadata; returns (model, metadata)"""
+    with open(metadata_path(model_path), 'r') as f:
+        metadata = json.load(f)
+    model = MultiHeadPointNet(metadata['num_classes'], metadata.get('hidden_size', 256))
+    model.load_state_dict(torch.load(model_path, map_location=device or 'cpu'))
+    model.to(device or 'cpu').eval()
+    return model, metadata
+
+def save_multihead(model, model_path, metadata):
+    os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+    with open(metadata_path(model_path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    # Write to a temp file and rename so a hot-reloading server never sees partial weights
+    tmp_path = f"{model_path}.tmp"
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, model_path)
+
+def train_multitask(model, occupancy_loader, fall_loader, optimizer, occupancy_criterion, fall_criterion,
+                    device, fall_weight=1.0):
+    """
+    One epoch alternating an occupancy batch and a fall batch per step; both losses
+    back-propagate into the shared backbone. The epoch length follows the occupancy
+    loader and the fall loader is cycled.
+    """
+    model.train()
+    total_occupancy = total_fall = 0.0
+    steps = 0
+    fall_iter = iter(fall_loader)
+    for points, counts in occupancy_loader:
+        try:
+            sequences, falls = next(fall_iter)
+        except StopIteration:
+            fall_iter = iter(fall_loader)
+            sequences, falls = next(fall_iter)
+        points, counts = points.to(device), counts.to(device)
+        sequences, falls = sequences.to(device), falls.to(device)
+
+        optimizer.zero_grad()
+        occupancy_loss = occupancy_criterion(model.classify_occupancy(model.embed(points)), counts)
+        batch_size, seq_len = sequences.shape[:2]
+        embeddings = model.embed(sequences.flatten(0, 1)).view(batch_size, seq_len, -1)
+        fall_loss = fall_criterion(model.classify_fall(embeddings), falls)
+        loss = occupancy_loss + fall_weight * fall_loss
+        loss.backward()
+        optimizer.step()
+
+        total_occupancy += occupancy_loss.item()
+        total_fall += fall_loss.item()
+        steps += 1
+    return total_occupancy / max(steps, 1), total_fall / max(steps, 1)
+
+def evaluate_multitask(model, occupancy_loader, fall_loader, device):
+    model.eval()
+    occupancy_correct = occupancy_total = fall_correct = fall_total = 0
+    with torch.no_grad():
+        for points, counts in occupancy_loader:
+            points, counts = points.to(device), counts.to(device)
+            occupancy_correct += (model.classify_occupancy(model.embed(points)).argmax(1) == counts).sum().item()
+            occupancy_total += counts.size(0)
+        for sequences, falls in fall_loader:
+            sequences, falls = sequences.to(device), falls.to(device)
+            _, logits = model(sequences)
+            fall_correct += (logits.argmax(1) == falls).sum().item()
+            fall_total += falls.size(0)
+    return {
+        "occupancy_accuracy": occupancy_correct / occupancy_total if occupancy_total else 0,
+        "fall_accuracy": fall_correct / fall_total if fall_total else 0
+    }
+
+def main():
+    # Training-only imports, kept out of the serving path
+    from .preprocessing import get_dataloaders
+    from fall_detection.data_collection.preprocessing import get_dataloaders as get_fall_dataloaders
+    from fall_detection.model.pointnet_lstm import compute_class_weights
+
+    parser = argparse.ArgumentParser(description="Train the shared-backbone occupancy + fall model")
+    parser.add_argument("--occupancy-data", required=True, help="occupancy data directory (under data/)")
+    parser.add_argument("--fall-data", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                            'fall_detection/data_collection/data/sequences'))
+    parser.add_argument("--num-classes", type=int, required=True)
+    parser.add_argument("--sampling", default=DEFAULT_SAMPLING)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32, help="occupancy frames per step")
+    parser.add_argument("--fall-batch-size", type=int, default=4, help="fall sequences per step")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--weight-decay", type=float, default=1e-4)
+    parser.add_argument("--fall-weight", type=float, default=1.0, help="weight of the fall loss")
+    parser.add_argument("--occupancy-weights", help="PointNetClassifier weights to start from")
+    parser.add_argument("--fall-weights", help="PointNetLSTM weights to start the fall head from")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model = MultiHeadPointNet(args.num_classes)
+    model.load_pretrained(
+        torch.load(args.occupancy_weights, map_location='cpu') if args.occupancy_weights else None,
+        torch.load(args.fall_weights, map_location='cpu') if args.fall_weights else None
+    )
+    model.to(device)
+
+    occupancy_train, occupancy_val = get_dataloaders(args.occupancy_data, args.batch_size, num_points=128,
+                                                     sampling=args.sampling)
+    fall_train, fall_val = get_fall_dataloaders(args.fall_data, batch_size=args.fall_batch_size, num_points=128,
+                                                test_split=0.1, sampling=args.sampling, channels=5)
+    fall_labels = list(fall_train.dataset.labels) + list(fall_val.dataset.labels)
+    fall_criterion = nn.CrossEntropyLoss(weight=compute_class_weights(fall_labels).to(device))
+    occupancy_criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=args.lr, weight_decay=args.weight_decay)
+
+    for epoch in range(1, args.epochs + 1):
+        start = time.perf_counter()
+        occupancy_loss, fall_loss = train_multitask(model, occupancy_train, fall_train, optimizer,
+                                                    occupancy_criterion, fall_criterion, device, args.fall_weight)
+        val = evaluate_multitask(model, occupancy_val, fall_val, device)
+        print(f"Epoch {epoch:02d} ({time.perf_counter() - start:.1f}s) | Occupancy Loss: {occupancy_loss:.4f} | "
+              f"Fall Loss: {fall_loss:.4f} | Val Occupancy Acc: {val['occupancy_accuracy']:.4f} | "
+              f"Val Fall Acc: {val['fall_accuracy']:.4f}")
+
+    save_multihead(model, args.output, {
+        "num_classes": args.num_classes,
+        "hidden_size": 256,
+        "num_points": 128,
+        "sequence_length": 30,
+        "sampling": args.sampling
+    })
+    print(f"Saved model to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ from sklearn.model_selection import train_test_split
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from utils import get_data_subdir
+from .sampling import DEFAULT_SAMPLING, select_indices
 
 def load_all_frames(data_dir):
     """
@@ -55,11 +56,12 @@ def load_all_frames(data_dir):
     return clouds, labels
 
 class RadarDataset(Dataset):
-    def __init__(self, clouds, labels, num_points=128, transform=None):
+    def __init__(self, clouds, labels, num_points=128, transform=None, sampling=DEFAULT_SAMPLING):
         self.clouds = clouds
         self.labels = labels
         self.num_points = num_points
         self.transform = transform
+        self.sampling = sampling
 
     def __len__(self):
         return len(self.clouds)
@@ -70,7 +72,7 @@ class RadarDataset(Dataset):
 
         N = cloud.shape[0]
         if N >= self.num_points:
-            choice = np.random.choice(N, self.num_points, replace=False)
+            choice = select_indices(cloud, self.num_points, self.sampling)
             cloud = cloud[choice, :]
         else:
             pad = np.zeros((self.num_points - N, 5), dtype=cloud.dtype)
@@ -85,7 +87,8 @@ def get_dataloaders(data_dir,
                     batch_size=32,
                     num_points=128,
                     test_split=0.2,
-                    random_seed=42):
+                    random_seed=42,
+                    sampling=DEFAULT_SAMPLING):
     # 1) load every frame & label
     clouds, labels = load_all_frames(data_dir)
     
@@ -102,8 +105,8 @@ def get_dataloaders(data_dir,
     )
 
     # 3) wrap them in Datasets + DataLoaders
-    train_ds = RadarDataset(X_train, y_train, num_points=num_points)
-    val_ds   = RadarDataset(X_val,   y_val,   num_points=num_points)
+    train_ds = RadarDataset(X_train, y_train, num_points=num_points, sampling=sampling)
+    val_ds   = RadarDataset(X_val,   y_val,   num_points=num_points, sampling=sampling)
 
     train_loader = DataLoader(train_ds,
                               batch_size=batch_size,
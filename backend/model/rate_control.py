@@ -0,0 +1,146 @@
+# model/rate_control.py
+import time
+from collections import OrderedDict
+import numpy as np
+
+RUN = "run"
+REUSE = "reuse"
+
+class FrameStats:
+    """Cheap per-frame summary used to decide whether a frame needs the model."""
+
+    __slots__ = ("point_count", "bbox_min", "bbox_max", "centroid", "snr_sum")
+
+    def __init__(self, point_count: int, bbox_min, bbox_max, centroid, snr_sum: float):
+        self.point_count = point_count
+        self.bbox_min = bbox_min
+        self.bbox_max = bbox_max
+        self.centroid = centroid
+        self.snr_sum = snr_sum
+
+    @classmethod
+    def from_points(cls, points: np.ndarray, snr=None) -> "FrameStats":
+        """points: (N,3+) array of x,y,z[...]; snr: optional per-point SNR values"""
+        n = points.shape[0]
+        snr_sum = float(np.sum(snr)) if snr is not None and len(snr) else 0.0
+        if n == 0:
+            return cls(0, None, None, None, snr_sum)
+        xyz = points[:, :3]
+        return cls(n, xyz.min(axis=0), xyz.max(axis=0), xyz.mean(axis=0), snr_sum)
+
+class StreamState:
+    def __init__(self):
+        self.stats: FrameStats = None  # stats of the frame the model last ran on
+        self.last_run_at: float = None
+        self.frames_since_run = 0
+        self.confidence = 0.0
+
+class AdaptiveRateController:
+    """
+    Decides per sensor stream whether a frame runs the model or reuses the last result.
+
+    - a frame that differs from the last processed one (point count, bounding box,
+      centroid, SNR sum) always runs;
+    - an unchanged frame reuses the last result when that prediction was confident;
+    - an unchanged frame after a low-confidence prediction runs at a reduced rate
+      (every `reduced_rate` frames);
+    - no result is ever reused for more than `max_staleness_s` seconds or
+      `max_skip_frames` frames.
+    """
+
+    def __init__(self,
+                 max_staleness_s: float = 1.0,
+                 max_skip_frames: int = 20,
+                 confidence_threshold: float = 0.9,
+                 reduced_rate: int = 4,
+                 count_tolerance: int = 0,
+                 bbox_tolerance: float = 0.05,
+                 centroid_tolerance: float = 0.05,
+                 snr_tolerance: float = 0.1,
+                 max_sensors: int = 1024):
+        self.max_staleness_s = max_staleness_s
+        self.max_skip_frames = max_skip_frames
+        self.confidence_threshold = confidence_threshold
+        self.reduced_rate = max(1, reduced_rate)
+        self.count_tolerance = count_tolerance
+        self.bbox_tolerance = bbox_tolerance  # metres
+        self.centroid_tolerance = centroid_tolerance  # metres
+        self.snr_tolerance = snr_tolerance    # relative change of the SNR sum
+        self.max_sensors = max_sensors
+        self._streams: "OrderedDict[tuple, StreamState]" = OrderedDict()
+        self.runs = 0
+        self.reuses = 0
+        self.reasons = {}
+
+    def _changed(self, old: FrameStats, new: FrameStats) -> bool:
+        if abs(new.point_count - old.point_count) > self.count_tolerance:
+            return True
+        if (new.bbox_min is None) != (old.bbox_min is None):
+            return True
+        if new.bbox_min is not None:
+            if float(np.abs(new.bbox_min - old.bbox_min).max()) > self.bbox_tolerance:
+                return True
+            if float(np.abs(new.bbox_max - old.bbox_max).max()) > self.bbox_tolerance:
+                return True
+            # Same extent but the points moved inside it (e.g. someone walking across the room)
+            if float(np.abs(new.centroid - old.centroid).max()) > self.centroid_tolerance:
+                return True
+        scale = max(abs(old.snr_sum), 1e-6)
+        return abs(new.snr_sum - old.snr_sum) / scale > self.snr_tolerance
+
+    def decide(self, key: tuple, stats: FrameStats, now: float = None, has_result: bool = True) -> tuple:
+        """
+        Return (RUN or REUSE, reason) for the next frame of stream key. has_result is
+        False when the caller no longer holds a result to reuse, which forces a run.
+        """
+        now = time.monotonic() if now is None else now
+        state = self._streams.get(key)
+        if state is None or state.stats is None or not has_result:
+            decision, reason = RUN, "cold"
+        elif now - state.last_run_at >= self.max_staleness_s or state.frames_since_run >= self.max_skip_frames:
+            decision, reason = RUN, "stale"
+        elif self._changed(state.stats, stats):
+            decision, reason = RUN, "changed"
+        elif state.confidence >= self.confidence_threshold:
+            decision, reason = REUSE, "confident"
+        elif state.frames_since_run + 1 >= self.reduced_rate:
+            decision, reason = RUN, "reduced_rate"
+        else:
+            decision, reason = REUSE, "reduced_rate"
+
+        self.reasons[reason, decision] = self.reasons.get((reason, decision), 0) + 1
+        if decision == REUSE:
+            self.reuses += 1
+            state.frames_since_run += 1
+            self._streams.move_to_end(key)
+        return decision, reason
+
+    def record_run(self, key: tuple, stats: FrameStats, confidence: float, now: float = None):
+        """Remember the frame the model just ran on and how confident the prediction was."""
+        state = self._streams.get(key)
+        if state is None:
+            state = StreamState()
+            self._streams[key] = state
+            while len(self._streams) > self.max_sensors:
+                self._streams.popitem(last=False)
+        else:
+            self._streams.move_to_end(key)
+        state.stats = stats
+        state.last_run_at = time.monotonic() if now is None else now
+        state.frames_since_run = 0
+        state.confidence = confidence
+        self.runs += 1
+
+    @property
+    def skip_ratio(self) -> float:
+        total = self.runs + self.reuses
+        return self.reuses / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "reuses": self.reuses,
+            "skip_ratio": self.skip_ratio,
+            "streams": len(self._streams),
+            "decisions": {f"{decision}:{reason}": count for (reason, decision), count in self.reasons.items()}
+        }
@@ -0,0 +1,107 @@
+# model/sampling.py
+import os
+import threading
+import numpy as np
+
+# Point-selection strategies used to reduce a frame to a fixed number of points.
+#   random: uniform sample without replacement (per-thread Generator)
+#   snr:    deterministic, the K points with the highest SNR
+#   fps:    deterministic farthest-point sampling over x,y,z
+SAMPLING_STRATEGIES = ("random", "snr", "fps")
+DEFAULT_SAMPLING = "random"
+
+# Above this many points FPS computes distances per step instead of a full N x N matrix
+_FPS_MATRIX_MAX_POINTS = 512
+
+_local = threading.local()
+
+def get_rng() -> np.random.Generator:
+    """
+    Return a Generator private to the current thread and process.
+    Executor threads and forked DataLoader workers each get their own, freshly seeded,
+    so they never share (or duplicate) random state.
+    """
+    rng = getattr(_local, "rng", None)
+    if rng is None or _local.pid != os.getpid():
+        rng = np.random.default_rng()
+        _local.rng = rng
+        _local.pid = os.getpid()
+    return rng
+
+def random_indices(n: int, k: int, rng: np.random.Generator = None) -> np.ndarray:
+    """k distinct indices in [0, n) chosen uniformly at random."""
+    return (rng or get_rng()).choice(n, k, replace=False, shuffle=False)
+
+def random_index_sets(n: int, k: int, draws: int, rng: np.random.Generator = None) -> np.ndarray:
+    """draws independent sets of k distinct indices in [0, n), as a (draws, k) array."""
+    keys = (rng or get_rng()).random((draws, n), dtype=np.float32)
+    return np.argpartition(keys, k - 1, axis=1)[:, :k]
+
+def top_snr_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, in ascending index order."""
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return np.sort(idx)
+
+def farthest_point_indices(xyz: np.ndarray, k: int) -> np.ndarray:
+    """
+    Deterministic farthest-point sampling.
+    Starts from the point farthest from the centroid, then repeatedly adds the point
+    farthest from everything selected so far.
+    """
+    n = xyz.shape[0]
+    if n <= k:
+        # Every point is selected; the order does not matter to the max-pooling model
+        return np.arange(k) % n
+    xyz = xyz.astype(np.float32, copy=False)
+    idx = np.empty(k, dtype=np.int64)
+    idx[0] = np.argmax(((xyz - xyz.mean(axis=0)) ** 2).sum(axis=1))
+
+    if n <= _FPS_MATRIX_MAX_POINTS:
+        # Small frames: all pairwise squared distances from one matrix product
+        sq = (xyz * xyz).sum(axis=1)
+        pairwise = sq[:, None] + sq[None, :] - 2.0 * (xyz @ xyz.T)
+        rows = pairwise.__getitem__
+    else:
+        x, y, z = np.ascontiguousarray(xyz[:, :3].T)
+
+        def rows(i):
+            dx, dy, dz = x - x[i], y - y[i], z - z[i]
+            return dx * dx + dy * dy + dz * dz
+
+    dist = np.full(n, np.inf, dtype=np.float32)
+    for i in range(1, k):
+        last = idx[i - 1]
+        np.minimum(dist, rows(last), out=dist)
+        # Selected points must never win again, even when the frame has duplicate points
+        dist[last] = -1.0
+        idx[i] = np.argmax(dist)
+    return idx
+
+def select_indices(points: np.ndarray,
+                   k: int,
+                   strategy: str = DEFAULT_SAMPLING,
+                   scores: np.ndarray = None,
+                   rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Choose k of the N >= k rows of points (N x D, columns x,y,z[,snr,noise]).
+    scores: per-point SNR for the 'snr' strategy; defaults to column 3 when present.
+            Without SNR the 'snr' strategy falls back to 'fps' so it stays deterministic.
+    """
+    n = points.shape[0]
+    if strategy == "random":
+        return random_indices(n, k, rng)
+    if strategy == "snr":
+        if scores is None and points.shape[1] > 3:
+            scores = points[:, 3]
+        if scores is not None:
+            return top_snr_indices(np.asarray(scores), k)
+        return farthest_point_indices(points[:, :3], k)
+    if strategy == "fps":
+        return farthest_point_indices(points[:, :3], k)
+    raise ValueError(f"Unknown sampling strategy '{strategy}', expected one of {SAMPLING_STRATEGIES}")
+
+def pad_indices(n: int, k: int, strategy: str = DEFAULT_SAMPLING, rng: np.random.Generator = None) -> np.ndarray:
+    """k indices in [0, n) used to pad a frame by repeating points (random or cyclic)."""
+    if strategy == "random":
+        return (rng or get_rng()).integers(0, n, size=k)
+    return np.arange(k) % n
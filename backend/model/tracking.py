@@ -0,0 +1,76 @@
+# model/tracking.py
+import time
+from collections import OrderedDict
+import numpy as np
+
+class SensorState:
+    """What the tracker remembers about one (sensor, model) stream."""
+
+    def __init__(self):
+        self.probabilities: np.ndarray = None  # EMA over class probabilities
+        self.last_result: dict = None
+        self.updated_at: float = None
+        self.frames = 0
+
+class OccupancyTracker:
+    """
+    Per-sensor temporal smoothing of occupancy predictions.
+
+    Keeps an exponential moving average of the class probabilities for each
+    (sensor_id, model_name) pair, in the same spirit as FallDetector.update_ema, in a
+    bounded LRU table so an unbounded number of sensor ids cannot grow memory.
+    Whether a frame needs the model at all is decided by model.rate_control.
+    """
+
+    def __init__(self, alpha: float = 0.6, max_sensors: int = 1024):
+        self.alpha = alpha  # Higher alpha means more weight on recent frames
+        self.max_sensors = max_sensors
+        self._states: "OrderedDict[tuple, SensorState]" = OrderedDict()
+
+    def _state(self, key: tuple, create: bool = False) -> SensorState:
+        state = self._states.get(key)
+        if state is not None:
+            self._states.move_to_end(key)
+        elif create:
+            state = SensorState()
+            self._states[key] = state
+            while len(self._states) > self.max_sensors:
+                self._states.popitem(last=False)  # evict least recently seen sensor
+        return state
+
+    def last_result(self, sensor_id: str, model_name: str) -> dict:
+        state = self._state((sensor_id, model_name))
+        return state.last_result if state is not None else None
+
+    def update(self, sensor_id: str, model_name: str, result: dict) -> dict:
+        """
+        Fold a new prediction into the stream's EMA.
+        Returns result extended with 'smoothed': {'predicted_count', 'probabilities'}.
+        """
+        state = self._state((sensor_id, model_name), create=True)
+        probs = np.asarray(result["probabilities"], dtype=np.float64)
+        if state.probabilities is None or state.probabilities.shape != probs.shape:
+            state.probabilities = probs
+        else:
+            state.probabilities = self.alpha * probs + (1 - self.alpha) * state.probabilities
+
+        result = dict(result)
+        result["smoothed"] = {
+            "predicted_count": int(state.probabilities.argmax()),
+            "probabilities": state.probabilities.tolist()
+        }
+        state.last_result = result
+        state.updated_at = time.time()
+        state.frames += 1
+        return result
+
+    def reset(self, sensor_id: str = None):
+        """Forget one sensor (all its models) or, with no sensor_id, every sensor."""
+        if sensor_id is None:
+            self._states.clear()
+            return
+        for key in [k for k in self._states if k[0] == sensor_id]:
+            del self._states[key]
+
+    def __len__(self):
+        return len(self._states)
@@ -0,0 +1,149 @@
+import threading
+import time
+import numpy as np
+from database import model_db
+from model.sampling import DEFAULT_SAMPLING
+from model.tracking import OccupancyTracker
+from model.rate_control import AdaptiveRateController, FrameStats, REUSE
+import metrics
+
+
+class ModelNotFoundError(LookupError):
+    """The requested occupancy model is not in the model database."""
+
+
+class OccupancyPipeline:
+    """
+    Occupancy inference for one frame: model lookup, the adaptive rate controller that
+    may reuse the sensor's last result, the model itself and per-sensor smoothing.
+    Safe to call from several threads; only the tracker and rate-control bookkeeping
+    is serialized, model forwards run concurrently.
+    """
+
+    def __init__(self, ema_alpha: float = 0.6, max_sensors: int = 1024, max_staleness_s: float = 1.0,
+                 max_skip_frames: int = 20, confidence_threshold: float = 0.9, reduced_rate: int = 4):
+        # Smoothed per-sensor occupancy state (bounded LRU table)
+        self.tracker = OccupancyTracker(alpha=ema_alpha, max_sensors=max_sensors)
+        # Decides per sensor whether a frame runs the model or reuses the last result
+        self.rate_controller = AdaptiveRateController(
+            max_staleness_s=max_staleness_s,
+            max_skip_frames=max_skip_frames,
+            confidence_threshold=confidence_threshold,
+            reduced_rate=reduced_rate,
+            max_sensors=max_sensors
+        )
+        self._lock = threading.Lock()
+
+    def process(self, sensor_id: str, model_name: str, sensor_data: list, snr: list, noise: list) -> dict:
+        """Occupancy result for one frame; raises ModelNotFoundError for unknown models."""
+        # torch is imported on first use so importing the pipeline stays cheap
+        from model.inference import predict
+
+        # Get model info from database to get num_classes
+        start = time.perf_counter()
+        model_info = model_db.get_model(model_name)
+        metrics.DB_LOOKUP_SECONDS.observe_since(start)
+        if not model_info:
+            metrics.FRAMES_DROPPED.inc(sensor_id, model_name)
+            raise ModelNotFoundError(f"Model '{model_name}' not found in database")
+
+        # Select points the same way the model saw them during training
+        metadata = model_info.get('metadata') or {}
+        sampling = metadata.get('sampling', DEFAULT_SAMPLING)
+        tta_draws = metadata.get('tta_draws', 1)
+
+        # Unchanged frames (e.g. an empty room) reuse the last result instead of running the model
+        stream = (sensor_id, model_name)
+        stats = FrameStats.from_points(np.asarray(sensor_data, dtype=np.float32).reshape(-1, 3), snr)
+        with self._lock:
+            last_result = self.tracker.last_result(*stream)
+            decision, reason = self.rate_controller.decide(stream, stats, has_result=last_result is not None)
+        if decision == REUSE:
+            result = dict(last_result, skipped=True, reason=reason)
+            metrics.FRAMES_SKIPPED.inc(*stream)
+        else:
+            result = predict(sensor_data, model_name, model_info['num_classes'], snr, noise, sampling, tta_draws)
+            with self._lock:
+                result = self.tracker.update(sensor_id, model_name, result)
+                self.rate_controller.record_run(stream, stats, max(result["probabilities"]))
+            result = dict(result, skipped=False, reason=reason)
+        metrics.FRAMES_PROCESSED.inc(*stream)
+        return result
+
+    def process_batch(self, frames: list) -> list:
+        """
+        Occupancy results for many frames, given as (sensor_id, model_name, points) with
+        points the (M,5) x,y,z,snr,noise array, in order. The frames that need a model run
+        share one batched forward per model. A sensor's later frames in the batch see the
+        results of its earlier ones, as if the frames had been sent one at a time, so the
+        n-th frames of all streams are processed together before the (n+1)-th.
+        A frame for an unknown model gets a ModelNotFoundError in place of its result, a
+        frame without points a ValueError.
+        """
+        models = {}
+        for _, model_name, _ in frames:
+            if model_name not in models:
+                start = time.perf_counter()
+                models[model_name] = model_db.get_model(model_name)
+                metrics.DB_LOOKUP_SECONDS.observe_since(start)
+
+        results = [None] * len(frames)
+        rounds, seen = [], {}
+        for i, (sensor_id, model_name, points) in enumerate(frames):
+            if len(points) == 0:
+                metrics.FRAMES_DROPPED.inc(sensor_id, model_name)
+                results[i] = ValueError("Frame has no points")
+                continue
+            if not models[model_name]:
+                metrics.FRAMES_DROPPED.inc(sensor_id, model_name)
+                results[i] = ModelNotFoundError(f"Model '{model_name}' not found in database")
+                continue
+            n = seen.get((sensor_id, model_name), 0)
+            seen[(sensor_id, model_name)] = n + 1
+            if n == len(rounds):
+                rounds.append([])
+            rounds[n].append(i)
+
+        for indices in rounds:
+            self._process_round(frames, indices, models, results)
+        return results
+
+    def _process_round(self, frames: list, indices: list, models: dict, results: list):
+        """Process frames of distinct streams: rate control, then one forward per model."""
+        from model.inference import predict_batch
+
+        stats = {i: FrameStats.from_points(frames[i][2], frames[i][2][:, 3]) for i in indices}
+        runs = {}
+        with self._lock:
+            for i in indices:
+                sensor_id, model_name, _ = frames[i]
+                last_result = self.tracker.last_result(sensor_id, model_name)
+                decision, reason = self.rate_controller.decide((sensor_id, model_name), stats[i],
+                                                               has_result=last_result is not None)
+                if decision == REUSE:
+                    results[i] = dict(last_result, skipped=True, reason=reason)
+                    metrics.FRAMES_SKIPPED.inc(sensor_id, model_name)
+                else:
+                    results[i] = reason
+                    runs.setdefault(model_name, []).append(i)
+
+        for model_name, run in runs.items():
+            model_info = models[model_name]
+            metadata = model_info.get('metadata') or {}
+            predictions = predict_batch([frames[i][2] for i in run], model_name, model_info['num_classes'],
+                                        metadata.get('sampling', DEFAULT_SAMPLING), metadata.get('tta_draws', 1))
+            with self._lock:
+                for i, prediction in zip(run, predictions):
+                    sensor_id = frames[i][0]
+                    result = self.tracker.update(sensor_id, model_name, prediction)
+                    self.rate_controller.record_run((sensor_id, model_name), stats[i], max(result["probabilities"]))
+                    results[i] = dict(result, skipped=False, reason=results[i])
+
+        for i in indices:
+            metrics.FRAMES_PROCESSED.inc(frames[i][0], frames[i][1])
+
+    def stats(self) -> dict:
+        return {
+            "rate_control": self.rate_controller.stats(),
+            "tracked_streams": len(self.tracker)
+        }
@@ -0,0 +1,141 @@
+"""
+Pre-fork launcher for multi-worker deployments. `uvicorn --workers N` starts N fresh
+interpreters that each torch.load every model, so weights (and the imported libraries'
+heap) are paid N times. This launcher imports the app and loads its models once in the
+parent, moves every model's parameters into shared memory and then forks the workers,
+which serve from those same pages. Workers share one listening socket; a worker that
+dies is re-forked from the parent, again without reloading anything.
+
+    python prefork.py --app main:app --workers 4 --port 8000
+    SERVER_CONFIG=site.json python prefork.py --app server:app --workers 4
+
+The app module must provide load_models() (main.py and server.py do); its startup
+warm-up then finds the models already loaded in each worker. Weights that are
+hot-reloaded after the fork are loaded by every worker separately, as before.
+"""
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+
+import torch
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+def share_models(model_registry) -> int:
+    """Move the parameters and buffers of every loaded model into shared memory."""
+    shared = 0
+    for name in model_registry.loaded_names():
+        model = model_registry.get(name).model
+        if isinstance(model, torch.nn.Module):
+            model.share_memory()
+            shared += sum(t.numel() * t.element_size() for t in (*model.parameters(), *model.buffers()))
+    return shared
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app, sock: socket.socket, args):
+    """Body of a forked worker: serve app on the inherited socket until told to stop."""
+    import uvicorn
+
+    # Restore default signal handling; uvicorn installs its own graceful handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    torch.set_num_threads(args.threads_per_worker)
+    config = uvicorn.Config(app, log_level=args.log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def fork_worker(app, sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, args)
+        except BaseException as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+def main():
+    parser = argparse.ArgumentParser(description="Load models once, then fork uvicorn workers that share them")
+    parser.add_argument("--app", default="main:app", help="module:attribute of the ASGI app")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads-per-worker", type=int,
+                        help="torch intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--no-share", action="store_true",
+                        help="fork without moving weights to shared memory (for comparison)")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+    if args.threads_per_worker is None:
+        args.threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+
+    module_name, attribute = args.app.split(":")
+    module = importlib.import_module(module_name)
+    app = getattr(module, attribute)
+
+    # One thread while loading: a forked child cannot reuse the parent's OpenMP pool
+    torch.set_num_threads(1)
+    start = time.perf_counter()
+    from model.inference import model_registry
+    errors = module.load_models()
+    for name, error in errors.items():
+        print(f"Could not preload '{name}': {error}")
+    shared = 0 if args.no_share else share_models(model_registry)
+    print(f"Loaded {len(model_registry.loaded_names())} model(s) in {time.perf_counter() - start:.1f}s "
+          f"({shared / 1024 / 1024:.1f}MB of weights in shared memory)")
+
+    sock = bind_socket(args.host, args.port)
+    # Keep the collector from touching (and so copying) the parent's objects in every worker
+    gc.freeze()
+
+    workers = set()
+    for _ in range(args.workers):
+        workers.add(fork_worker(app, sock, args))
+    print(f"Started {args.workers} worker(s) on {args.host}:{args.port}: {sorted(workers)}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            time.sleep(1)  # Don't spin if workers die on startup
+            workers.add(fork_worker(app, sock, args))
+    sock.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import nullcontext
+from typing import List, Optional
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from utils import get_profiles_dir
+
+PROFILE_MODES = ("cprofile", "torch")
+
+# Returned by Profiler.section() while no session is active, so the hot path allocates nothing
+_NULL_SECTION = nullcontext()
+
+
+class ProfileSession:
+    """
+    Profiles the next max_calls calls of the instrumented sections, or every call for
+    max_seconds, whichever ends first. Only one call is profiled at a time; calls that
+    overlap with a profiled call run unprofiled.
+    """
+
+    def __init__(self, mode: str, max_calls: Optional[int], max_seconds: Optional[float],
+                 sections: Optional[List[str]], output_dir: str):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        self.mode = mode
+        self.max_calls = max_calls
+        self.max_seconds = max_seconds
+        self.sections = set(sections) if sections else None
+        self.output_dir = output_dir
+        self.id = time.strftime("%Y%m%d_%H%M%S") + f"_{mode}"
+        self.started_at = time.time()
+        self.calls = 0
+        self.done = False
+        self.result: Optional[dict] = None
+        self.traces: List[str] = []
+        self._busy = threading.Lock()
+        self._finish_lock = threading.Lock()
+        self._last_table = None
+        self._profile = cProfile.Profile() if mode == "cprofile" else None
+
+    def expired(self) -> bool:
+        if self.max_calls is not None and self.calls >= self.max_calls:
+            return True
+        return self.max_seconds is not None and time.time() - self.started_at >= self.max_seconds
+
+    def enter(self, name: str):
+        """Start profiling one call of section name; returns a token, or None to skip."""
+        if self.done or (self.sections is not None and name not in self.sections):
+            return None
+        if self.expired():
+            self.finish()
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        if self.done:
+            self._busy.release()
+            return None
+        if self.mode == "cprofile":
+            self._profile.enable()
+            return self._profile
+
+        import torch
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        prof = torch.profiler.profile(activities=activities, record_shapes=True)
+        prof.__enter__()
+        return prof
+
+    def exit(self, name: str, token):
+        try:
+            if self.mode == "cprofile":
+                token.disable()
+            else:
+                token.__exit__(None, None, None)
+                path = os.path.join(self.output_dir, f"{self.id}_{name}_{self.calls}.json")
+                token.export_chrome_trace(path)
+                self.traces.append(path)
+                self._last_table = token.key_averages().table(sort_by="self_cpu_time_total", row_limit=25)
+            self.calls += 1
+        finally:
+            self._busy.release()
+        if self.expired():
+            self.finish()
+
+    def finish(self) -> dict:
+        """End the session, write the trace and build the result (idempotent)."""
+        with self._finish_lock:
+            if self.done:
+                return self.result
+            self.done = True
+            # Wait for a call that is still being profiled
+            with self._busy:
+                pass
+
+            result = {
+                "id": self.id,
+                "mode": self.mode,
+                "calls": self.calls,
+                "duration_s": time.time() - self.started_at
+            }
+            if self.mode == "cprofile":
+                path = os.path.join(self.output_dir, f"{self.id}.prof")
+                self._profile.dump_stats(path)
+                stream = io.StringIO()
+                pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(30)
+                result["trace_file"] = path
+                result["summary"] = stream.getvalue()
+            else:
+                result["trace_files"] = self.traces
+                result["summary"] = self._last_table
+            self.result = result
+            return result
+
+    def status(self) -> dict:
+        if not self.done and self.expired():
+            self.finish()
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "done": self.done,
+            "calls": self.calls,
+            "max_calls": self.max_calls,
+            "max_seconds": self.max_seconds,
+            "sections": sorted(self.sections) if self.sections else None,
+            "result": self.result
+        }
+
+
+class _Section:
+    __slots__ = ("session", "name", "token")
+
+    def __init__(self, session: ProfileSession, name: str):
+        self.session = session
+        self.name = name
+        self.token = None
+
+    def __enter__(self):
+        self.token = self.session.enter(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.token is not None:
+            self.session.exit(self.name, self.token)
+        return False
+
+
+class Profiler:
+    """Process-wide switch for profiling instrumented sections at runtime."""
+
+    def __init__(self):
+        self._session: Optional[ProfileSession] = None
+
+    def section(self, name: str):
+        """Context manager around a hot section; a no-op unless a session is running."""
+        session = self._session
+        if session is None or session.done:
+            return _NULL_SECTION
+        return _Section(session, name)
+
+    def start(self, mode: str = "cprofile", max_calls: int = None, max_seconds: float = None,
+              sections: List[str] = None) -> ProfileSession:
+        if self._session is not None and not self._session.done:
+            raise RuntimeError(f"Profile session '{self._session.id}' is already running")
+        output_dir = get_profiles_dir()
+        os.makedirs(output_dir, exist_ok=True)
+        self._session = ProfileSession(mode, max_calls, max_seconds, sections, output_dir)
+        return self._session
+
+    def stop(self) -> Optional[dict]:
+        if self._session is None:
+            return None
+        return self._session.finish()
+
+    def status(self) -> Optional[dict]:
+        return self._session.status() if self._session is not None else None
+
+
+profiler = Profiler()
+
+
+class ProfilePayload(BaseModel):
+    mode: str = "cprofile"           # cprofile or torch
+    requests: Optional[int] = None   # profile the next N calls...
+    seconds: Optional[float] = None  # ...and/or every call for S seconds
+    sections: Optional[List[str]] = None  # e.g. ["predict"], default: all sections
+    wait: bool = False               # block until the session ends and return its result
+
+
+# Admin endpoints, included by each FastAPI app
+router = APIRouter(prefix="/admin")
+
+
+@router.post("/profile")
+async def start_profile(payload: ProfilePayload):
+    """Profile the instrumented hot sections for the next N requests or S seconds."""
+    max_calls = payload.requests
+    if max_calls is None and payload.seconds is None:
+        max_calls = 50
+    try:
+        session = profiler.start(payload.mode, max_calls, payload.seconds, payload.sections)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+    except RuntimeError as e:
+        return JSONResponse(status_code=409, content={"status": "error", "message": str(e)})
+
+    if payload.wait:
+        # Without a time limit, give up waiting after a minute; the session keeps running
+        deadline = time.time() + (payload.seconds or 60.0)
+        while not session.done and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        if payload.seconds is not None:
+            session.finish()
+
+    return JSONResponse(content={"status": "success", "profile": session.status()})
+
+
+@router.get("/profile")
+async def profile_status():
+    """Return the current or last profile session, including its result when done."""
+    status = profiler.status()
+    if status is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "No profile session"})
+    return JSONResponse(content={"status": "success", "profile": status})
+
+
+@router.delete("/profile")
+async def stop_profile():
+    """End the running session now and return its result."""
+    result = profiler.stop()
+    if result is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "No profile session"})
+    return JSONResponse(content={"status": "success", "profile": profiler.status()})
@@ -0,0 +1,381 @@
+"""
+Append-only recording of live frames, for building training data without separate
+logging and log_parser.py re-parsing.
+
+Frames are handed to a background writer thread (record() only enqueues) and stored
+per sensor in chunks of columnar files:
+
+    <root>/<sensor>/chunk-000012/
+        timestamps.i8   int64  (F,)     receive time, ms since the epoch
+        counts.i4       int32  (F,)     points per frame
+        occupancy.i2    int16  (F,)     predicted count, -1 if occupancy did not run
+        fall.f4         float32 (F,)    smoothed fall probability, NaN if none
+        points.i2       int16  (P, 5)   x, y, z, snr, noise quantized by POINT_SCALES
+        meta.json       written when the chunk is closed
+
+Columns are appended in batches with one fsync per column per fsync_interval_s. A chunk
+is closed (meta.json written, directory renamed from chunk-N.open to chunk-N) after
+chunk_frames frames or chunk_seconds; closed chunks never change and are read with
+np.memmap through RecordedChunk. An .open chunk left by a crash is closed at startup,
+keeping every complete frame.
+
+Several workers may record under one root: a chunk is created as chunk-N.new (mkdir is
+exclusive, so two writers never share a number) and only renamed to chunk-N.open once
+its writer holds an flock on the chunk's .lock file. Startup recovery skips .open chunks
+whose lock is still held, i.e. those of a live writer.
+"""
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import quote, unquote
+import numpy as np
+import metrics
+
+# Quantization step per point column: 1mm for x/y/z, 0.01 for SNR and noise
+POINT_COLUMNS = ("x_pos", "y_pos", "z_pos", "snr", "noise")
+POINT_SCALES = np.array([0.001, 0.001, 0.001, 0.01, 0.01], dtype=np.float32)
+
+# Per-frame column files -> dtype; frame i's points start at the sum of counts before it
+FRAME_FILES = {
+    "timestamps.i8": np.int64,
+    "counts.i4": np.int32,
+    "occupancy.i2": np.int16,
+    "fall.f4": np.float32,
+}
+POINTS_FILE = "points.i2"
+OPEN_SUFFIX = ".open"
+NEW_SUFFIX = ".new"
+LOCK_FILE = ".lock"
+
+FRAMES_RECORDED = metrics.registry.counter(
+    "radar_frames_recorded_total", "Frames written to the recording store", ("sensor",))
+RECORDER_DROPPED = metrics.registry.counter(
+    "radar_recorder_dropped_total", "Frames not recorded because the writer queue was full")
+RECORDER_QUEUE = metrics.registry.gauge(
+    "radar_recorder_queue_depth", "Frames waiting for the recording writer")
+
+
+def quantize_points(frame: dict) -> np.ndarray:
+    """(N, 5) int16 points of a frame; missing SNR/noise values are stored as 0."""
+    n = min(len(frame["x_pos"]), len(frame["y_pos"]), len(frame["z_pos"]))
+    points = np.zeros((n, len(POINT_COLUMNS)), dtype=np.float32)
+    for i, column in enumerate(POINT_COLUMNS):
+        values = frame.get(column) or []
+        if len(values) >= n:
+            points[:, i] = values[:n]
+    quantized = np.rint(points / POINT_SCALES)
+    return np.clip(quantized, np.iinfo(np.int16).min, np.iinfo(np.int16).max).astype(np.int16)
+
+
+def _try_lock(path: str) -> Optional[int]:
+    """fd holding the exclusive lock of the chunk at path, or None if another writer has it."""
+    fd = os.open(os.path.join(path, LOCK_FILE), os.O_CREAT | os.O_RDWR, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class OpenChunk:
+    """A chunk being appended to by the writer thread."""
+
+    def __init__(self, path: str, sensor_id: str, lock_fd: int):
+        self.path = path
+        self.sensor_id = sensor_id
+        self.lock_fd = lock_fd
+        self.created = time.monotonic()
+        self.frames = 0
+        self.points = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._pending: Dict[str, List[np.ndarray]] = {name: [] for name in (*FRAME_FILES, POINTS_FILE)}
+        self._files = {name: open(os.path.join(path, name), "ab") for name in self._pending}
+
+    def append(self, timestamp_ms: int, points: np.ndarray, occupancy: int, fall: float):
+        self._pending["timestamps.i8"].append(np.array([timestamp_ms], dtype=np.int64))
+        self._pending["counts.i4"].append(np.array([len(points)], dtype=np.int32))
+        self._pending["occupancy.i2"].append(np.array([occupancy], dtype=np.int16))
+        self._pending["fall.f4"].append(np.array([fall], dtype=np.float32))
+        self._pending[POINTS_FILE].append(points)
+        self.frames += 1
+        self.points += len(points)
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp_ms
+        self.last_timestamp = timestamp_ms
+
+    def flush(self, fsync: bool):
+        """Write pending rows, points first so a frame is never counted before its points."""
+        for name in (POINTS_FILE, *FRAME_FILES):
+            if self._pending[name]:
+                self._files[name].write(np.concatenate(self._pending[name]).tobytes())
+                self._pending[name] = []
+            self._files[name].flush()
+            if fsync:
+                os.fsync(self._files[name].fileno())
+
+    def close(self) -> str:
+        """Flush, write meta.json and rename to the closed name; returns the closed path."""
+        try:
+            self.flush(fsync=True)
+            for f in self._files.values():
+                f.close()
+            return _finish_chunk(self.path, self.sensor_id, self.frames, self.points,
+                                 self.first_timestamp, self.last_timestamp)
+        finally:
+            os.close(self.lock_fd)
+
+
+def _finish_chunk(path, sensor_id, frames, points, first_timestamp, last_timestamp) -> str:
+    meta = {
+        "sensor_id": sensor_id,
+        "frames": frames,
+        "points": points,
+        "first_timestamp_ms": first_timestamp,
+        "last_timestamp_ms": last_timestamp,
+        "point_columns": list(POINT_COLUMNS),
+        "point_scales": POINT_SCALES.tolist()
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    closed = path[:-len(OPEN_SUFFIX)]
+    os.replace(path, closed)
+    # Only removed once renamed: recovery must never find an .open chunk with a fresh lock file
+    if os.path.exists(os.path.join(closed, LOCK_FILE)):
+        os.remove(os.path.join(closed, LOCK_FILE))
+    return closed
+
+
+def recover_chunk(path: str) -> Optional[str]:
+    """
+    Close an .open chunk left behind by a crash, keeping its complete frames. The caller
+    holds the chunk's lock (see _try_lock).
+    """
+    sensor_id = unquote(os.path.basename(os.path.dirname(path)))
+    columns = {}
+    for name, dtype in FRAME_FILES.items():
+        file_path = os.path.join(path, name)
+        data = b""
+        if os.path.exists(file_path):
+            with open(file_path, "rb") as f:
+                data = f.read()
+        itemsize = np.dtype(dtype).itemsize
+        columns[name] = np.frombuffer(data[:len(data) // itemsize * itemsize], dtype=dtype)  # drop a torn row
+    points_path = os.path.join(path, POINTS_FILE)
+    total_points = os.path.getsize(points_path) // (2 * len(POINT_COLUMNS)) if os.path.exists(points_path) else 0
+
+    # Complete frames: present in every per-frame column and with all their points written
+    frames = min(len(column) for column in columns.values())
+    ends = np.cumsum(columns["counts.i4"][:frames].astype(np.int64))
+    frames = int(np.searchsorted(ends, total_points, side="right"))
+    points = int(ends[frames - 1]) if frames else 0
+    if frames == 0:
+        for name in (*FRAME_FILES, POINTS_FILE, LOCK_FILE):
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        os.rmdir(path)
+        return None
+
+    for name, dtype in FRAME_FILES.items():
+        with open(os.path.join(path, name), "r+b") as f:
+            f.truncate(frames * np.dtype(dtype).itemsize)
+    with open(points_path, "r+b") as f:
+        f.truncate(points * 2 * len(POINT_COLUMNS))
+    timestamps = columns["timestamps.i8"][:frames]
+    return _finish_chunk(path, sensor_id, frames, points, int(timestamps[0]), int(timestamps[-1]))
+
+
+class FrameRecorder:
+    """
+    Records frames with their predictions to an append-only chunked store. record() is
+    safe to call from the request path: it only enqueues, and drops the frame (counted
+    in radar_recorder_dropped_total) if the writer has fallen max_queue frames behind.
+    """
+
+    def __init__(self, root: str, chunk_frames: int = 4096, chunk_seconds: float = 600.0,
+                 fsync_interval_s: float = 1.0, max_queue: int = 10000):
+        self.root = root
+        self.chunk_frames = chunk_frames
+        self.chunk_seconds = chunk_seconds
+        self.fsync_interval_s = fsync_interval_s
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._chunks: Dict[str, OpenChunk] = {}
+        self._stop = threading.Event()
+        self._thread = None
+        RECORDER_QUEUE.set_function(self._queue.qsize)
+
+    def start(self):
+        """
+        Close chunks left open by a previous run and start the writer thread (idempotent).
+        Chunks another live worker is writing are left alone.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        os.makedirs(self.root, exist_ok=True)
+        for sensor_dir in os.listdir(self.root):
+            sensor_path = os.path.join(self.root, sensor_dir)
+            if not os.path.isdir(sensor_path):
+                continue
+            for name in os.listdir(sensor_path):
+                if not name.endswith(OPEN_SUFFIX):
+                    continue
+                try:
+                    lock_fd = _try_lock(os.path.join(sensor_path, name))
+                except FileNotFoundError:
+                    continue  # closed by its writer meanwhile
+                if lock_fd is None:
+                    continue
+                try:
+                    recovered = recover_chunk(os.path.join(sensor_path, name))
+                finally:
+                    os.close(lock_fd)
+                print(f"Recovered recording chunk {recovered or name + ' (empty, removed)'}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="frame-recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write everything queued, close all chunks and stop the writer thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def record(self, sensor_id: str, frame: dict, occupancy: dict = None, fall_detection: dict = None,
+               timestamp_ms: int = None):
+        """Queue a frame (x_pos, y_pos, z_pos, snr, noise) and its predictions for writing."""
+        if timestamp_ms is None:
+            timestamp_ms = int(time.time() * 1000)
+        try:
+            self._queue.put_nowait((sensor_id, frame, occupancy, fall_detection, timestamp_ms))
+        except queue.Full:
+            RECORDER_DROPPED.inc()
+
+    def _run(self):
+        last_sync = time.monotonic()
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval_s)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < 1024:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for item in batch:
+                    self._append(*item)
+                now = time.monotonic()
+                fsync = now - last_sync >= self.fsync_interval_s
+                for sensor_id, chunk in list(self._chunks.items()):
+                    if chunk.frames >= self.chunk_frames or now - chunk.created >= self.chunk_seconds:
+                        chunk.close()
+                        del self._chunks[sensor_id]
+                    else:
+                        chunk.flush(fsync)
+                if fsync:
+                    last_sync = now
+            except OSError as e:
+                print(f"Error writing recording: {e}")
+        for chunk in self._chunks.values():
+            try:
+                chunk.close()
+            except OSError as e:
+                print(f"Error closing recording chunk {chunk.path}: {e}")
+        self._chunks.clear()
+
+    def _append(self, sensor_id, frame, occupancy, fall_detection, timestamp_ms):
+        chunk = self._chunks.get(sensor_id)
+        if chunk is None:
+            path, lock_fd = self._new_chunk(sensor_id)
+            chunk = self._chunks[sensor_id] = OpenChunk(path, sensor_id, lock_fd)
+        predicted = occupancy.get("predicted_count", -1) if occupancy else -1
+        fall = fall_detection.get("fall_probability", np.nan) if fall_detection else np.nan
+        chunk.append(timestamp_ms, quantize_points(frame), predicted, fall)
+        FRAMES_RECORDED.inc(sensor_id)
+
+    def _new_chunk(self, sensor_id: str) -> tuple:
+        """Create and lock the sensor's next chunk; returns (path, lock_fd)."""
+        sensor_path = os.path.join(self.root, quote(sensor_id, safe=""))
+        os.makedirs(sensor_path, exist_ok=True)
+        while True:
+            numbers = [int(name.split("-")[1].split(".")[0]) for name in os.listdir(sensor_path)
+                       if name.startswith("chunk-")]
+            name = f"chunk-{max(numbers, default=-1) + 1:06d}"
+            try:
+                os.mkdir(os.path.join(sensor_path, name + NEW_SUFFIX))
+            except FileExistsError:
+                continue  # another worker took this number
+            break
+        lock_fd = _try_lock(os.path.join(sensor_path, name + NEW_SUFFIX))
+        path = os.path.join(sensor_path, name + OPEN_SUFFIX)
+        os.replace(os.path.join(sensor_path, name + NEW_SUFFIX), path)
+        return path, lock_fd
+
+
+class RecordedChunk:
+    """A closed chunk with its columns memory-mapped (nothing is read until used)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.sensor_id = self.meta["sensor_id"]
+        frames = self.meta["frames"]
+        self.timestamps = self._map("timestamps.i8", np.int64, (frames,))
+        self.counts = self._map("counts.i4", np.int32, (frames,))
+        self.occupancy = self._map("occupancy.i2", np.int16, (frames,))
+        self.fall_probability = self._map("fall.f4", np.float32, (frames,))
+        self.points = self._map(POINTS_FILE, np.int16, (self.meta["points"], len(POINT_COLUMNS)))
+        self.scales = np.asarray(self.meta["point_scales"], dtype=np.float32)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts, dtype=np.int64)])
+
+    def _map(self, name, dtype, shape):
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=shape)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def cloud(self, i: int) -> np.ndarray:
+        """(N, 5) float32 x, y, z, snr, noise of frame i, as RadarDataset expects."""
+        return self.points[self.offsets[i]:self.offsets[i + 1]] * self.scales
+
+    def clouds(self) -> List[np.ndarray]:
+        return [self.cloud(i) for i in range(len(self))]
+
+    def frame(self, i: int) -> dict:
+        """Frame i in the ingest payload format."""
+        cloud = self.cloud(i)
+        return {column: cloud[:, j].tolist() for j, column in enumerate(POINT_COLUMNS)}
+
+
+def iter_chunks(root: str, sensor_id: str = None) -> Iterator[RecordedChunk]:
+    """Closed chunks under root (optionally of one sensor), oldest first per sensor."""
+    if not os.path.isdir(root):
+        return
+    sensors = [quote(sensor_id, safe="")] if sensor_id is not None else sorted(os.listdir(root))
+    for sensor_dir in sensors:
+        sensor_path = os.path.join(root, sensor_dir)
+        if not os.path.isdir(sensor_path):
+            continue
+        for name in sorted(os.listdir(sensor_path)):
+            if name.startswith("chunk-") and not name.endswith((OPEN_SUFFIX, NEW_SUFFIX)):
+                yield RecordedChunk(os.path.join(sensor_path, name))
+
+
+def create_recorder(root: str = None, **kwargs) -> Optional[FrameRecorder]:
+    """A recorder writing under root (default: RECORDER_DIR); None when recording is off."""
+    root = root or os.environ.get("RECORDER_DIR")
+    if not root:
+        return None
+    return FrameRecorder(root, **kwargs)
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class ModelSpec:
+    """Where a model's weights live and how to turn them into a ready-to-serve model."""
+
+    def __init__(self, path: str, loader: Callable[[str], object], params: Dict = None):
+        self.path = path
+        self.loader = loader  # loader(path) -> loaded, warmed model
+        self.params = params or {}
+
+    def signature(self):
+        """Identify the weights on disk; a change means the model must be reloaded."""
+        stat = os.stat(self.path)
+        return (self.path, stat.st_mtime_ns, stat.st_size, tuple(sorted(self.params.items())))
+
+
+class ModelEntry:
+    """A loaded model together with the signature of the weights it came from."""
+
+    def __init__(self, name: str, model, signature, loaded_at: float):
+        self.name = name
+        self.model = model
+        self.signature = signature
+        self.loaded_at = loaded_at
+
+
+class ModelRegistry:
+    """
+    Keeps loaded models keyed by name and hot-reloads them when their weights change.
+
+    A background thread polls the registered specs (and any spec sources such as the
+    model database). When the weights behind a loaded model change, the new weights are
+    loaded and warmed on that thread and the entry is swapped in a single dict
+    assignment, so requests keep using the old model until the new one is ready.
+    """
+
+    def __init__(self, poll_interval: float = 2.0):
+        self.poll_interval = poll_interval
+        self._entries: Dict[str, ModelEntry] = {}
+        self._specs: Dict[str, ModelSpec] = {}
+        self._sources: List[Callable[[], Dict[str, ModelSpec]]] = []
+        self._listeners: Dict[str, List[Callable]] = {}
+        self._pending: Dict[str, tuple] = {}
+        self._failed: Dict[str, tuple] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, spec: ModelSpec):
+        """Register a fixed spec under a name."""
+        self._specs[name] = spec
+
+    def add_source(self, source: Callable[[], Dict[str, ModelSpec]]):
+        """Add a callable returning {name: ModelSpec}, consulted on every poll."""
+        self._sources.append(source)
+
+    def subscribe(self, name: str, callback: Callable):
+        """Call callback(model) every time a new model is swapped in under name."""
+        self._listeners.setdefault(name, []).append(callback)
+
+    def get(self, name: str) -> Optional[ModelEntry]:
+        """Return the current entry for name without loading anything."""
+        return self._entries.get(name)
+
+    def loaded_names(self) -> List[str]:
+        return list(self._entries.keys())
+
+    def resolve(self, name: str) -> Optional[ModelSpec]:
+        """Find the current spec for name, preferring sources over fixed specs."""
+        for source in self._sources:
+            try:
+                specs = source()
+            except Exception as e:
+                print(f"Error reading model source: {e}")
+                continue
+            if name in specs:
+                return specs[name]
+        return self._specs.get(name)
+
+    def load(self, name: str, spec: ModelSpec = None) -> ModelEntry:
+        """Load name synchronously (used on a cold miss) and swap it in."""
+        spec = spec or self.resolve(name)
+        if spec is None:
+            raise ValueError(f"Model '{name}' is not registered")
+        if not os.path.exists(spec.path):
+            raise FileNotFoundError(f"Model file not found: {spec.path}")
+
+        with self._load_lock(name):
+            # Another caller may have loaded the same weights while we waited
+            entry = self._entries.get(name)
+            signature = spec.signature()
+            if entry is not None and entry.signature == signature:
+                return entry
+            model = spec.loader(spec.path)
+            entry = ModelEntry(name, model, signature, time.time())
+            self._entries[name] = entry
+            self._pending.pop(name, None)
+
+        for callback in self._listeners.get(name, []):
+            try:
+                callback(model)
+            except Exception as e:
+                print(f"Error notifying listener for model '{name}': {e}")
+        return entry
+
+    def adopt(self, name: str, model) -> ModelEntry:
+        """Track a model that was loaded elsewhere from name's registered spec."""
+        spec = self.resolve(name)
+        if spec is None:
+            raise ValueError(f"Model '{name}' is not registered")
+        entry = ModelEntry(name, model, spec.signature(), time.time())
+        self._entries[name] = entry
+        return entry
+
+    def refresh(self):
+        """
+        Reload every loaded model whose weights changed.
+
+        A new signature must be seen on two consecutive polls before it is loaded, so a
+        file that is still being written is never picked up half-way.
+        """
+        specs = dict(self._specs)
+        for source in self._sources:
+            try:
+                specs.update(source())
+            except Exception as e:
+                print(f"Error reading model source: {e}")
+
+        for name, entry in list(self._entries.items()):
+            spec = specs.get(name)
+            if spec is None or not os.path.exists(spec.path):
+                continue
+            try:
+                signature = spec.signature()
+            except OSError:
+                continue
+            if signature == entry.signature or signature == self._failed.get(name):
+                self._pending.pop(name, None)
+                continue
+            if self._pending.get(name) != signature:
+                self._pending[name] = signature
+                continue
+            try:
+                self.load(name, spec)
+                print(f"Reloaded model '{name}' from {spec.path}")
+            except Exception as e:
+                # Keep serving the old weights; retry on the next change
+                print(f"Error reloading model '{name}': {e}")
+                self._pending.pop(name, None)
+                self._failed[name] = signature
+
+    def start(self):
+        """Start the background polling thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing model registry: {e}")
+
+    def _load_lock(self, name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._load_locks.setdefault(name, threading.Lock())
@@ -0,0 +1,304 @@
+"""
+Sensor-affinity router in front of several fall-detection workers (fall_detection.main
+or server.py instances). Fall detection is stateful per sensor, so every frame of a
+sensor must reach the worker that holds its 30-frame buffer: the router hashes the
+sensor id onto a consistent-hash ring of workers and forwards the frame there.
+
+Adding or removing a worker only moves the sensors whose ring segment changes owner
+(about 1/N of them). Before a moved sensor's next frame is forwarded, its session
+(frame buffer and EMA) is copied from the old worker to the new one through the
+workers' /sessions endpoints, so detection continues without refilling the buffer.
+
+    python router.py --worker http://127.0.0.1:8001 --worker http://127.0.0.1:8002 --port 8000
+    ROUTER_WORKERS=http://127.0.0.1:8001,http://127.0.0.1:8002 uvicorn router:app --port 8000
+
+Workers are managed at runtime with GET/POST/DELETE /workers ({"url": ...}). Frames are
+routed by the X-Sensor-Id header if present, else by the body's sensor_id. Only the
+HTTP frame endpoints are routed; WebSocket clients connect to a worker directly.
+"""
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from urllib.parse import quote
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import sys
+import time
+import httpx
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import metrics
+
+# Endpoints whose frames are forwarded to the sensor's worker
+ROUTED_PATHS = ("/fall", "/frame", "/inference", "/occupancy")
+
+ROUTED = metrics.registry.counter(
+    "radar_router_requests_total", "Frames forwarded to a worker", ("worker",))
+ROUTE_ERRORS = metrics.registry.counter(
+    "radar_router_errors_total", "Frames that could not be forwarded", ("worker",))
+HANDOFFS = metrics.registry.counter(
+    "radar_router_handoffs_total", "Sensor sessions moved between workers", ("result",))
+FORWARD_SECONDS = metrics.registry.histogram(
+    "radar_router_forward_seconds", "Time to forward a frame and receive the worker's response")
+
+
+class HashRing:
+    """Consistent-hash ring with replicas virtual nodes per worker."""
+
+    def __init__(self, nodes=(), replicas: int = 128):
+        self.replicas = replicas
+        self.nodes = set()
+        self._keys: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Stable across processes, unlike hash()
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            key = self._hash(f"{node}#{i}")
+            bisect.insort(self._keys, key)
+            self._owners[key] = node
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        self._keys = [key for key in self._keys if self._owners[key] != node]
+        self._owners = {key: owner for key, owner in self._owners.items() if owner != node}
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._owners[self._keys[i]]
+
+
+class SensorRouter:
+    """Routes each sensor to its ring worker and moves sessions when the ring changes."""
+
+    def __init__(self, workers=(), timeout: float = 10.0, max_sensors: int = 1024):
+        self.ring = HashRing(workers)
+        self.timeout = timeout
+        self.max_sensors = max_sensors
+        # sensor -> worker holding its session, least recently forwarded first; capped like
+        # the workers' own session tables (FallDetector max_sensors)
+        self.owners: "OrderedDict[str, str]" = OrderedDict()
+        self._locks: Dict[str, list] = {}  # sensor -> [lock, users], only while in use
+        self._membership = asyncio.Lock()
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        self.client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+    @asynccontextmanager
+    async def _locked(self, sensor_id: str):
+        # Frames of one sensor are forwarded one at a time and in order, and never
+        # while its session is being moved. The lock is dropped once nobody uses it.
+        entry = self._locks.get(sensor_id)
+        if entry is None:
+            entry = self._locks[sensor_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[sensor_id]
+
+    async def _place(self, sensor_id: str) -> Optional[dict]:
+        """
+        Make the sensor's ring worker its owner, first moving its session there if another
+        worker holds it. Call with the sensor's lock held; returns the move, if any.
+        """
+        target = self.ring.node_for(sensor_id)
+        owner = self.owners.get(sensor_id)
+        move = None
+        if target is not None and owner is not None and owner != target:
+            moved = await self._handoff(sensor_id, owner, target)
+            move = {"sensor_id": sensor_id, "from": owner, "to": target, "session_moved": moved}
+        if target is not None:
+            self.owners[sensor_id] = target
+        return move
+
+    async def forward(self, path: str, sensor_id: str, body: bytes) -> Response:
+        async with self._locked(sensor_id):
+            # The ring may have changed before the rebalance reached this sensor
+            await self._place(sensor_id)
+            worker = self.owners.get(sensor_id)
+            if worker is None:
+                return JSONResponse(
+                    status_code=503,
+                    content={"status": "error", "message": "No workers configured"}
+                )
+            self.owners.move_to_end(sensor_id)
+            while len(self.owners) > self.max_sensors:
+                self.owners.popitem(last=False)  # forget the least recently seen sensor
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(worker + path, content=body,
+                                                  headers={"content-type": "application/json"})
+            except httpx.HTTPError as e:
+                ROUTE_ERRORS.inc(worker)
+                return JSONResponse(
+                    status_code=502,
+                    content={"status": "error", "message": f"Worker {worker} unreachable: {e}"}
+                )
+            FORWARD_SECONDS.observe_since(start)
+            ROUTED.inc(worker)
+            return Response(content=response.content, status_code=response.status_code,
+                            media_type=response.headers.get("content-type"))
+
+    async def add_worker(self, url: str) -> list:
+        async with self._membership:
+            self.ring.add(url)
+            return await self._rebalance()
+
+    async def remove_worker(self, url: str) -> list:
+        """Remove url from the ring; its sessions are moved off it while it is still reachable."""
+        async with self._membership:
+            self.ring.remove(url)
+            return await self._rebalance()
+
+    async def _rebalance(self) -> list:
+        moves = []
+        for sensor_id, owner in list(self.owners.items()):
+            target = self.ring.node_for(sensor_id)
+            if target is None or target == owner:
+                continue
+            async with self._locked(sensor_id):
+                # A frame forwarded meanwhile may already have moved it
+                move = await self._place(sensor_id)
+            if move is not None:
+                moves.append(move)
+        return moves
+
+    async def _handoff(self, sensor_id: str, source: str, target: str) -> bool:
+        """Copy the sensor's session from source to target; False if it starts over on target."""
+        path = f"/sessions/{quote(sensor_id, safe='')}"
+        try:
+            response = await self.client.get(source + path)
+            if response.status_code != 200:
+                HANDOFFS.inc("no_session")
+                return False
+            response = await self.client.put(target + path, json={"session": response.json()["session"]})
+            if response.status_code != 200:
+                raise httpx.HTTPError(f"import returned {response.status_code}: {response.text}")
+            await self.client.delete(source + path)
+        except httpx.HTTPError as e:
+            print(f"Could not move session of sensor '{sensor_id}' from {source} to {target}: {e}")
+            HANDOFFS.inc("failed")
+            return False
+        HANDOFFS.inc("moved")
+        return True
+
+
+def _normalize(url: str) -> str:
+    return url.rstrip("/")
+
+router = SensorRouter(
+    (_normalize(url) for url in os.environ.get("ROUTER_WORKERS", "").split(",") if url.strip()),
+    max_sensors=int(os.environ.get("ROUTER_MAX_SENSORS", 1024))
+)
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+class WorkerPayload(BaseModel):
+    url: str
+
+@app.on_event("startup")
+async def start_router():
+    await router.start()
+
+@app.on_event("shutdown")
+async def stop_router():
+    await router.stop()
+
+def _route(path: str):
+    async def route_frame(request: Request):
+        body = await request.body()
+        sensor_id = request.headers.get("x-sensor-id")
+        if sensor_id is None:
+            try:
+                sensor_id = json.loads(body).get("sensor_id", "default")
+            except (ValueError, AttributeError):
+                return JSONResponse(
+                    status_code=400,
+                    content={"status": "error", "message": "Request body is not a JSON object"}
+                )
+        return await router.forward(path, str(sensor_id), body)
+    route_frame.__name__ = f"route_{path.strip('/')}"
+    return route_frame
+
+for routed_path in ROUTED_PATHS:
+    app.add_api_route(routed_path, _route(routed_path), methods=["POST"])
+
+@app.get("/workers")
+async def list_workers():
+    """Workers on the ring and the worker currently holding each sensor's session."""
+    return JSONResponse(content={
+        "status": "success",
+        "workers": sorted(router.ring.nodes),
+        "sensors": router.owners
+    })
+
+@app.post("/workers")
+async def add_worker(payload: WorkerPayload):
+    """Add a worker; the sensors that now hash to it are moved there with their sessions."""
+    moves = await router.add_worker(_normalize(payload.url))
+    return JSONResponse(content={"status": "success", "workers": sorted(router.ring.nodes), "moved": moves})
+
+@app.delete("/workers")
+async def remove_worker(payload: WorkerPayload):
+    """Remove a worker, moving its sensors' sessions to their new workers first."""
+    url = _normalize(payload.url)
+    if url not in router.ring.nodes:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Worker {url} is not on the ring"}
+        )
+    moves = await router.remove_worker(url)
+    return JSONResponse(content={"status": "success", "workers": sorted(router.ring.nodes), "moved": moves})
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Export metrics in the Prometheus text format."""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Route sensors to fall-detection workers by consistent hashing")
+    parser.add_argument("--worker", action="append", default=[], help="worker base URL (repeatable)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    if args.worker:
+        os.environ["ROUTER_WORKERS"] = ",".join(args.worker)
+    uvicorn.run("router:app", host=args.host, port=args.port)
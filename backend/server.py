@@ -0,0 +1,466 @@
+"""
+Occupancy and fall detection in one process. Each frame is parsed once and handed to
+both pipelines concurrently on a shared thread pool; the results go out as a single
+message on the shared broadcaster, and both pipelines report to the same metrics and
+model registry (so fall weights are hot-reloaded too).
+
+Everything is configured by one JSON file: server.json next to this module, or the
+path in SERVER_CONFIG. Keys left out of the file keep their defaults.
+
+    SERVER_CONFIG=site.json uvicorn server:app --host 0.0.0.0 --port 8000
+    python server.py --config site.json
+
+Model training and data management stay on main.py.
+"""
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ValidationError
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import argparse
+import asyncio
+import copy
+import json
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from occupancy import OccupancyPipeline, ModelNotFoundError
+from broadcast import Broadcaster, create_pubsub
+from recorder import create_recorder
+from fall_detection.sessions import session_router
+from ingest import timed_body
+import metrics
+import profiling
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_PATH = os.path.join(BACKEND_DIR, "server.json")
+
+DEFAULT_CONFIG = {
+    "host": "0.0.0.0",
+    "port": 8000,
+    "executor_workers": 4,  # Threads shared by both pipelines' model calls
+    "warm_up": {
+        "attempts": 3,  # Model loading is retried this often before /ready reports "failed"
+        "retry_s": 5.0
+    },
+    "broadcast": {
+        "backend": "local",  # "unix" fans broadcasts out to every worker on the host
+        "socket_path": None  # Hub socket for "unix", default BROADCAST_SOCKET or a temp path
+    },
+    "recorder": {
+        "directory": None,  # Record every frame and its results here, default RECORDER_DIR (off if unset)
+        "chunk_frames": 4096,
+        "chunk_seconds": 600,
+        "fsync_interval_s": 1.0
+    },
+    "occupancy": {
+        "enabled": True,
+        "model_name": "default_model",  # Used when a frame does not name a model
+        "preload": None,  # Models to load on startup, None means every model in the database
+        "ema_alpha": 0.6,
+        "max_sensors": 1024,
+        "max_staleness_s": 1.0,
+        "max_skip_frames": 20,
+        "confidence_threshold": 0.9,
+        "reduced_rate": 4
+    },
+    "fall": {
+        "enabled": True,
+        "model_path": "fall_detection/model/pointnet_lstm_fall.pth",  # Relative to the config file
+        "sequence_length": 30,
+        "num_points": 128,
+        "ema_alpha": 0.7,
+        "threshold": 0.7
+    }
+}
+
+def load_config(path: str = None) -> dict:
+    """DEFAULT_CONFIG updated with the JSON file at path (or SERVER_CONFIG, or server.json)."""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    path = path or os.environ.get("SERVER_CONFIG")
+    if path is None and os.path.exists(DEFAULT_CONFIG_PATH):
+        path = DEFAULT_CONFIG_PATH
+    base_dir = BACKEND_DIR
+    if path is not None:
+        with open(path, 'r') as f:
+            for key, value in json.load(f).items():
+                if isinstance(value, dict) and isinstance(config.get(key), dict):
+                    config[key].update(value)
+                else:
+                    config[key] = value
+        base_dir = os.path.dirname(os.path.abspath(path))
+
+    model_path = config["fall"]["model_path"]
+    if model_path and not os.path.isabs(model_path):
+        config["fall"]["model_path"] = os.path.join(base_dir, model_path)
+    return config
+
+config = load_config()
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.include_router(profiling.router)
+
+broadcaster = Broadcaster(create_pubsub(config["broadcast"]["backend"], config["broadcast"]["socket_path"]))
+executor = ThreadPoolExecutor(max_workers=config["executor_workers"], thread_name_prefix="inference")
+recorder_config = dict(config["recorder"])
+recorder = create_recorder(recorder_config.pop("directory"), **recorder_config)
+
+occupancy_config = config["occupancy"]
+fall_config = config["fall"]
+
+occupancy_pipeline = None
+if occupancy_config["enabled"]:
+    occupancy_pipeline = OccupancyPipeline(
+        ema_alpha=occupancy_config["ema_alpha"],
+        max_sensors=occupancy_config["max_sensors"],
+        max_staleness_s=occupancy_config["max_staleness_s"],
+        max_skip_frames=occupancy_config["max_skip_frames"],
+        confidence_threshold=occupancy_config["confidence_threshold"],
+        reduced_rate=occupancy_config["reduced_rate"]
+    )
+    metrics.registry.gauge(
+        "radar_inference_skip_ratio", "Share of frames that reused a previous result"
+    ).set_function(lambda: occupancy_pipeline.rate_controller.skip_ratio)
+
+# Loaded during warm-up. FallDetector's per-sensor sessions are not thread-safe, so its
+# frames are handed to the pool one at a time in arrival order (asyncio.Lock is FIFO)
+fall_detector = None
+fall_order = asyncio.Lock()
+
+# Session export/import so the sensor router can move a sensor to another worker
+app.include_router(session_router(lambda: fall_detector, fall_order))
+
+# Frames currently being processed (reported as queue depth and in-flight gauge)
+in_flight = 0
+metrics.IN_FLIGHT.set_function(lambda: in_flight)
+
+startup_state = {
+    "ready": False,
+    "failed": False,
+    "models": [],
+    "errors": {}
+}
+
+class FramePayload(BaseModel):
+    model_name: Optional[str] = None  # Occupancy model, defaults to occupancy.model_name
+    sensor_id: str = "default"
+    x_pos:    List[float]
+    y_pos:    List[float]
+    z_pos:    List[float]
+    snr:      List[float]
+    noise:    List[float]
+
+    def to_sensor_data(self) -> List[List[float]]:
+        """Convert radar data to sensor data format."""
+        min_length = min(len(self.x_pos), len(self.y_pos), len(self.z_pos))
+        return [[self.x_pos[i], self.y_pos[i], self.z_pos[i]]
+                for i in range(min_length)]
+
+    def point_data(self) -> dict:
+        return {
+            "x_pos": self.x_pos,
+            "y_pos": self.y_pos,
+            "z_pos": self.z_pos,
+            "snr": self.snr,
+            "noise": self.noise
+        }
+
+class FrameBatchPayload(BaseModel):
+    """Several frames in one WebSocket message; frames may override sensor_id and model_name."""
+    model_name: Optional[str] = None
+    sensor_id: str = "default"
+    frames: List[dict]
+
+    def payloads(self) -> List[FramePayload]:
+        return [FramePayload(**{"model_name": self.model_name, "sensor_id": self.sensor_id, **frame})
+                for frame in self.frames]
+
+def _load_fall_detector(model_registry):
+    """Create the fall detector and register it with the shared registry for hot-reload."""
+    global fall_detector
+    from fall_detection.inference.fall_detector import FallDetector, MODEL_LABEL
+    from registry import ModelSpec
+
+    path = fall_config["model_path"]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Fall model weights not found: {path}")
+    detector = FallDetector(
+        model_path=path,
+        sequence_length=fall_config["sequence_length"],
+        num_points=fall_config["num_points"]
+    )
+    detector.ema_alpha = fall_config["ema_alpha"]
+    detector.threshold = fall_config["threshold"]
+
+    model_registry.register(MODEL_LABEL, ModelSpec(path, detector.load_model))
+    model_registry.subscribe(MODEL_LABEL, detector.swap_model)
+    model_registry.adopt(MODEL_LABEL, detector.model)
+    fall_detector = detector
+
+def load_models() -> dict:
+    """
+    Load both pipelines' models; returns {name: error} for those that failed. Also
+    called by the pre-fork launcher before forking workers, so loaded models are kept.
+    """
+    from model.inference import model_registry, preload_models
+
+    errors = {}
+    if occupancy_pipeline is not None:
+        errors.update(preload_models(occupancy_config["preload"]))
+    if fall_config["enabled"] and fall_detector is None:
+        try:
+            _load_fall_detector(model_registry)
+        except Exception as e:
+            errors["fall_detector"] = str(e)
+    return errors
+
+def warm_up():
+    """Import the inference stack and load both pipelines' models off the event loop."""
+    attempts = max(1, config["warm_up"]["attempts"])
+    for attempt in range(1, attempts + 1):
+        try:
+            from model.inference import model_registry
+
+            startup_state["errors"] = load_models()
+            startup_state["models"] = model_registry.loaded_names()
+            model_registry.start()
+            startup_state["ready"] = True
+            return
+        except Exception as e:
+            print(f"Error during warm-up (attempt {attempt}/{attempts}): {e}")
+            startup_state["errors"] = {"warm_up": str(e)}
+        if attempt < attempts:
+            time.sleep(config["warm_up"]["retry_s"])
+    startup_state["failed"] = True
+
+@app.on_event("startup")
+async def start_warm_up():
+    """Start loading models in the background so /ready answers immediately."""
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    await broadcaster.start()
+    if recorder is not None:
+        recorder.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    inference = sys.modules.get("model.inference")
+    if inference is not None:
+        inference.model_registry.stop()
+    await broadcaster.stop()
+    if recorder is not None:
+        recorder.stop()
+    executor.shutdown(wait=False)
+
+async def _occupancy(payload: FramePayload) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, occupancy_pipeline.process, payload.sensor_id,
+        payload.model_name or occupancy_config["model_name"],
+        payload.to_sensor_data(), payload.snr, payload.noise
+    )
+
+async def _fall(payload: FramePayload) -> Optional[dict]:
+    if fall_detector is None:
+        raise RuntimeError("Fall detector not loaded")
+    loop = asyncio.get_running_loop()
+    async with fall_order:
+        return await loop.run_in_executor(executor, fall_detector.process_frame,
+                                          payload.point_data(), payload.sensor_id)
+
+async def process_frame(payload: FramePayload, occupancy: bool = True, fall: bool = True) -> dict:
+    """
+    Run the enabled pipelines on one frame concurrently. Returns
+    {"occupancy": dict|None, "fall_detection": dict|None, "errors": {pipeline: message}}.
+    """
+    result, _ = await _process_frame(payload, occupancy, fall)
+    return result
+
+async def _process_frame(payload: FramePayload, occupancy: bool, fall: bool) -> tuple:
+    """process_frame's result and the exception of each failed pipeline."""
+    global in_flight
+    jobs = {}
+    if occupancy and occupancy_pipeline is not None:
+        jobs["occupancy"] = _occupancy(payload)
+    if fall and fall_config["enabled"]:
+        jobs["fall_detection"] = _fall(payload)
+
+    metrics.QUEUE_DEPTH.observe(in_flight)
+    in_flight += 1
+    try:
+        outcomes = await asyncio.gather(*jobs.values(), return_exceptions=True)
+    finally:
+        in_flight -= 1
+
+    result = {"occupancy": None, "fall_detection": None, "errors": {}}
+    failures = {}
+    for name, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            if not isinstance(outcome, ModelNotFoundError):
+                print(f"Error in {name} pipeline: {outcome}")
+            result["errors"][name] = str(outcome)
+            failures[name] = outcome
+        else:
+            result[name] = outcome
+    if recorder is not None and jobs:
+        recorder.record(payload.sensor_id, payload.point_data(),
+                        occupancy=result["occupancy"], fall_detection=result["fall_detection"])
+    return result, failures
+
+def _message(event: str, payload: FramePayload, result: dict) -> str:
+    message = {
+        "event": event,
+        "sensor_id": payload.sensor_id,
+        "point_data": payload.point_data()
+    }
+    if result["occupancy"] is not None:
+        message["occupancy"] = result["occupancy"]
+    if result["fall_detection"] is not None:
+        message["fall_detection"] = result["fall_detection"]
+    return json.dumps(message)
+
+@app.get("/ready")
+async def readiness():
+    """Report whether the configured models are loaded and warmed, or why warm-up failed."""
+    if startup_state["ready"]:
+        status = "ready"
+    else:
+        status = "failed" if startup_state["failed"] else "starting"
+    return JSONResponse(
+        status_code=200 if startup_state["ready"] else 503,
+        content={
+            "status": status,
+            "models": startup_state["models"],
+            "errors": startup_state["errors"]
+        }
+    )
+
+@app.post("/frame")
+async def frame_hook(payload: FramePayload = Depends(timed_body(FramePayload, "frame"))):
+    """Run occupancy and fall detection on one frame and broadcast both results."""
+    result = await process_frame(payload)
+    await broadcaster.broadcast(_message("frame", payload, result))
+    return JSONResponse(content={
+        "status": "ok",
+        "clients": len(broadcaster),
+        **result
+    })
+
+@app.post("/inference")
+async def inference_hook(payload: FramePayload = Depends(timed_body(FramePayload, "inference"))):
+    """Occupancy only, with the same responses as main.py's /inference."""
+    if occupancy_pipeline is None:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "message": "Occupancy pipeline is disabled"}
+        )
+    result, failures = await _process_frame(payload, occupancy=True, fall=False)
+    if "occupancy" in failures:
+        return JSONResponse(
+            status_code=404 if isinstance(failures["occupancy"], ModelNotFoundError) else 500,
+            content={"status": "error", "message": result["errors"]["occupancy"]}
+        )
+    await broadcaster.broadcast(_message("inference", payload, result))
+    return JSONResponse(content={
+        "status": "ok",
+        "clients": len(broadcaster),
+        "occupancy": result["occupancy"]
+    })
+
+@app.post("/fall")
+async def fall_hook(payload: FramePayload = Depends(timed_body(FramePayload, "fall"))):
+    """Fall detection only, with the same responses as the fall app's /fall."""
+    if not fall_config["enabled"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "message": "Fall detection is disabled"}
+        )
+    result, failures = await _process_frame(payload, occupancy=False, fall=True)
+    if "fall_detection" in failures:
+        return JSONResponse(
+            status_code=503 if fall_detector is None else 500,
+            content={"status": "error", "message": result["errors"]["fall_detection"]}
+        )
+    if result["fall_detection"] is not None:
+        await broadcaster.broadcast(_message("fall", payload, result))
+    return JSONResponse(content={
+        "status": "ok",
+        "clients": len(broadcaster)
+    })
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    Dashboard connection receiving every broadcast. Frames sent by the client go
+    through both pipelines; the result is sent back to it and broadcast to the others.
+    A {"frames": [...]} message is processed frame by frame and answered with one
+    {"event": "frames", "frames": [...]} message.
+    """
+    await broadcaster.connect(websocket)
+    parse_seconds = metrics.REQUEST_PARSE_SECONDS.labels("ws")
+    try:
+        while True:
+            text = await websocket.receive_text()
+            start = time.perf_counter()
+            try:
+                payloads = [FramePayload.model_validate_json(text)]
+                batch = False
+            except ValidationError:
+                try:
+                    payloads = FrameBatchPayload.model_validate_json(text).payloads()
+                    batch = True
+                except ValidationError:
+                    continue  # Keep-alives and other non-frame messages
+            parse_seconds.observe_since(start)
+
+            messages = []
+            for payload in payloads:
+                result = await process_frame(payload)
+                messages.append(_message("frame", payload, result))
+            await websocket.send_text(
+                '{"event": "frames", "frames": [' + ", ".join(messages) + ']}' if batch else messages[0])
+            for message in messages:
+                await broadcaster.broadcast(message, exclude=websocket)
+    except WebSocketDisconnect:
+        broadcaster.disconnect(websocket)
+    except Exception as e:
+        print(f"Error processing frame: {e}")
+        broadcaster.disconnect(websocket)
+
+@app.get("/inference/stats")
+async def inference_stats():
+    """Report how often frames reused a previous result instead of running the model."""
+    if occupancy_pipeline is None:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "message": "Occupancy pipeline is disabled"}
+        )
+    return JSONResponse(content={
+        "status": "success",
+        **occupancy_pipeline.stats()
+    })
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Export metrics in the Prometheus text format."""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve occupancy and fall detection from one process")
+    parser.add_argument("--config", help="JSON config file (default: SERVER_CONFIG or server.json)")
+    args = parser.parse_args()
+    if args.config:
+        os.environ["SERVER_CONFIG"] = os.path.abspath(args.config)
+        config = load_config()
+    uvicorn.run("server:app", host=config["host"], port=config["port"])
@@ -0,0 +1,482 @@
+"""
+Streaming, resumable uploads of JSON recordings into the data directory.
+
+An upload is written piece by piece to <data>/.uploads/<id>.part while its SHA-256 is
+updated and its JSON syntax is checked incrementally, so memory stays at one piece
+regardless of the file size. On completion the content is compared with the existing
+`files` rows (same size, then same SHA-256): a duplicate is dropped and the existing
+file returned; otherwise the part file is published to <data>/<filename> atomically
+(never overwriting a file) and recorded in the database with its catalog statistics
+(catalog.py), gathered during the same pass.
+
+    POST   /uploads                    {"filename": "walk.json"} -> upload_id
+    PUT    /uploads/{id}?offset=N      raw bytes appended at N (the current size)
+    GET    /uploads/{id}               current offset, to resume after a failure
+    POST   /uploads/{id}/complete
+    DELETE /uploads/{id}
+
+/upload_data uses the same path for single-request multipart uploads.
+"""
+import codecs
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from catalog import FileStats
+from database import model_db
+from utils import get_data_dir
+
+UPLOADS_SUBDIR = ".uploads"
+PIECE_SIZE = 1 << 20  # Bytes hashed, validated and written per step
+UPLOAD_TTL_S = 24 * 3600  # Unfinished uploads untouched for this long are removed
+MAX_TOKEN = 16 << 20  # Longest single JSON token (string or number) held across pieces
+
+_WS = "[ \t\n\r]*"
+# Scalars as json.loads accepts them, including NaN and +-Infinity
+_SCALAR = (r'(?:"(?:[^"\\\x00-\x1f]|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*"'
+           r'|-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?'
+           r'|true|false|null|NaN|-?Infinity)')
+# A flat array of scalars (the x_pos/y_pos/... lists) is matched as one value token
+_TOKEN = re.compile(
+    rf'{_WS}(?:(\[{_WS}(?:{_SCALAR}(?:{_WS},{_WS}{_SCALAR})*{_WS})?\])|({_SCALAR})|([{{}}\[\],:]))')
+_NUMBER_TAIL = re.compile(r"[0-9.eE+\-]*")
+_TOKEN_START = set('{}[],:"-0123456789tfnNI \t\n\r')
+
+# Parser states: what the next token may be
+_VALUE, _FIRST_VALUE, _KEY, _FIRST_KEY, _COLON, _NEXT, _DONE = range(7)
+
+
+class InvalidJSON(ValueError):
+    pass
+
+
+class JsonStreamValidator:
+    """
+    Checks that bytes fed in pieces form one UTF-8 JSON document, as json.loads would
+    accept it, without building the document. feed() raises InvalidJSON (or
+    UnicodeDecodeError) as soon as the text so far cannot be valid; close() raises if
+    the document is incomplete.
+
+    on_object, if given, is called with the text of each record object: the objects
+    in a top-level array (recorded frames), or in the arrays of a top-level object
+    (e.g. {"sequences": [...]}), one at a time.
+    """
+
+    def __init__(self, on_object: Callable[[str], None] = None):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""  # undecided tail: a token that may continue in the next piece
+        self._offset = 0  # characters consumed before _pending
+        self._stack = []
+        self._state = _VALUE
+        self._on_object = on_object
+        self._record_depth = None
+        self.empty_array = False  # the document is [] (a recording without frames)
+        self._record = None  # text pieces of the record object being read
+        self._record_start = 0
+
+    def feed(self, data: bytes):
+        self._scan(self._pending + self._decoder.decode(data), final=False)
+
+    def close(self):
+        self._scan(self._pending + self._decoder.decode(b"", final=True), final=True)
+        if self._state != _DONE:
+            raise InvalidJSON("Incomplete JSON document")
+
+    def _scan(self, text: str, final: bool):
+        pos = 0
+        end = len(text)
+        while pos < end:
+            match = _TOKEN.match(text, pos)
+            if match is None:
+                rest = text[pos:].lstrip(" \t\n\r")
+                if not rest:
+                    pos = end
+                    break
+                if final or rest[0] not in _TOKEN_START or end - pos > MAX_TOKEN:
+                    raise InvalidJSON(f"Invalid JSON at character {self._offset + end - len(rest)}")
+                break  # may be a token cut by the end of the piece
+            array, scalar, char = match.groups()
+            if scalar is not None and not final and _NUMBER_TAIL.fullmatch(text, match.end()):
+                break  # a number or literal at the end of the piece may continue
+            self._token(char, scalar or array, text, match.start(match.lastindex), match.end())
+            pos = match.end()
+        if self._record is not None:
+            self._record.append(text[self._record_start:pos])
+            self._record_start = 0  # the next text starts with text[pos:]
+        self._offset += pos
+        self._pending = text[pos:]
+
+    def _token(self, char: Optional[str], value: Optional[str], text: str, start: int, end: int):
+        state = self._state
+        at = self._offset + start
+        if value is not None:
+            if state in (_KEY, _FIRST_KEY) and value[0] == '"':
+                self._state = _COLON
+            elif state in (_VALUE, _FIRST_VALUE):
+                if not self._stack and value[0] == "[":
+                    self.empty_array = value[1:-1].strip(" \t\n\r") == ""
+                self._after_value()
+            else:
+                raise InvalidJSON(f"Unexpected value at character {at}")
+        elif char in "[{":
+            if state not in (_VALUE, _FIRST_VALUE):
+                raise InvalidJSON(f"Unexpected '{char}' at character {at}")
+            if not self._stack:
+                self._record_depth = 1 if char == "[" else 2
+            elif (char == "{" and self._on_object and len(self._stack) == self._record_depth
+                  and self._stack[-1] == "["):
+                self._record = []
+                self._record_start = start
+            self._stack.append(char)
+            self._state = _FIRST_VALUE if char == "[" else _FIRST_KEY
+        elif char in "]}":
+            opening, first = ("[", _FIRST_VALUE) if char == "]" else ("{", _FIRST_KEY)
+            if not self._stack or self._stack[-1] != opening or state not in (_NEXT, first):
+                raise InvalidJSON(f"Unexpected '{char}' at character {at}")
+            if char == "]" and state == _FIRST_VALUE and len(self._stack) == 1:
+                self.empty_array = True
+            self._stack.pop()
+            self._after_value()
+            if self._record is not None and len(self._stack) == self._record_depth:
+                self._record.append(text[self._record_start:end])
+                record, self._record = "".join(self._record), None
+                self._on_object(record)
+        elif char == ":":
+            if state != _COLON:
+                raise InvalidJSON(f"Unexpected ':' at character {at}")
+            self._state = _VALUE
+        else:  # ","
+            if state != _NEXT:
+                raise InvalidJSON(f"Unexpected ',' at character {at}")
+            self._state = _VALUE if self._stack[-1] == "[" else _KEY
+
+    def _after_value(self):
+        self._state = _NEXT if self._stack else _DONE
+
+
+class Upload:
+    """One upload's part file with its running SHA-256, validation state and catalog statistics."""
+
+    def __init__(self, upload_id: str, filename: str, directory: str):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.part_path = os.path.join(directory, upload_id + ".part")
+        self.info_path = os.path.join(directory, upload_id + ".json")
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.stats = FileStats()
+        self.validator = JsonStreamValidator(on_object=self.stats.add_text)
+        self.lock = threading.Lock()
+
+    def append(self, f, data: bytes):
+        """Validate data and append it to the open part file f."""
+        self.validator.feed(data)  # nothing invalid reaches the part file
+        f.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def part_size(self) -> int:
+        try:
+            return os.path.getsize(self.part_path)
+        except FileNotFoundError:
+            return 0
+
+    def remove(self):
+        for path in (self.part_path, self.info_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_uploads: Dict[str, Upload] = {}
+_uploads_lock = threading.Lock()
+
+
+def _uploads_dir() -> str:
+    path = os.path.join(get_data_dir(), UPLOADS_SUBDIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _prune(directory: str):
+    cutoff = time.time() - UPLOAD_TTL_S
+    for name in os.listdir(directory):
+        upload_id, ext = os.path.splitext(name)
+        try:
+            if ext == ".part" and os.path.getmtime(os.path.join(directory, name)) < cutoff:
+                Upload(upload_id, "", directory).remove()
+                _uploads.pop(upload_id, None)
+        except OSError:
+            pass
+
+
+def create_upload(filename: str) -> Upload:
+    """
+    Start an upload of filename into the data directory. Raises ValueError for a
+    non-JSON name and FileExistsError if the file already exists.
+    """
+    filename = os.path.basename(filename or "")
+    if not filename.lower().endswith(".json"):
+        raise ValueError("Only JSON files (.json) are allowed")
+    if os.path.exists(os.path.join(get_data_dir(), filename)):
+        raise FileExistsError(f"File '{filename}' already exists")
+    directory = _uploads_dir()
+    upload = Upload(uuid.uuid4().hex, filename, directory)
+    with _uploads_lock:
+        _prune(directory)
+        with open(upload.info_path, "w") as f:
+            json.dump({"filename": filename, "created_at": time.time()}, f)
+        open(upload.part_path, "wb").close()
+        _uploads[upload.upload_id] = upload
+    return upload
+
+
+def get_upload(upload_id: str) -> Optional[Upload]:
+    """
+    The upload with this id, or None. An upload started in another worker, or before
+    a restart, is rebuilt by re-reading its part file.
+    """
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        return None
+    with _uploads_lock:
+        upload = _uploads.get(upload_id)
+    if upload is not None:
+        with upload.lock:
+            if upload.size == upload.part_size():
+                return upload
+    with _uploads_lock:
+        directory = _uploads_dir()
+        try:
+            with open(os.path.join(directory, upload_id + ".json")) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            _uploads.pop(upload_id, None)
+            return None
+        upload = Upload(upload_id, info["filename"], directory)
+        with open(upload.part_path, "rb") as f:
+            while True:
+                data = f.read(PIECE_SIZE)
+                if not data:
+                    break
+                upload.validator.feed(data)
+                upload.sha256.update(data)
+                upload.size += len(data)
+        _uploads[upload_id] = upload
+        return upload
+
+
+def discard_upload(upload: Upload):
+    with _uploads_lock:
+        _uploads.pop(upload.upload_id, None)
+        upload.remove()
+
+
+def _hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(PIECE_SIZE)
+            if not data:
+                return sha256.hexdigest()
+            sha256.update(data)
+
+
+def find_duplicate(content_sha256: str, size: int) -> Optional[dict]:
+    """The existing file record with this content, hashing older rows on first comparison."""
+    for record in model_db.get_files_by_size(size):
+        digest = record.get("content_sha256")
+        if digest is None:
+            if not os.path.exists(record["file_path"]):
+                continue
+            digest = _hash_file(record["file_path"])
+            model_db.set_file_hash(record["id"], digest)
+        if digest == content_sha256:
+            return record
+    return None
+
+
+def _publish(part_path: str, file_path: str):
+    """Move the finished part file to file_path atomically, never replacing an existing file."""
+    try:
+        os.link(part_path, file_path)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hard links on this filesystem: rename, accepting a check-then-act window
+        if os.path.exists(file_path):
+            raise FileExistsError(file_path)
+        os.replace(part_path, file_path)
+        return
+    os.remove(part_path)
+
+
+def _error(status_code: int, message: str, **extra) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"status": "error", "message": message, **extra})
+
+
+def rejected(upload: Upload, error: Exception) -> JSONResponse:
+    """Drop an upload whose content is not valid JSON and describe why."""
+    discard_upload(upload)
+    if isinstance(error, UnicodeDecodeError):
+        return _error(400, "File must be UTF-8 encoded")
+    return _error(400, f"Invalid JSON content. Please upload a valid JSON file ({error})")
+
+
+def append_piece(upload: Upload, f, data: bytes):
+    """Append data under the upload's lock (run in a worker thread)."""
+    with upload.lock:
+        upload.append(f, data)
+
+
+def complete_upload(upload: Upload) -> JSONResponse:
+    """Finish an upload: final validation, de-duplication, publish and database record."""
+    with upload.lock:
+        try:
+            upload.validator.close()
+        except (InvalidJSON, UnicodeDecodeError) as e:
+            return rejected(upload, e)
+        content_sha256 = upload.sha256.hexdigest()
+
+        duplicate = find_duplicate(content_sha256, upload.size)
+        if duplicate is not None:
+            discard_upload(upload)
+            return JSONResponse(content={
+                "status": "success",
+                "message": f"Identical content already uploaded as '{duplicate['filename']}'",
+                "duplicate": True,
+                "file_info": {
+                    "filename": duplicate["filename"],
+                    "size_bytes": duplicate["file_size_bytes"],
+                    "path": duplicate["file_path"],
+                    "content_type": duplicate["content_type"],
+                    "sha256": content_sha256
+                }
+            })
+
+        file_path = os.path.join(get_data_dir(), upload.filename)
+        with open(upload.part_path, "rb+") as f:
+            os.fsync(f.fileno())
+        try:
+            _publish(upload.part_path, file_path)
+        except FileExistsError:
+            discard_upload(upload)
+            return _error(409, f"File '{upload.filename}' already exists")
+        discard_upload(upload)
+
+        success = model_db.add_file(
+            filename=upload.filename,
+            file_path=file_path,
+            file_size_bytes=upload.size,
+            content_type="application/json",
+            metadata=upload.stats.metadata(content_sha256, upload.validator.empty_array),
+            content_sha256=content_sha256
+        )
+        if not success:
+            # If database storage fails, remove the uploaded file
+            os.remove(file_path)
+            return _error(500, "File uploaded but failed to store metadata in database")
+
+        return JSONResponse(content={
+            "status": "success",
+            "message": f"JSON file '{upload.filename}' uploaded successfully",
+            "duplicate": False,
+            "file_info": {
+                "filename": upload.filename,
+                "size_bytes": upload.size,
+                "path": file_path,
+                "content_type": "application/json",
+                "sha256": content_sha256
+            }
+        })
+
+
+class UploadStart(BaseModel):
+    filename: str
+
+
+router = APIRouter(prefix="/uploads")
+
+
+def _status(upload: Upload) -> JSONResponse:
+    return JSONResponse(content={
+        "status": "success",
+        "upload_id": upload.upload_id,
+        "filename": upload.filename,
+        "offset": upload.size
+    })
+
+
+@router.post("")
+async def start_upload(payload: UploadStart):
+    """Start a resumable upload; send the content with PUT /uploads/{upload_id}."""
+    try:
+        upload = await run_in_threadpool(create_upload, payload.filename)
+    except ValueError as e:
+        return _error(400, str(e))
+    except FileExistsError as e:
+        return _error(409, str(e))
+    return _status(upload)
+
+
+@router.get("/{upload_id}")
+async def upload_status(upload_id: str):
+    """Bytes received so far; resume by sending the rest from this offset."""
+    upload = await run_in_threadpool(get_upload, upload_id)
+    if upload is None:
+        return _error(404, f"Upload '{upload_id}' not found")
+    return _status(upload)
+
+
+@router.put("/{upload_id}")
+async def upload_piece(upload_id: str, request: Request, offset: Optional[int] = None):
+    """Append the request body to the upload. offset, if given, must be the current size."""
+    upload = await run_in_threadpool(get_upload, upload_id)
+    if upload is None:
+        return _error(404, f"Upload '{upload_id}' not found")
+    with open(upload.part_path, "ab", buffering=0) as f:
+        # Serializes appends from other workers; the in-process lock is taken per piece
+        await run_in_threadpool(fcntl.flock, f, fcntl.LOCK_EX)
+        if upload.size != upload.part_size():
+            upload = await run_in_threadpool(get_upload, upload_id)
+        if offset is not None and offset != upload.size:
+            return _error(409, f"Upload is at offset {upload.size}, not {offset}", offset=upload.size)
+        buffer = bytearray()
+        try:
+            async for data in request.stream():
+                buffer += data
+                if len(buffer) >= PIECE_SIZE:
+                    await run_in_threadpool(append_piece, upload, f, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await run_in_threadpool(append_piece, upload, f, bytes(buffer))
+        except (InvalidJSON, UnicodeDecodeError) as e:
+            return rejected(upload, e)
+    return _status(upload)
+
+
+@router.post("/{upload_id}/complete")
+async def finish_upload(upload_id: str):
+    """Publish the uploaded file, or return the existing file with identical content."""
+    upload = await run_in_threadpool(get_upload, upload_id)
+    if upload is None:
+        return _error(404, f"Upload '{upload_id}' not found")
+    return await run_in_threadpool(complete_upload, upload)
+
+
+@router.delete("/{upload_id}")
+async def abort_upload(upload_id: str):
+    upload = await run_in_threadpool(get_upload, upload_id)
+    if upload is None:
+        return _error(404, f"Upload '{upload_id}' not found")
+    await run_in_threadpool(discard_upload, upload)
+    return JSONResponse(content={"status": "success"})
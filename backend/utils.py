@@ -18,4 +18,8 @@ def get_model_path(model_name: str) -> str:
 
 def get_data_subdir(subdir: str) -> str:
     """Get the absolute path to a subdirectory within the data directory."""
-    return os.path.join(get_data_dir(), subdir) 
\ No newline at end of file
+    return os.path.join(get_data_dir(), subdir)
+
+def get_profiles_dir() -> str:
+    """Get the absolute path to the directory where profiling traces are written."""
+    return os.path.join(get_repo_root(), "profiles")